@@ -1,12 +1,21 @@
-from fastapi import FastAPI, Query, Header, HTTPException
+from fastapi import FastAPI, Query, Header, HTTPException, Response, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Literal
+import asyncio
+import csv
+import io
 import json
 import os
+import threading
+import time
+from datetime import datetime, timezone
 
-from backend.db import init_db, get_conn
-from backend.models import EventIn, EventOut, make_event_out
+from backend.db import init_db, connection, close_all
+from backend.models import EventIn, EventOut, BatchResult, CounterMetricsIn, TYPED_META, make_event_out, split_meta
 from backend.config import settings
+from backend.live import LiveHub
 
 from fastapi.staticfiles import StaticFiles
 import pathlib
@@ -32,6 +41,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # =========================
@@ -54,24 +64,56 @@ SNAP_DIR.mkdir(parents=True, exist_ok=True)
 
 app.mount("/snapshots", StaticFiles(directory=str(SNAP_DIR)), name="snapshots")
 
+# =========================
+# Push en vivo (/live)
+# =========================
+hub = LiveHub(client_buffer=settings.LIVE_CLIENT_BUFFER, max_clients=settings.LIVE_MAX_CLIENTS)
+
+def _publish_committed(outs: List[EventOut]):
+    # Solo después del commit; sin clientes conectados no se hace nada
+    if not hub.has_subscribers:
+        return
+    for o in outs:
+        hub.publish("event", o.model_dump() if hasattr(o, "model_dump") else o.dict(), camera_id=o.camera_id)
+    with connection() as conn:
+        hub.publish("counters", _read_metrics(conn))
+
 @app.on_event("startup")
 def _startup():
     init_db()
 
+@app.on_event("shutdown")
+def _shutdown():
+    close_all()
+
 @app.get("/health")
 def health():
-    return {"ok": True, "app": settings.APP_NAME}
+    return {"ok": True, "app": settings.APP_NAME, "live": hub.stats()}
 
 @app.get("/status")
 def status(x_api_key: str | None = Header(default=None, alias="x-api-key")):
     require_api_key(x_api_key)
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT COALESCE(SUM(count_delta), 0) AS total FROM events")
-    total = cur.fetchone()["total"]
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(SUM(total), 0) AS total FROM counts_total")
+        total = cur.fetchone()["total"]
     return {"total_count": int(total)}
 
+INSERT_EVENT_SQL = (
+    "INSERT OR IGNORE INTO events (id, ts, ts_ms, camera_id, direction, count_delta, "
+    f"{', '.join(TYPED_META)}, meta_json) "
+    f"VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * len(TYPED_META))}, ?)"
+)
+
+def _event_row(out: EventOut):
+    # Campos conocidos -> columnas; meta_json solo con el resto (NULL si no hay)
+    typed, extra = split_meta(out.meta)
+    return (
+        out.id, out.ts, out.ts_ms, out.camera_id, out.direction, out.count_delta,
+        *(typed.get(k) for k in TYPED_META),
+        json.dumps(extra) if extra else None,
+    )
+
 @app.post("/events", response_model=EventOut)
 def create_event(
     event: EventIn,
@@ -82,73 +124,408 @@ def create_event(
     require_api_key(x_api_key)
 
     out = make_event_out(event)
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO events (id, ts, camera_id, direction, count_delta, meta_json) VALUES (?, ?, ?, ?, ?, ?)",
-        (out.id, out.ts, out.camera_id, out.direction, out.count_delta, json.dumps(out.meta)),
-    )
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        inserted = conn.execute(INSERT_EVENT_SQL, _event_row(out)).rowcount
+    if inserted:
+        _publish_committed([out])
     return out
 
+@app.post("/events/batch", response_model=BatchResult)
+def create_events_batch(
+    events: List[EventIn],
+    x_api_key: str | None = Header(default=None, alias="x-api-key")
+):
+    # Un solo executemany + un solo commit para todo el lote.
+    # Los ids que ya existen (reintentos del cliente) se ignoran.
+    require_api_key(x_api_key)
+
+    if len(events) > settings.BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"Max {settings.BATCH_MAX_EVENTS} events per batch")
+
+    outs = [make_event_out(e) for e in events]
+    fresh = outs
+    with connection() as conn:
+        # rowcount (no total_changes): no cuenta lo que escriben los triggers de rollup
+        inserted = max(0, conn.executemany(INSERT_EVENT_SQL, [_event_row(o) for o in outs]).rowcount)
+
+        if inserted < len(outs) and hub.has_subscribers:
+            # Hubo duplicados: se publican solo las filas nuevas (las repetidas conservan su ts original)
+            mine = set()
+            ids = [o.id for o in outs]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT id, ts FROM events WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                mine.update((r["id"], r["ts"]) for r in rows)
+            # un id repetido dentro del mismo lote se inserta (y publica) una sola vez
+            seen = set()
+            fresh = []
+            for o in outs:
+                if (o.id, o.ts) in mine and o.id not in seen:
+                    seen.add(o.id)
+                    fresh.append(o)
+
+    if inserted:
+        _publish_committed(fresh)
+
+    return BatchResult(
+        received=len(outs),
+        inserted=inserted,
+        duplicates=len(outs) - inserted,
+        ids=[o.id for o in outs],
+    )
+
+# =========================
+# Lectura de eventos: paginación por cursor (keyset sobre ts_ms, id)
+# =========================
+EVENT_COLUMNS = ("id", "ts", "ts_ms", "camera_id", "direction", "count_delta", *TYPED_META, "meta_json")
+
+def _parse_time_ms(value: Optional[str], name: str) -> Optional[int]:
+    # Acepta epoch en ms o ISO ('2026-01-31T12:00:00Z'; sin zona = UTC)
+    if value is None or value == "":
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def _parse_cursor(cursor: Optional[str]):
+    # Cursor = '<ts_ms>_<id>' de la última fila recibida ('null_<id>' si no tiene ts_ms)
+    if not cursor:
+        return None
+    ts_ms, sep, event_id = cursor.partition("_")
+    if not sep or not event_id or not (ts_ms == "null" or ts_ms.lstrip("-").isdigit()):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return (None if ts_ms == "null" else int(ts_ms)), event_id
+
+def _make_cursor(row) -> str:
+    return f"{'null' if row['ts_ms'] is None else row['ts_ms']}_{row['id']}"
+
+def _events_page_sql(camera_id, direction, since_ms, until_ms, after, order, limit,
+                     person_id=None, event=None, has_snapshot=None, undated=False):
+    """
+    SELECT de una página. Con (camera_id, ts_ms, id) / (ts_ms, id) indexados
+    cada página es un range scan que arranca en el cursor: el costo no crece
+    con la página (a diferencia de OFFSET). person_id y has_snapshot=true
+    tienen sus propios índices.
+    undated=True: las filas sin ts_ms (ts que no se pudo interpretar), por id.
+    """
+    where = ["ts_ms IS NULL" if undated else "ts_ms IS NOT NULL"]
+    params = []
+    if camera_id:
+        where.append("camera_id = ?")
+        params.append(camera_id)
+    if direction:
+        where.append("direction = ?")
+        params.append(direction)
+    if person_id is not None:
+        where.append("person_id = ?")
+        params.append(person_id)
+    if event:
+        where.append("event = ?")
+        params.append(event)
+    if has_snapshot is True:
+        where.append("snapshot IS NOT NULL")
+    elif has_snapshot is False:
+        where.append("snapshot IS NULL")
+    if since_ms is not None:
+        where.append("ts_ms >= ?")
+        params.append(since_ms)
+    if until_ms is not None:
+        where.append("ts_ms < ?")
+        params.append(until_ms)
+    if undated:
+        if after is not None:
+            where.append("id < ?" if order == "desc" else "id > ?")
+            params.append(after[1])
+    elif after is not None:
+        where.append("(ts_ms, id) < (?, ?)" if order == "desc" else "(ts_ms, id) > (?, ?)")
+        params.extend(after)
+
+    order_by = f"id {order.upper()}" if undated else f"ts_ms {order.upper()}, id {order.upper()}"
+    sql = f"SELECT {', '.join(EVENT_COLUMNS)} FROM events WHERE {' AND '.join(where)} ORDER BY {order_by} LIMIT ?"
+    params.append(limit)
+    return sql, params
+
+def _fetch_events_page(conn, camera_id, direction, since_ms, until_ms, after, order, limit, **filters):
+    """
+    Primero las filas con ts_ms; sin since/until, al final las que no tienen
+    (filas antiguas cuyo ts no se pudo migrar), para que no desaparezcan.
+    """
+    rows = []
+    if after is None or after[0] is not None:
+        sql, params = _events_page_sql(camera_id, direction, since_ms, until_ms, after, order, limit, **filters)
+        rows = conn.execute(sql, params).fetchall()
+        after = None
+    if len(rows) < limit and since_ms is None and until_ms is None:
+        sql, params = _events_page_sql(camera_id, direction, None, None, after, order, limit - len(rows),
+                                       undated=True, **filters)
+        rows += conn.execute(sql, params).fetchall()
+    return rows
+
 @app.get("/events", response_model=List[EventOut])
 def list_events(
+    response: Response,
     limit: int = Query(100, ge=1, le=2000),
     camera_id: Optional[str] = None,
+    direction: Optional[Literal["in", "out", "unknown"]] = None,
+    since: Optional[str] = Query(None, description="ISO o epoch ms (incluido)"),
+    until: Optional[str] = Query(None, description="ISO o epoch ms (excluido)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor de la página anterior"),
+    order: Literal["desc", "asc"] = "desc",
+    person_id: Optional[int] = None,
+    event: Optional[str] = None,
+    has_snapshot: Optional[bool] = None,
     x_api_key: str | None = Header(default=None, alias="x-api-key")
 ):
     require_api_key(x_api_key)
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if camera_id:
-        cur.execute(
-            "SELECT * FROM events WHERE camera_id=? ORDER BY ts DESC LIMIT ?",
-            (camera_id, limit),
+    since_ms, until_ms = _parse_time_ms(since, "since"), _parse_time_ms(until, "until")
+    with connection() as conn:
+        rows = _fetch_events_page(
+            conn, camera_id, direction, since_ms, until_ms, _parse_cursor(cursor), order, limit,
+            person_id=person_id, event=event, has_snapshot=has_snapshot,
         )
-    else:
-        cur.execute("SELECT * FROM events ORDER BY ts DESC LIMIT ?", (limit,))
 
-    rows = cur.fetchall()
-    conn.close()
+    # Página llena => puede haber más: el cliente pide ?cursor=<X-Next-Cursor>
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _make_cursor(rows[-1])
 
     out: List[EventOut] = []
     for r in rows:
+        typed = {k: r[k] for k in TYPED_META if r[k] is not None}
+        # meta sigue trayendo los campos tipados (compatibilidad con el dashboard);
+        # json.loads solo si hay extras
+        meta = json.loads(r["meta_json"]) if r["meta_json"] else {}
+        meta.update(typed)
         out.append(EventOut(
             id=r["id"],
             ts=r["ts"],
+            ts_ms=r["ts_ms"],
             camera_id=r["camera_id"],
             direction=r["direction"],
             count_delta=int(r["count_delta"]),
-            meta=json.loads(r["meta_json"] or "{}"),
+            meta=meta,
+            **typed,
         ))
     return out
 
+@app.get("/events/export")
+def export_events(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    camera_id: Optional[str] = None,
+    direction: Optional[Literal["in", "out", "unknown"]] = None,
+    since: Optional[str] = Query(None, description="ISO o epoch ms (incluido)"),
+    until: Optional[str] = Query(None, description="ISO o epoch ms (excluido)"),
+    cursor: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    person_id: Optional[int] = None,
+    event: Optional[str] = None,
+    has_snapshot: Optional[bool] = None,
+    x_api_key: str | None = Header(default=None, alias="x-api-key")
+):
+    """
+    Exportación completa (auditoría) en streaming: se lee por páginas con el
+    mismo cursor de /events y cada página se escribe apenas se lee, así la
+    memoria no depende del rango. Los campos tipados van como columnas y
+    meta_json (solo extras) sale tal cual, sin json.loads.
+    """
+    require_api_key(x_api_key)
+
+    since_ms = _parse_time_ms(since, "since")
+    until_ms = _parse_time_ms(until, "until")
+    after = _parse_cursor(cursor)
+    page = settings.EXPORT_PAGE_ROWS
+
+    def pages():
+        nonlocal after
+        while True:
+            with connection() as conn:
+                rows = _fetch_events_page(conn, camera_id, direction, since_ms, until_ms, after, order, page,
+                                          person_id=person_id, event=event, has_snapshot=has_snapshot)
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page:
+                return
+            after = (rows[-1]["ts_ms"], rows[-1]["id"])
+
+    def ndjson():
+        for rows in pages():
+            yield "".join(
+                json.dumps({k: r[k] for k in EVENT_COLUMNS[:-1]})[:-1] + ',"meta":' + (r["meta_json"] or "{}") + "}\n"
+                for r in rows
+            )
+
+    def as_csv():
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(EVENT_COLUMNS)
+        for rows in pages():
+            w.writerows(tuple(r) for r in rows)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+
+    if format == "csv":
+        return StreamingResponse(as_csv(), media_type="text/csv",
+                                 headers={"Content-Disposition": 'attachment; filename="events.csv"'})
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @app.get("/metrics")
 def metrics(x_api_key: str | None = Header(default=None, alias="x-api-key")):
     require_api_key(x_api_key)
 
-    conn = get_conn()
+    with connection() as conn:
+        return _read_metrics(conn)
+
+def _read_metrics(conn):
+    # Todo sale de los rollups (counts_total / counts_minute), nunca de events
+    now_min = int(time.time()) // 60
     cur = conn.cursor()
 
-    cur.execute("SELECT COALESCE(SUM(count_delta), 0) AS total FROM events")
+    cur.execute("SELECT COALESCE(SUM(total), 0) AS total FROM counts_total")
     total = int(cur.fetchone()["total"])
 
-    cur.execute("""
-        SELECT COALESCE(SUM(count_delta), 0) AS last_24h
-        FROM events
-        WHERE ts >= datetime('now', '-24 hours')
-    """)
+    cur.execute(
+        "SELECT COALESCE(SUM(total), 0) AS last_24h FROM counts_minute WHERE bucket > ?",
+        (now_min - 24 * 60,),
+    )
     last_24h = int(cur.fetchone()["last_24h"])
 
-    cur.execute("""
-        SELECT COALESCE(SUM(count_delta), 0) AS last_1h
-        FROM events
-        WHERE ts >= datetime('now', '-1 hours')
-    """)
+    cur.execute(
+        "SELECT COALESCE(SUM(total), 0) AS last_1h FROM counts_minute WHERE bucket > ?",
+        (now_min - 60,),
+    )
     last_1h = int(cur.fetchone()["last_1h"])
 
-    conn.close()
     return {"total": total, "last_1h": last_1h, "last_24h": last_24h}
+
+# =========================
+# Métricas de los procesos counter (push)
+# =========================
+_counter_metrics = {}
+_counter_metrics_lock = threading.Lock()
+
+@app.post("/counter/metrics")
+def push_counter_metrics(
+    body: CounterMetricsIn,
+    x_api_key: str | None = Header(default=None, alias="x-api-key")
+):
+    """
+    Último resumen de cada counter (fps, latencias por etapa, colas...).
+    Solo en memoria: para historia está el /metrics Prometheus del NUC.
+    """
+    require_api_key(x_api_key)
+    with _counter_metrics_lock:
+        if body.source not in _counter_metrics and len(_counter_metrics) >= settings.COUNTER_METRICS_MAX_SOURCES:
+            raise HTTPException(status_code=429, detail="Too many metric sources")
+        _counter_metrics[body.source] = {
+            "received_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "metrics": body.metrics,
+        }
+    return {"ok": True}
+
+@app.get("/counter/metrics")
+def get_counter_metrics(x_api_key: str | None = Header(default=None, alias="x-api-key")):
+    require_api_key(x_api_key)
+    with _counter_metrics_lock:
+        return dict(_counter_metrics)
+
+@app.get("/live")
+async def live(
+    request: Request,
+    camera_id: Optional[str] = None,
+    api_key: Optional[str] = Query(None, description="EventSource no manda headers"),
+    x_api_key: str | None = Header(default=None, alias="x-api-key")
+):
+    """
+    Server-Sent Events: al conectar manda 'counters' y después, por cada
+    commit, 'event' (cada evento nuevo) y 'counters' actualizados.
+    Un cliente lento que llena su buffer recibe 'dropped' y se cierra.
+    """
+    require_api_key(x_api_key or api_key)
+
+    sub = hub.subscribe(asyncio.get_running_loop(), camera_id=camera_id)
+    if sub is None:
+        raise HTTPException(status_code=503, detail="Too many live clients")
+
+    def _snapshot():
+        with connection() as conn:
+            return _read_metrics(conn)
+
+    async def stream():
+        try:
+            counters = await run_in_threadpool(_snapshot)
+            yield f"retry: 3000\nevent: counters\ndata: {json.dumps(counters)}\n\n"
+            while True:
+                try:
+                    msg = await asyncio.wait_for(sub.q.get(), timeout=settings.LIVE_PING_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if msg is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                yield msg
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics/series")
+def metrics_series(
+    minutes: int = Query(60, ge=1, le=60 * 24 * 31),
+    step: int = Query(1, ge=1, le=60 * 24, description="Minutos por punto"),
+    camera_id: Optional[str] = None,
+    x_api_key: str | None = Header(default=None, alias="x-api-key")
+):
+    """
+    Serie de tiempo desde counts_minute: un punto por `step` minutos con
+    total y desglose in/out/unknown. Los intervalos sin eventos no aparecen.
+    """
+    require_api_key(x_api_key)
+
+    since = int(time.time()) // 60 - minutes
+    sql = """
+        SELECT (bucket / ?) * ? AS b, direction, SUM(events) AS events, SUM(total) AS total
+        FROM counts_minute
+        WHERE bucket > ?
+    """
+    params = [step, step, since]
+    if camera_id:
+        sql += " AND camera_id = ?"
+        params.append(camera_id)
+    sql += " GROUP BY b, direction ORDER BY b"
+
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    points = {}
+    for r in rows:
+        p = points.get(r["b"])
+        if p is None:
+            p = points[r["b"]] = {
+                "t": datetime.fromtimestamp(r["b"] * 60, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "events": 0,
+                "total": 0,
+                "in": 0,
+                "out": 0,
+                "unknown": 0,
+            }
+        p["events"] += int(r["events"])
+        p["total"] += int(r["total"])
+        p[r["direction"] if r["direction"] in ("in", "out") else "unknown"] += int(r["total"])
+
+    return {"step_minutes": step, "camera_id": camera_id, "points": list(points.values())}
@@ -5,4 +5,24 @@ class Settings(BaseModel):
     DB_PATH: str = os.getenv("DB_PATH", "people_counter.db")
     APP_NAME: str = "people_counter_backend"
 
+    # SQLite (se aplican una vez por conexión; las conexiones son persistentes por hilo)
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "NORMAL")   # NORMAL es seguro con WAL
+    DB_CACHE_KB: int = int(os.getenv("DB_CACHE_KB", "16384"))
+    DB_MMAP_MB: int = int(os.getenv("DB_MMAP_MB", "256"))
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+    # POST /events/batch
+    BATCH_MAX_EVENTS: int = int(os.getenv("BATCH_MAX_EVENTS", "500"))
+
+    # GET /events/export: filas por página leída de SQLite
+    EXPORT_PAGE_ROWS: int = int(os.getenv("EXPORT_PAGE_ROWS", "1000"))
+
+    # GET /live (SSE)
+    LIVE_CLIENT_BUFFER: int = int(os.getenv("LIVE_CLIENT_BUFFER", "100"))   # mensajes por cliente
+    LIVE_MAX_CLIENTS: int = int(os.getenv("LIVE_MAX_CLIENTS", "100"))
+    LIVE_PING_S: float = float(os.getenv("LIVE_PING_S", "15"))
+
+    # POST /counter/metrics: último resumen por proceso counter (en memoria)
+    COUNTER_METRICS_MAX_SOURCES: int = int(os.getenv("COUNTER_METRICS_MAX_SOURCES", "100"))
+
 settings = Settings()
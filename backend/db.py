@@ -1,23 +1,79 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
+
 from backend.config import settings
 
+# Una conexión persistente por hilo (uvicorn corre los handlers sync en un
+# threadpool): se abre y configura una sola vez, no en cada request.
+_local = threading.local()
+_all_conns = []
+_all_lock = threading.Lock()
+
+def _configure(conn: sqlite3.Connection):
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size=-{int(settings.DB_CACHE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(settings.DB_MMAP_MB) * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
 def get_conn():
+    """
+    Conexión nueva (el que llama la cierra). Para scripts / init; los handlers usan connection().
+    """
     conn = sqlite3.connect(settings.DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+    _configure(conn)
     return conn
 
+@contextmanager
+def connection():
+    """
+    Conexión persistente del hilo actual. Commit al salir, rollback si hubo error.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_conn()
+        _local.conn = conn
+        with _all_lock:
+            _all_conns.append(conn)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def close_all():
+    with _all_lock:
+        for c in _all_conns:
+            try:
+                c.close()
+            except Exception:
+                pass
+        _all_conns.clear()
+
 def init_db():
     conn = get_conn()
     cur = conn.cursor()
 
+    # WAL: lectores no bloquean al escritor (queda guardado en el archivo)
+    cur.execute("PRAGMA journal_mode=WAL")
+
     # Tabla principal
     cur.execute("""
     CREATE TABLE IF NOT EXISTS events (
         id TEXT PRIMARY KEY,
         ts TEXT NOT NULL,
+        ts_ms INTEGER,
         camera_id TEXT,
         direction TEXT,
         count_delta INTEGER NOT NULL,
+        track_id INTEGER,
+        person_id INTEGER,
+        track_epoch INTEGER,
+        snapshot TEXT,
+        event TEXT,
         meta_json TEXT,
         sent_ok INTEGER NOT NULL DEFAULT 0,
         sent_at TEXT
@@ -35,4 +91,170 @@ def init_db():
         cur.execute("ALTER TABLE events ADD COLUMN sent_at TEXT")
 
     conn.commit()
-    conn.close()
\ No newline at end of file
+
+    ensure_ts_ms(conn)
+    ensure_typed_meta(conn)
+    init_rollups(conn)
+    conn.close()
+
+def ensure_ts_ms(conn: sqlite3.Connection):
+    """
+    Columna ts_ms (epoch ms UTC) + índices para filtros por rango de tiempo.
+    ts sigue siendo el texto ISO de siempre; las consultas por rango usan ts_ms.
+    Filas antiguas: se rellena desde ts (julianday entiende 'T', ' ', fracción y 'Z').
+    """
+    cur = conn.cursor()
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(events)")}
+    if "ts_ms" not in cols:
+        cur.execute("ALTER TABLE events ADD COLUMN ts_ms INTEGER")
+
+    cur.execute("""
+        UPDATE events
+        SET ts_ms = CAST(ROUND((julianday(ts) - 2440587.5) * 86400000.0) AS INTEGER)
+        WHERE ts_ms IS NULL AND julianday(ts) IS NOT NULL
+    """)
+
+    # (ts_ms, id): orden total para la paginación por cursor de /events
+    cur.execute("DROP INDEX IF EXISTS idx_events_ts_ms")
+    cur.execute("DROP INDEX IF EXISTS idx_events_camera_ts_ms")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_ts_ms_id ON events (ts_ms, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_camera_ts_ms_id ON events (camera_id, ts_ms, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_sent_ts_ms ON events (sent_ok, ts_ms)")
+    conn.commit()
+
+def ensure_typed_meta(conn: sqlite3.Connection):
+    """
+    track_id / person_id / track_epoch / snapshot / event como columnas.
+    Al crearlas se migran desde meta_json (JSON1) y se sacan de ahí; si no
+    queda nada más, meta_json pasa a NULL.
+    """
+    cur = conn.cursor()
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(events)")}
+    added = False
+    for name, typ in (("track_id", "INTEGER"), ("person_id", "INTEGER"), ("track_epoch", "INTEGER"),
+                      ("snapshot", "TEXT"), ("event", "TEXT")):
+        if name not in cols:
+            cur.execute(f"ALTER TABLE events ADD COLUMN {name} {typ}")
+            added = True
+
+    if added:
+        # meta_json inválido (nunca debería pasar) se conserva como texto
+        cur.execute(
+            "UPDATE events SET meta_json = json_object('raw', meta_json) "
+            "WHERE meta_json IS NOT NULL AND NOT json_valid(meta_json)"
+        )
+        cur.execute("""
+            UPDATE events SET
+                track_id = CASE WHEN json_type(meta_json, '$.track_id') = 'integer'
+                                THEN json_extract(meta_json, '$.track_id') END,
+                person_id = CASE WHEN json_type(meta_json, '$.person_id') = 'integer'
+                                 THEN json_extract(meta_json, '$.person_id') END,
+                track_epoch = CASE WHEN json_type(meta_json, '$.track_epoch') = 'integer'
+                                   THEN json_extract(meta_json, '$.track_epoch') END,
+                snapshot = CASE WHEN json_type(meta_json, '$.snapshot') = 'text'
+                                THEN json_extract(meta_json, '$.snapshot') END,
+                event = CASE WHEN json_type(meta_json, '$.event') = 'text'
+                             THEN json_extract(meta_json, '$.event') END
+            WHERE json_valid(meta_json)
+        """)
+        # Solo se quita de meta_json lo que quedó en su columna
+        for name in ("track_id", "person_id", "track_epoch", "snapshot", "event"):
+            cur.execute(
+                f"UPDATE events SET meta_json = json_remove(meta_json, '$.{name}') "
+                f"WHERE {name} IS NOT NULL AND json_valid(meta_json)"
+            )
+        cur.execute("UPDATE events SET meta_json = NULL WHERE meta_json IN ('{}', 'null', '')")
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_person_ts_ms ON events (person_id, ts_ms, id)")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_snapshot_ts_ms ON events (ts_ms, id) WHERE snapshot IS NOT NULL"
+    )
+    conn.commit()
+
+# Minuto (epoch // 60) a partir de ts_ms; filas sin fecha válida van al bucket 0
+_BUCKET_OF = "COALESCE({ts_ms} / 60000, 0)"
+
+def init_rollups(conn: sqlite3.Connection):
+    """
+    Rollups para /status y /metrics (sin escanear events):
+      - counts_minute: (minuto, cámara, dirección) -> eventos y suma de count_delta
+      - counts_total:  (cámara, dirección)         -> lo mismo, histórico
+
+    Se mantienen con triggers, o sea en la MISMA transacción del INSERT
+    (los INSERT OR IGNORE duplicados no disparan el trigger).
+    La primera vez se rellenan desde events.
+    """
+    cur = conn.cursor()
+    existing = {r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS counts_minute (
+            bucket INTEGER NOT NULL,
+            camera_id TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            events INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (bucket, camera_id, direction)
+        ) WITHOUT ROWID
+        """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS counts_total (
+            camera_id TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            events INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (camera_id, direction)
+        ) WITHOUT ROWID
+        """)
+
+        if "counts_minute" not in existing:
+            cur.execute(f"""
+                INSERT INTO counts_minute (bucket, camera_id, direction, events, total)
+                SELECT {_BUCKET_OF.format(ts_ms="ts_ms")}, COALESCE(camera_id, ''), COALESCE(direction, 'unknown'),
+                       COUNT(*), SUM(count_delta)
+                FROM events
+                GROUP BY 1, 2, 3
+            """)
+        if "counts_total" not in existing:
+            cur.execute("""
+                INSERT INTO counts_total (camera_id, direction, events, total)
+                SELECT COALESCE(camera_id, ''), COALESCE(direction, 'unknown'), COUNT(*), SUM(count_delta)
+                FROM events
+                GROUP BY 1, 2
+            """)
+
+        # Se recrean siempre: así una versión nueva del trigger reemplaza a la anterior
+        cur.execute("DROP TRIGGER IF EXISTS events_rollup_ins")
+        cur.execute("DROP TRIGGER IF EXISTS events_rollup_del")
+        cur.execute(f"""
+        CREATE TRIGGER events_rollup_ins AFTER INSERT ON events
+        BEGIN
+            INSERT INTO counts_minute (bucket, camera_id, direction, events, total)
+            VALUES ({_BUCKET_OF.format(ts_ms="NEW.ts_ms")}, COALESCE(NEW.camera_id, ''),
+                    COALESCE(NEW.direction, 'unknown'), 1, NEW.count_delta)
+            ON CONFLICT (bucket, camera_id, direction)
+            DO UPDATE SET events = events + 1, total = total + excluded.total;
+
+            INSERT INTO counts_total (camera_id, direction, events, total)
+            VALUES (COALESCE(NEW.camera_id, ''), COALESCE(NEW.direction, 'unknown'), 1, NEW.count_delta)
+            ON CONFLICT (camera_id, direction)
+            DO UPDATE SET events = events + 1, total = total + excluded.total;
+        END
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER events_rollup_del AFTER DELETE ON events
+        BEGIN
+            UPDATE counts_minute SET events = events - 1, total = total - OLD.count_delta
+            WHERE bucket = {_BUCKET_OF.format(ts_ms="OLD.ts_ms")}
+              AND camera_id = COALESCE(OLD.camera_id, '') AND direction = COALESCE(OLD.direction, 'unknown');
+
+            UPDATE counts_total SET events = events - 1, total = total - OLD.count_delta
+            WHERE camera_id = COALESCE(OLD.camera_id, '') AND direction = COALESCE(OLD.direction, 'unknown');
+        END
+        """)
+        cur.execute("COMMIT")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
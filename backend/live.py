@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+
+
+# =========================
+# Fan-out en proceso para /live (SSE)
+# =========================
+
+class _Subscriber:
+    def __init__(self, loop, maxsize, camera_id):
+        self.loop = loop
+        self.q = asyncio.Queue(maxsize=maxsize)
+        self.camera_id = camera_id
+        self.dropped = False
+
+
+class LiveHub:
+    """
+    Un buffer acotado por cliente. publish() se llama desde los handlers
+    sync (threadpool) después del commit y nunca espera a nadie: si el buffer
+    de un cliente está lleno, ese cliente se desconecta (vuelve a conectar y
+    se resincroniza con el snapshot inicial) en vez de frenar la ingesta.
+    """
+
+    def __init__(self, client_buffer=100, max_clients=100):
+        self.client_buffer = int(client_buffer)
+        self.max_clients = int(max_clients)
+        self._subs = set()
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.dropped_clients = 0
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subs)
+
+    def subscribe(self, loop, camera_id=None):
+        with self._lock:
+            if len(self._subs) >= self.max_clients:
+                return None
+            sub = _Subscriber(loop, self.client_buffer, camera_id)
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, kind, data, camera_id=None):
+        """
+        Mensaje SSE ya serializado (una vez para todos los clientes).
+        camera_id: si viene, solo lo reciben los clientes sin filtro o con esa cámara.
+        """
+        msg = f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            if camera_id is not None and sub.camera_id not in (None, camera_id):
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(self._offer, sub, msg)
+            except RuntimeError:
+                # loop cerrado (shutdown)
+                self.unsubscribe(sub)
+        self.published += 1
+
+    def _offer(self, sub, msg):
+        # Corre en el event loop del cliente
+        if sub.dropped:
+            return
+        try:
+            sub.q.put_nowait(msg)
+        except asyncio.QueueFull:
+            sub.dropped = True
+            self.dropped_clients += 1
+            self.unsubscribe(sub)
+            # despertar al generador para que cierre el stream
+            while not sub.q.empty():
+                sub.q.get_nowait()
+            sub.q.put_nowait(None)
+
+    def stats(self):
+        return {
+            "clients": len(self._subs),
+            "published": self.published,
+            "dropped_clients": self.dropped_clients,
+        }
@@ -1,9 +1,17 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, Literal
-from datetime import datetime
+from typing import Optional, Dict, Any, Literal, List
+from datetime import datetime, timezone
 import uuid
 
+# Campos que el counter manda siempre en meta: en la BD son columnas propias
+# (filtrables / indexadas); meta_json queda solo para lo demás.
+TYPED_META_INT = ("track_id", "person_id", "track_epoch")
+TYPED_META_STR = ("snapshot", "event")
+TYPED_META = TYPED_META_INT + TYPED_META_STR
+
 class EventIn(BaseModel):
+    # id opcional del cliente: si se reintenta el mismo evento no se duplica
+    id: Optional[str] = Field(None, min_length=1, max_length=64)
     camera_id: Optional[str] = "CAM-01"
     direction: Optional[Literal["in", "out", "unknown"]] = "unknown"
     count_delta: int = Field(..., description="Positive for IN, negative for OUT")
@@ -12,17 +20,73 @@ class EventIn(BaseModel):
 class EventOut(BaseModel):
     id: str
     ts: str
+    ts_ms: Optional[int] = None   # epoch en ms (UTC), columna indexada
     camera_id: Optional[str]
     direction: str
     count_delta: int
     meta: Optional[Dict[str, Any]] = None
+    track_id: Optional[int] = None
+    person_id: Optional[int] = None
+    track_epoch: Optional[int] = None
+    snapshot: Optional[str] = None
+    event: Optional[str] = None
+
+class BatchResult(BaseModel):
+    received: int
+    inserted: int
+    duplicates: int
+    ids: List[str]
+
+class CounterMetricsIn(BaseModel):
+    # Push periódico de metrics.MetricsPusher (people_counter / supervisor)
+    source: str = Field(..., min_length=1, max_length=64)
+    metrics: Dict[str, Any]
+
+# INTEGER de SQLite: fuera de este rango el insert revienta con OverflowError
+SQLITE_INT_MIN, SQLITE_INT_MAX = -(2 ** 63), 2 ** 63 - 1
+
+def _as_int(v: Any) -> Optional[int]:
+    """Entero (o float entero, 12.0) que cabe en un INTEGER de SQLite; si no, None."""
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    if isinstance(v, int) and SQLITE_INT_MIN <= v <= SQLITE_INT_MAX:
+        return v
+    return None
+
+def split_meta(meta: Optional[Dict[str, Any]]):
+    """
+    meta -> (campos tipados, resto). Un valor que no calza con el tipo de la
+    columna (p.ej. track_id no entero, con decimales o fuera de int64) se
+    queda en el resto.
+    """
+    typed: Dict[str, Any] = {}
+    extra: Dict[str, Any] = {}
+    for k, v in (meta or {}).items():
+        if v is None and k in TYPED_META:
+            continue
+        if k in TYPED_META_INT:
+            n = _as_int(v)
+            if n is not None:
+                typed[k] = n
+                continue
+        elif k in TYPED_META_STR and isinstance(v, str):
+            typed[k] = v
+            continue
+        extra[k] = v
+    return typed, extra
 
 def make_event_out(e: EventIn) -> EventOut:
+    now = datetime.utcnow()
+    typed, _ = split_meta(e.meta)
     return EventOut(
-        id=str(uuid.uuid4()),
-        ts=datetime.utcnow().isoformat() + "Z",
+        id=e.id or str(uuid.uuid4()),
+        ts=now.isoformat() + "Z",
+        ts_ms=int(now.replace(tzinfo=timezone.utc).timestamp() * 1000),
         camera_id=e.camera_id,
         direction=e.direction,
         count_delta=e.count_delta,
         meta=e.meta or {},
+        **typed,
     )
@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+
+# -------------------- PRUEBA DE CARGA DEL BACKEND --------------------
+#
+#   python bench_backend.py                      # levanta el backend aquí mismo (DB temporal)
+#   python bench_backend.py --url http://127.0.0.1:8000 --api-key XXX
+#   python bench_backend.py --batch 50           # POST /events/batch de 50 eventos
+#
+# Mezcla POST /events y GET /metrics desde varios hilos (keep-alive) y
+# entrega JSON con req/s, eventos/s y latencias p50/p95/p99 por endpoint.
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_local_backend(db_path):
+    """
+    Backend en un hilo con una DB temporal (no toca people_counter.db).
+    """
+    os.environ["DB_PATH"] = db_path
+    os.environ.setdefault("SNAPSHOT_DIR", tempfile.mkdtemp(prefix="bench_snap_"))
+
+    import uvicorn
+    from backend.app import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    t = threading.Thread(target=server.run, daemon=True)
+    t.start()
+
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if requests.get(url + "/health", timeout=0.5).ok:
+                return url, server
+        except Exception:
+            time.sleep(0.1)
+    raise RuntimeError("No se pudo levantar el backend local")
+
+def _event(i):
+    return {
+        "camera_id": "CAM-BENCH",
+        "direction": "in",
+        "count_delta": 1,
+        "meta": {"track_id": i, "event": "bench"},
+    }
+
+def _worker(url, headers, n, read_every, batch, lat, errors, events):
+    s = requests.Session()
+    write_key = "POST /events/batch" if batch > 1 else "POST /events"
+    for i in range(n):
+        is_read = read_every > 0 and (i % read_every) == read_every - 1
+        t0 = time.perf_counter()
+        try:
+            if is_read:
+                r = s.get(url + "/metrics", headers=headers, timeout=10)
+            elif batch > 1:
+                r = s.post(url + "/events/batch", headers=headers, timeout=10,
+                           json=[_event(i * batch + k) for k in range(batch)])
+            else:
+                r = s.post(url + "/events", headers=headers, timeout=10, json=_event(i))
+            r.raise_for_status()
+        except Exception:
+            errors.append(1)
+            continue
+        lat["GET /metrics" if is_read else write_key].append(time.perf_counter() - t0)
+        if not is_read:
+            events.append(batch)
+
+def _dist(values):
+    a = np.asarray(values) * 1000.0
+    if len(a) == 0:
+        return {"n": 0}
+    return {
+        "n": int(len(a)),
+        "p50_ms": round(float(np.percentile(a, 50)), 2),
+        "p95_ms": round(float(np.percentile(a, 95)), 2),
+        "p99_ms": round(float(np.percentile(a, 99)), 2),
+        "mean_ms": round(float(a.mean()), 2),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de carga POST /events + GET /metrics")
+    ap.add_argument("--url", default=None, help="backend ya corriendo; sin esto se levanta uno local")
+    ap.add_argument("--api-key", default=os.getenv("API_KEY", ""))
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=500, help="por hilo")
+    ap.add_argument("--read-every", type=int, default=10, help="1 GET /metrics cada N requests (0 = nunca)")
+    ap.add_argument("--batch", type=int, default=1, help="eventos por POST (>1 usa /events/batch)")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_db_"), "bench.db")
+        url, server = start_local_backend(db_path)
+
+    headers = {"x-api-key": args.api_key} if args.api_key else {}
+    batch = max(1, args.batch)
+    lat = {("POST /events/batch" if batch > 1 else "POST /events"): [], "GET /metrics": []}
+    errors = []
+    events = []
+
+    threads = [
+        threading.Thread(target=_worker, args=(url, headers, args.requests, args.read_every, batch, lat, errors, events))
+        for _ in range(args.threads)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    done = sum(len(v) for v in lat.values())
+    report = {
+        "url": url if server is None else "local",
+        "threads": args.threads,
+        "batch": batch,
+        "requests": done,
+        "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "req_per_s": round(done / wall, 1) if wall > 0 else None,
+        "events_per_s": round(sum(events) / wall, 1) if wall > 0 else None,
+        "endpoints": {k: _dist(v) for k, v in lat.items()},
+    }
+
+    if server is not None:
+        server.should_exit = True
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
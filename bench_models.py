@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+from datetime import datetime
+
+from bench_pipeline import git_commit, person_sprites, run_benchmark, write_synthetic_clip
+from people_counter import load_cfg
+
+
+# -------------------- COMPARAR MODELOS (.pt vs ONNX / OpenVINO / INT8) --------------------
+#
+#   python bench_models.py --video grabacion.mp4 --models yolov8n.pt yolov8n.onnx yolov8n_int8_openvino_model
+#   python bench_models.py --synthetic --models yolov8n.pt yolov8n_int8.onnx --out modelos.json
+#
+# Todos los modelos corren el pipeline completo (bench_pipeline.run_benchmark,
+# mismo tracker ByteTrack) sobre el MISMO clip. El primero es la referencia:
+# para cada uno se reporta latencia de inferencia y por frame, fps y qué tanto
+# coinciden sus cruces con los de la referencia (misma dirección, a menos de
+# --tol-frames frames). Al final recomienda el más rápido que sigue contando bien.
+
+
+def match_crossings(ref, other, tol_frames=15):
+    """
+    Empareja cruces (frame, dirección) de dos corridas: cada cruce de `ref`
+    con a lo más uno de `other` de la misma dirección y a <= tol_frames.
+    """
+    matched = 0
+    for direction in ("in", "out"):
+        a = sorted(f for f, d in ref if d == direction)
+        b = sorted(f for f, d in other if d == direction)
+        j = 0
+        for f in a:
+            while j < len(b) and b[j] < f - tol_frames:
+                j += 1
+            if j < len(b) and abs(b[j] - f) <= tol_frames:
+                matched += 1
+                j += 1
+    n_ref, n_other = len(ref), len(other)
+    precision = matched / n_other if n_other else (1.0 if not n_ref else 0.0)
+    recall = matched / n_ref if n_ref else (1.0 if not n_other else 0.0)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"matched": matched, "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Latencia y concordancia de conteo entre modelos exportados")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--video", help="video grabado (mp4/avi/...)")
+    src.add_argument("--synthetic", action="store_true", help="generar un clip sintético")
+    ap.add_argument("--models", nargs="+", required=True, help="el primero es la referencia (normalmente el .pt)")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--imgsz", type=int, default=None, help="para los modelos de imgsz libre (.pt / --dynamic)")
+    ap.add_argument("--roi-band", action="store_true")
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--people", type=int, default=12)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--tol-frames", type=int, default=15, help="tolerancia para emparejar cruces")
+    ap.add_argument("--min-f1", type=float, default=0.98, help="concordancia mínima para recomendar un modelo")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    from inference import load_model
+
+    cfg = load_cfg(args.config)
+    if args.roi_band:
+        cfg.setdefault("roi", {})["line_band"] = True
+    # Lo adaptativo cambia qué frames ve cada modelo: fuera, para comparar lo mismo
+    cfg.setdefault("motion_gate", {})["enabled"] = False
+    cfg.setdefault("scheduler", {})["enabled"] = False
+
+    models = [(path, load_model(path)) for path in args.models]
+
+    video, expected = args.video, None
+    if args.synthetic:
+        video = os.path.join(tempfile.mkdtemp(prefix="bench_clip_"), "synthetic.avi")
+        _, exp = write_synthetic_clip(video, frames=args.frames, people=args.people, seed=args.seed,
+                                      sprites=person_sprites(models[0][1]))
+        line = cfg.get("line", {})
+        expected = {"in" if line.get("dir_lr", "in") == "in" else "out": exp["lr"],
+                    "out" if line.get("dir_rl", "out") == "out" else "in": exp["rl"]}
+
+    results = []
+    ref_crossings = None
+    for path, model in models:
+        crossings = []
+        summary, stats = run_benchmark(cfg, video, model=model, max_frames=None if args.synthetic else args.frames,
+                                       warmup=args.warmup, imgsz=args.imgsz, crossings=crossings)
+        if ref_crossings is None:
+            ref_crossings = crossings
+        inf = summary["stages"].get("inference", {})
+        r = {
+            "model": path,
+            "runtime": model.runtime,
+            "imgsz": list(model.export_imgsz) if isinstance(model.export_imgsz, tuple) else (model.export_imgsz or args.imgsz),
+            "fps_busy": summary["fps_busy"],
+            "inference_p50_ms": inf.get("p50_ms"),
+            "inference_p95_ms": inf.get("p95_ms"),
+            "frame_p50_ms": summary["latency"].get("p50_ms"),
+            "frame_p95_ms": summary["latency"].get("p95_ms"),
+            "counts": stats["counts"],
+            "vs_reference": match_crossings(ref_crossings, crossings, args.tol_frames),
+        }
+        print(f"🧠 {path}: inferencia p50 {r['inference_p50_ms']} ms | fps {r['fps_busy']}"
+              f" | conteo {r['counts']} | F1 vs ref {r['vs_reference']['f1']}")
+        results.append(r)
+
+    ok = [r for r in results if r["vs_reference"]["f1"] >= args.min_f1 and r["inference_p50_ms"] is not None]
+    best = min(ok, key=lambda r: r["inference_p50_ms"]) if ok else None
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "when": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "source": "synthetic" if args.synthetic else args.video,
+            "reference": args.models[0],
+            "tol_frames": args.tol_frames,
+            "roi_line_band": bool(cfg.get("roi", {}).get("line_band", False)),
+        },
+        "expected_counts": expected,
+        "models": results,
+        "recommended": best["model"] if best else None,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from dispatcher import EventDispatcher
+from people_counter import CameraCounter, load_cfg
+from perf import StageTimer
+from crossing import shift_boxes
+
+
+# -------------------- BENCHMARK OFFLINE DEL PIPELINE --------------------
+#
+# Corre el pipeline completo sin ventana ni red sobre un video grabado o un
+# clip sintético con personas cruzando la línea, y entrega JSON con tiempos
+# por etapa (decode, rotate, inference, tracking, crossing, snapshot,
+# dispatch), fps y latencia p50/p95/p99 por frame.
+#
+#   python bench_pipeline.py --synthetic --out bench.json
+#   python bench_pipeline.py --video grabacion.mp4 --model yolov8n.pt
+#   python bench_pipeline.py --synthetic --detector gt     # sin modelo (solo lógica)
+#
+# El tiempo que ve el contador es el del video (frame / fps), no el reloj,
+# para que los resultados sean comparables entre commits y máquinas.
+
+
+# ---------- clip sintético ----------
+
+def person_sprites(model, min_conf=0.6):
+    """
+    Recortes de personas reales desde las imágenes de ejemplo de Ultralytics
+    (vienen con el paquete, no requiere red).
+    """
+    from ultralytics.utils import ASSETS
+
+    sprites = []
+    for img_path in sorted(ASSETS.glob("*.jpg")):
+        img = cv2.imread(str(img_path))
+        if img is None:
+            continue
+        fixed = getattr(model, "export_imgsz", None)   # exportado de tamaño fijo
+        res = model.predict(img, classes=[0], conf=min_conf, verbose=False, **({"imgsz": fixed} if fixed else {}))[0]
+        for x1, y1, x2, y2 in res.boxes.xyxy.cpu().numpy().astype(int):
+            crop = img[y1:y2, x1:x2]
+            if crop.size and (y2 - y1) > 2 * (x2 - x1) * 0.8:
+                sprites.append(crop.copy())
+    return sprites
+
+def _silhouette(h, w, color):
+    """
+    Figura simple (cabeza + cuerpo) para cuando no hay sprites: sirve para el
+    detector "gt", un modelo real no la va a reconocer como persona.
+    """
+    img = np.full((h, w, 3), 90, np.uint8)
+    r = max(4, w // 4)
+    cv2.circle(img, (w // 2, r + 2), r, color, -1)
+    cv2.rectangle(img, (w // 6, 2 * r + 4), (w - w // 6, h - 1), color, -1)
+    return img
+
+def synthetic_schedule(frames, width, height, people, seed):
+    """
+    Una trayectoria horizontal por persona que cruza todo el ancho dentro del clip.
+    """
+    rng = np.random.default_rng(seed)
+    plan = []
+    for pid in range(1, people + 1):
+        h = int(height * rng.uniform(0.55, 0.8))
+        w = int(h * rng.uniform(0.3, 0.4))
+        speed = float(rng.uniform(width / 120.0, width / 60.0))
+        n = int((width + 2 * w) / speed) + 1
+        start = int(rng.integers(0, max(1, frames - n)))
+        plan.append({
+            "id": pid,
+            "w": w,
+            "h": h,
+            "y2": int(height - rng.integers(0, max(1, height - h))),
+            "speed": speed,
+            "dir": 1 if rng.random() < 0.5 else -1,    # 1 = izquierda→derecha
+            "start": start,
+            "n": n,
+            "sprite": int(rng.integers(0, 1 << 30)),
+            "color": tuple(int(c) for c in rng.integers(40, 255, 3)),
+        })
+    return plan
+
+def write_synthetic_clip(path, frames=600, width=960, height=540, people=12, fps=25, seed=0, sprites=None):
+    """
+    Escribe el clip (MJPG) y devuelve el ground truth por frame:
+    [[(x1, y1, x2, y2, id), ...], ...] más los cruces esperados.
+    """
+    plan = synthetic_schedule(frames, width, height, people, seed)
+
+    rng = np.random.default_rng(seed + 1)
+    bg = np.tile(np.linspace(60, 160, width, dtype=np.uint8)[None, :, None], (height, 1, 3))
+    bg = cv2.add(bg, rng.integers(0, 25, bg.shape, dtype=np.uint8))
+
+    vw = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    gt = []
+    for f in range(frames):
+        frame = bg.copy()
+        boxes = []
+        for p in plan:
+            k = f - p["start"]
+            if k < 0 or k >= p["n"]:
+                continue
+            w, h = p["w"], p["h"]
+            x = -w + k * p["speed"] if p["dir"] > 0 else width - k * p["speed"]
+            x1, y1 = int(x), p["y2"] - h
+            x2, y2 = x1 + w, p["y2"]
+
+            if sprites:
+                img = cv2.resize(sprites[p["sprite"] % len(sprites)], (w, h))
+            else:
+                img = _silhouette(h, w, p["color"])
+
+            cx1, cx2 = max(0, x1), min(width, x2)
+            if cx2 <= cx1:
+                continue
+            frame[y1:y2, cx1:cx2] = img[:, cx1 - x1:cx2 - x1]
+            boxes.append((cx1, y1, cx2, y2, p["id"]))
+        vw.write(frame)
+        gt.append(boxes)
+    vw.release()
+
+    expected = {
+        "lr": sum(1 for p in plan if p["dir"] > 0),
+        "rl": sum(1 for p in plan if p["dir"] < 0),
+    }
+    return gt, expected
+
+
+# ---------- ejecución ----------
+
+def offline_dispatcher():
+    """
+    Mismo EventDispatcher que en producción, pero los envíos no salen a la red.
+    """
+    disp = EventDispatcher()
+    disp.add_destination("backend", lambda session, payload: True)
+    disp.add_destination("unus", lambda session, job: True)
+    return disp
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+def run_benchmark(cfg, video_path, detector="model", model=None, gt=None, max_frames=None,
+                  warmup=10, imgsz=None, snapshot_dir=None, crossings=None):
+    """
+    Corre el pipeline sobre video_path. Devuelve (summary, stats) donde
+    stats incluye los conteos IN/OUT del contador.
+    crossings: lista a la que se agrega (frame, "in" | "out") por cada cruce
+    (para comparar modelos en bench_models.py).
+    """
+    cfg = copy.deepcopy(cfg)
+    cfg.setdefault("display", {})["show"] = False
+    cfg.setdefault("unus", {})["enabled"] = False
+    cfg.setdefault("snapshots", {})["dir"] = snapshot_dir or tempfile.mkdtemp(prefix="bench_snap_")
+
+    conf = float(cfg.get("conf", 0.4))
+    iou = float(cfg.get("iou", 0.5))
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir el video: {video_path}")
+    fps_src = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    dispatcher = offline_dispatcher()
+    timer = StageTimer()
+    cam = CameraCounter(cfg, dispatcher, timer=timer)
+    tracker = None
+    if detector == "model":
+        from inference import StreamTracker, detect_batch
+        tracker = StreamTracker(cfg.get("tracker", "bytetrack.yaml"), frame_rate=int(round(fps_src)))
+
+    i = 0
+    while max_frames is None or i < max_frames:
+        if i == warmup:
+            timer = StageTimer()
+            cam.timer = timer
+
+        t0 = time.perf_counter()
+        with timer.stage("decode"):
+            ret, frame0 = cap.read()
+        if not ret or frame0 is None:
+            break
+
+        now = i / fps_src
+        view, offset = cam.inference_view(frame0)
+        xyxy, ids = None, None
+        infer_s = 0.0
+        inferred = cam.should_infer(view, now)
+        if not inferred:
+            pass
+        elif detector == "model":
+            t_inf = time.perf_counter()
+            with timer.stage("inference"):
+                res = detect_batch(model, [view], conf=conf, iou=iou, imgsz=imgsz or cam.inference_imgsz())[0]
+            infer_s = time.perf_counter() - t_inf
+            with timer.stage("tracking"):
+                xyxy, ids = tracker.update(res, view)
+                xyxy = shift_boxes(xyxy, offset)
+        else:
+            boxes = gt[i] if i < len(gt) else []
+            if boxes:
+                a = np.asarray(boxes, dtype=np.float32)
+                xyxy, ids = a[:, :4], a[:, 4].astype(int)
+
+        before = (cam.total_in, cam.total_out)
+        cam.process(frame0, xyxy, ids, now, inferred=inferred)
+        if crossings is not None:
+            crossings.extend([(i, "in")] * (cam.total_in - before[0]) + [(i, "out")] * (cam.total_out - before[1]))
+        if inferred:
+            cam.observe_inference(infer_s, now)
+        timer.frame_done(time.perf_counter() - t0)
+        i += 1
+
+    cap.release()
+    cam.close()
+    dispatcher.close()
+
+    stats = {
+        "frames_read": i,
+        "warmup_frames": min(warmup, i),
+        "counts": {"in": cam.total_in, "out": cam.total_out},
+        "dispatch": dispatcher.stats(),
+        "motion_gate": cam.gate.stats() if cam.gate is not None else None,
+        "scheduler": cam.scheduler.stats() if cam.scheduler is not None else None,
+        "snapshots": cam.snap_writer.stats() if cam.snap_writer is not None else None,
+    }
+    return timer.summary(), stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark offline del pipeline de people_counter")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--video", help="video grabado (mp4/avi/...)")
+    src.add_argument("--synthetic", action="store_true", help="generar un clip sintético")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--model", default=None, help="por defecto el 'model:' del config")
+    ap.add_argument("--detector", choices=["model", "gt"], default="model",
+                    help="gt = cajas del clip sintético (sin inferencia)")
+    ap.add_argument("--imgsz", type=int, default=None)
+    ap.add_argument("--roi-band", action="store_true", help="inferir solo en la franja de la línea")
+    ap.add_argument("--motion-gate", action="store_true", help="saltar el modelo sin movimiento")
+    ap.add_argument("--scheduler", action="store_true", help="stride/imgsz adaptativos")
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--width", type=int, default=960)
+    ap.add_argument("--height", type=int, default=540)
+    ap.add_argument("--people", type=int, default=12)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--keep-clip", default=None, help="guardar el clip sintético en esta ruta")
+    ap.add_argument("--out", default=None, help="archivo JSON de salida (además de stdout)")
+    args = ap.parse_args()
+
+    cfg = load_cfg(args.config)
+    if args.roi_band:
+        cfg.setdefault("roi", {})["line_band"] = True
+    if args.motion_gate:
+        cfg.setdefault("motion_gate", {})["enabled"] = True
+    if args.scheduler:
+        cfg.setdefault("scheduler", {})["enabled"] = True
+    model_path = args.model or cfg.get("model", "yolov8n.pt")
+
+    if args.detector == "gt" and not args.synthetic:
+        ap.error("--detector gt solo funciona con --synthetic")
+
+    model = None
+    if args.detector == "model":
+        from inference import load_model
+        model = load_model(model_path)
+
+    gt, expected = None, None
+    video = args.video
+    if args.synthetic:
+        video = args.keep_clip or os.path.join(tempfile.mkdtemp(prefix="bench_clip_"), "synthetic.avi")
+        sprites = person_sprites(model) if model is not None else None
+        gt, exp = write_synthetic_clip(
+            video, frames=args.frames, width=args.width, height=args.height,
+            people=args.people, seed=args.seed, sprites=sprites,
+        )
+        line = cfg.get("line", {})
+        expected = {line.get("dir_lr", "in"): exp["lr"], line.get("dir_rl", "out"): exp["rl"]}
+
+    summary, stats = run_benchmark(
+        cfg, video,
+        detector=args.detector,
+        model=model,
+        gt=gt,
+        max_frames=None if args.synthetic else args.frames,
+        warmup=args.warmup,
+        imgsz=args.imgsz,
+    )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "when": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "source": "synthetic" if args.synthetic else args.video,
+            "detector": args.detector,
+            "model": model_path if args.detector == "model" else None,
+            "imgsz": args.imgsz,
+            "seed": args.seed if args.synthetic else None,
+            "rotate_deg": int(cfg.get("rotate_deg", 0)),
+            "roi_line_band": bool(cfg.get("roi", {}).get("line_band", False)),
+            "motion_gate": bool(cfg.get("motion_gate", {}).get("enabled", False)),
+            "scheduler": bool(cfg.get("scheduler", {}).get("enabled", False)),
+        },
+        **summary,
+        **stats,
+        "expected_counts": expected,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
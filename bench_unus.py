@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from mock_unus import add_fault_args, mock_from_args, start_mock
+
+
+# -------------------- PRUEBA DE CARGA DEL ENVÍO A UNUS --------------------
+#
+#   python bench_unus.py counter --events 2000 --rate 50 --latency-ms 80
+#   python bench_unus.py counter --mode coalesce --events 2000 --rate 200
+#   python bench_unus.py counter --events 500 --down-s 20          # caída del WS
+#   python bench_unus.py replay --events 5000 --inflight 8 --latency-ms 80
+#   python bench_unus.py replay --events 2000 --error-rate 0.05 --nil-rate 0.01
+#
+# Todo contra mock_unus.py (nunca el WS real) y con estado temporal (no toca
+# unus_state.db ni people_counter.db). Entrega JSON con el throughput de
+# entrega, cuánto tardó en vaciarse el backlog y qué vio el WS.
+
+CFG_UNUS = {
+    "base_datos_cliente": "CASI_BENCH",
+    "casi_cod": "001",
+    "lect_cod": "A",
+    "pass": "M1",
+    "timeout": 5,
+}
+
+
+def _outbox_cfg(args):
+    # Backoff / breaker cortos: en la prueba se quiere ver el vaciado, no esperar 15 min
+    return {
+        "backoff_base_s": args.backoff_base_s,
+        "backoff_max_s": args.backoff_max_s,
+        "max_attempts": args.max_attempts,
+        "breaker_failures": 3,
+        "breaker_open_s": args.breaker_open_s,
+        "breaker_max_open_s": args.breaker_open_s * 4,
+    }
+
+
+def bench_counter(args, base_url, mock):
+    """
+    Camino del counter: make_dispatcher -> hilo "unus" -> outbox (SQLite) -> WS.
+    Se encolan `events` acumulados a `rate` ev/s y se manda ("flush",) cada
+    flush_every_s, como hace main(), hasta que no queda nada pendiente.
+    """
+    import people_counter as pc
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_unus_"))
+    pc.UNUS_STORE_FILE = tmp / "unus_state.db"
+    pc.UNUS_STATE_FILE = tmp / "unus_state.json"
+    pc.UNUS_PENDING_FILE = tmp / "unus_pending.json"
+
+    cfg_unus = dict(CFG_UNUS, base_url=base_url, mode=args.mode,
+                    coalesce_interval_s=args.coalesce_interval_s, outbox=_outbox_cfg(args))
+    disp = pc.make_dispatcher(None, cfg_unus, True, {"unus_queue": args.queue})
+    outbox = pc.get_unus_outbox(cfg_unus)
+
+    def backlog():
+        held = pc._unus_coalescer.stats()["held"] if pc._unus_coalescer is not None else 0
+        return disp.stats()["unus"]["depth"] + outbox.store.count_pending() + held
+
+    t_base = datetime.now().replace(microsecond=0)
+    t0 = time.perf_counter()
+    last_flush = t0
+    max_backlog = 0
+    for i in range(1, args.events + 1):
+        fecha_hora = (t_base + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S")
+        disp.submit("unus", ("acumulado", cfg_unus, i, fecha_hora))
+        now = time.perf_counter()
+        if now - last_flush >= args.flush_every_s:
+            disp.submit("unus", ("flush",))
+            last_flush = now
+        if i % 50 == 0:
+            max_backlog = max(max_backlog, backlog())
+        if args.rate > 0:
+            wait = t0 + i / args.rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+    t_fed = time.perf_counter()
+
+    # Vaciado: flush periódico hasta que no quede nada (o timeout)
+    while backlog() > 0 and time.perf_counter() - t_fed < args.timeout_s:
+        max_backlog = max(max_backlog, backlog())
+        if time.perf_counter() - last_flush >= args.flush_every_s:
+            disp.submit("unus", ("flush",))
+            last_flush = time.perf_counter()
+        time.sleep(0.05)
+    t_done = time.perf_counter()
+    left = backlog()
+    disp.close()
+
+    ws = mock.stats()
+    return {
+        "target": "counter",
+        "mode": args.mode,
+        "events": args.events,
+        "rate": args.rate or "burst",
+        "feed_s": round(t_fed - t0, 3),
+        "delivered_s": round(t_done - t0, 3),
+        "drain_after_feed_s": round(t_done - t_fed, 3),
+        "left": left,
+        "max_backlog": max_backlog,
+        "ws_requests_per_event": round(ws["requests"] / args.events, 3) if args.events else None,
+        # el acumulado del movimiento más reciente que quedó en el WS es el total real
+        "final_total_ok": ws["last"].get(CFG_UNUS["casi_cod"], (None, None))[1] == str(args.events),
+        "dispatcher": disp.stats()["unus"],
+        "unus": pc.unus_stats(cfg_unus),
+    }
+
+
+def bench_replay(args, base_url, mock):
+    """
+    Camino de replay_sqlite_to_unus: BD temporal con `events` filas pendientes;
+    replay_pending se relanza (como el cron) hasta que no quedan sent_ok = 0.
+    """
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_unus_db_"), "bench.db")
+    from backend.db import init_db
+    from outbox import breaker_from_cfg, policy_from_cfg
+    from replay_sqlite_to_unus import ensure_sent_columns, replay_pending
+
+    init_db()
+    conn = sqlite3.connect(os.environ["DB_PATH"], check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+
+    start_dt = (datetime.now() - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+    for i in range(args.events):
+        dt = start_dt + timedelta(seconds=i + 1)
+        rows.append((str(uuid.uuid4()), dt.strftime("%Y-%m-%d %H:%M:%S"), int(dt.timestamp() * 1000),
+                     "CAM-BENCH", "in", 1))
+    conn.executemany(
+        "INSERT INTO events (id, ts, ts_ms, camera_id, direction, count_delta) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    ensure_sent_columns(conn)
+
+    cfg_unus = dict(CFG_UNUS, base_url=base_url)
+    ocfg = _outbox_cfg(args)
+    policy, breaker = policy_from_cfg(ocfg), breaker_from_cfg(ocfg)
+    start_ms = int(start_dt.timestamp() * 1000)
+
+    def pending():
+        return conn.execute("SELECT COUNT(*) FROM events WHERE sent_ok = 0").fetchone()[0]
+
+    t0 = time.perf_counter()
+    runs = []
+    while pending() > 0 and time.perf_counter() - t0 < args.timeout_s:
+        while not breaker.allow():
+            time.sleep(0.1)
+        st = replay_pending(conn, cfg_unus, start_ms, inflight=args.inflight, commit_every=args.commit_every,
+                            progress_every_s=0, policy=policy, breaker=breaker)
+        runs.append({k: st.get(k) for k in ("sent", "failed", "dead", "retries", "elapsed_s", "rate_per_s")})
+    elapsed = time.perf_counter() - t0
+
+    sent = conn.execute("SELECT COUNT(*) FROM events WHERE sent_ok = 1").fetchone()[0]
+    dead = conn.execute("SELECT COUNT(*) FROM events WHERE sent_ok = -1").fetchone()[0]
+    left = pending()
+    conn.close()
+
+    ws = mock.stats()
+    return {
+        "target": "replay",
+        "events": args.events,
+        "inflight": args.inflight,
+        "drain_s": round(elapsed, 3),
+        "events_per_s": round(sent / elapsed, 1) if elapsed > 0 else None,
+        "sent": sent,
+        "dead": dead,
+        "left": left,
+        "runs": len(runs),
+        "ws_requests_per_event": round(ws["requests"] / args.events, 3) if args.events else None,
+        "replay_runs": runs,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de carga del envío a UNUS contra el WS simulado")
+    ap.add_argument("target", choices=["counter", "replay"])
+    ap.add_argument("--events", type=int, default=1000)
+    ap.add_argument("--timeout-s", type=float, default=300.0, help="tope para vaciar el backlog")
+    ap.add_argument("--out", default=None)
+
+    g = ap.add_argument_group("counter")
+    g.add_argument("--rate", type=float, default=0.0, help="eventos/s entrantes (0 = ráfaga)")
+    g.add_argument("--mode", choices=["per_crossing", "coalesce"], default="per_crossing")
+    g.add_argument("--coalesce-interval-s", type=float, default=2.0)
+    g.add_argument("--flush-every-s", type=float, default=1.0)
+    g.add_argument("--queue", type=int, default=256, help="dispatch.unus_queue")
+
+    g = ap.add_argument_group("replay")
+    g.add_argument("--inflight", type=int, default=4)
+    g.add_argument("--commit-every", type=int, default=100)
+
+    g = ap.add_argument_group("outbox / reintentos")
+    g.add_argument("--backoff-base-s", type=float, default=0.5)
+    g.add_argument("--backoff-max-s", type=float, default=5.0)
+    g.add_argument("--breaker-open-s", type=float, default=2.0)
+    g.add_argument("--max-attempts", type=int, default=5)
+
+    g = ap.add_argument_group("WS simulado")
+    add_fault_args(g)
+    args = ap.parse_args()
+
+    base_url, mock, server = start_mock(mock_from_args(args))
+    try:
+        report = bench_counter(args, base_url, mock) if args.target == "counter" else bench_replay(args, base_url, mock)
+    finally:
+        server.shutdown()
+    report["ws"] = mock.stats()
+    report["ws"].pop("last", None)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import cv2
+
+
+# -------------------- CAPTURA EN HILO (último frame) --------------------
+
+class LatestFrameCapture:
+    """
+    Lee la cámara en un hilo propio y guarda solo el frame más nuevo.
+
+    Con RTSP, si el loop principal tarda en inferencia, el buffer de OpenCV
+    se llena y terminamos contando con frames de hace varios segundos.
+    Aquí el hilo drena la cámara a su ritmo y el loop principal toma lo último.
+
+    drop_policy:
+      - "latest": siempre se publica el frame más nuevo (los no leídos se descartan)
+      - "nth":    solo se publica 1 de cada `keep_every_n` frames decodificados
+
+    Si read() falla (RTSP caído, cámara reiniciada) se espera reconnect_wait_s
+    y se vuelve a abrir la fuente: un VideoCapture muerto no se recupera solo.
+    """
+
+    def __init__(self, source, drop_policy="latest", keep_every_n=1,
+                 stale_after_s=1.0, reconnect_wait_s=0.5):
+        if drop_policy not in ("latest", "nth"):
+            raise ValueError("capture.drop_policy must be one of: latest, nth")
+
+        self.source = source
+        self.drop_policy = drop_policy
+        self.keep_every_n = max(1, int(keep_every_n))
+        self.stale_after_s = float(stale_after_s)
+        self.reconnect_wait_s = float(reconnect_wait_s)
+
+        self._cap = cv2.VideoCapture(source)
+        if not self._cap.isOpened():
+            raise RuntimeError("No se pudo abrir la cámara (SOURCE/RTSP/credenciales/red).")
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._frame = None
+        self._frame_ts = 0.0
+        self._seq = 0
+        self._last_read_seq = 0
+
+        # Contadores (se leen con stats())
+        self.decoded = 0
+        self.published = 0
+        self.dropped = 0      # publicados que nadie alcanzó a leer + saltados por "nth"
+        self.stale = 0        # entregados con más de stale_after_s de antigüedad
+        self.read_errors = 0
+        self.reconnects = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _reconnect(self):
+        self._cap.release()
+        self._cap = cv2.VideoCapture(self.source)
+        self.reconnects += 1
+        if self._cap.isOpened():
+            print(f"🔄 Cámara reabierta (reconexión #{self.reconnects})")
+        else:
+            print(f"No se pudo reabrir la cámara (intento #{self.reconnects}). Reintentando...")
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # El hilo es dueño de _cap: si release() no alcanzó a esperarlo
+            # (p.ej. pegado abriendo un RTSP), lo libera al salir
+            self._cap.release()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            ret, frame = self._cap.read()
+            if not ret or frame is None:
+                self.read_errors += 1
+                print("No se pudo leer frame. Reconectando...")
+                if self._stop.wait(self.reconnect_wait_s):
+                    break
+                self._reconnect()
+                continue
+
+            self.decoded += 1
+            if self.drop_policy == "nth" and (self.decoded % self.keep_every_n) != 0:
+                self.dropped += 1
+                continue
+
+            with self._lock:
+                if self._seq > self._last_read_seq:
+                    # el anterior nunca fue leído
+                    self.dropped += 1
+                self._frame = frame
+                self._frame_ts = time.time()
+                self._seq += 1
+                self.published += 1
+
+    def read(self):
+        """
+        No bloquea. Devuelve (frame, ts_captura) si hay un frame nuevo
+        desde la última lectura, o (None, None) si no hay nada nuevo.
+        """
+        with self._lock:
+            if self._seq == self._last_read_seq or self._frame is None:
+                return None, None
+            self._last_read_seq = self._seq
+            frame, ts = self._frame, self._frame_ts
+
+        if (time.time() - ts) > self.stale_after_s:
+            self.stale += 1
+        return frame, ts
+
+    def stats(self):
+        return {
+            "decoded": self.decoded,
+            "published": self.published,
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "read_errors": self.read_errors,
+            "reconnects": self.reconnects,
+        }
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        else:
+            self._cap.release()
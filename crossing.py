@@ -0,0 +1,399 @@
+import math
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+
+# -------------------- GEOMETRÍA VECTORIZADA --------------------
+
+def transform_points(xs, ys, w, h, rot):
+    """
+    Puntos del frame original -> frame rotado rot grados en sentido horario
+    (mismo convenio que rotate_frame), sobre arrays.
+    """
+    if rot == 0:
+        return xs, ys
+    if rot == 90:
+        return (h - 1 - ys), xs
+    if rot == 180:
+        return (w - 1 - xs), (h - 1 - ys)
+    if rot == 270:
+        return ys, (w - 1 - xs)
+    raise ValueError("rotate_deg must be one of: 0, 90, 180, 270")
+
+def transform_bboxes_xyxy(xyxy, w, h, rot):
+    """
+    xyxy: array (N, 4) en coordenadas del frame original.
+    Devuelve (N, 4) en coordenadas del frame rotado.
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float32)
+    if rot == 0 or len(xyxy) == 0:
+        return xyxy
+    x1, y1, x2, y2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2], xyxy[:, 3]
+    # Con rotaciones de 90° las esquinas opuestas siguen siendo opuestas
+    ax, ay = transform_points(x1, y1, w, h, rot)
+    bx, by = transform_points(x2, y2, w, h, rot)
+    return np.stack([np.minimum(ax, bx), np.minimum(ay, by),
+                     np.maximum(ax, bx), np.maximum(ay, by)], axis=1)
+
+def line_band_rect(w, h, rot, line_pos, half_width):
+    """
+    Franja vertical |x - LINE_X| <= half_width del frame ROTADO, expresada como
+    rectángulo (x1, y1, x2, y2) del frame ORIGINAL (w, h), que es donde corre el modelo.
+    """
+    w_rot = h if rot in (90, 270) else w
+    line_x = int(w_rot * line_pos)
+    a = max(0, line_x - int(half_width))
+    b = min(w_rot, line_x + int(half_width) + 1)
+
+    if rot == 0:
+        return a, 0, b, h
+    if rot == 90:
+        # x_rot = h - 1 - y
+        return 0, h - b, w, h - a
+    if rot == 180:
+        # x_rot = w - 1 - x
+        return w - b, 0, w - a, h
+    if rot == 270:
+        # x_rot = y
+        return 0, a, w, b
+    raise ValueError("rotate_deg must be one of: 0, 90, 180, 270")
+
+def shift_boxes(xyxy, offset):
+    """
+    Cajas detectadas en un recorte -> coordenadas del frame completo.
+    """
+    ox, oy = offset
+    if xyxy is None or (ox == 0 and oy == 0):
+        return xyxy
+    return xyxy + np.array([ox, oy, ox, oy], dtype=xyxy.dtype)
+
+def head_points(boxes):
+    """
+    Punto de la cabeza de cada caja (centro en x, 15% desde arriba): (N, 4) -> (hx, hy).
+    """
+    hx = (boxes[:, 0] + boxes[:, 2]) / 2.0
+    hy = boxes[:, 1] + 0.15 * (boxes[:, 3] - boxes[:, 1])
+    return hx, hy
+
+
+# -------------------- CONTADOR DE CRUCES --------------------
+
+ARM_NONE = 0
+ARM_L = -1
+ARM_R = 1
+
+CrossingEvent = namedtuple("CrossingEvent", "track_id epoch person_id side bbox head")
+TrackFrame = namedtuple("TrackFrame", "boxes heads track_ids epochs person_ids")
+
+
+class TimingWheel:
+    """
+    Vencimientos por cubetas de tick_s segundos (rueda circular de `size`).
+    add() es O(1); due(now) devuelve lo de las cubetas ya alcanzadas, incluida
+    la actual: quien llama revisa el vencimiento exacto y vuelve a agregar lo
+    que todavía no vence. Por eso un deadline a más de una vuelta no es un
+    error: sale antes de tiempo y se reagenda.
+    """
+
+    def __init__(self, span_s, tick_s=1.0):
+        self.tick = float(tick_s)
+        self.size = int(math.ceil(float(span_s) / self.tick)) + 2
+        self.buckets = [[] for _ in range(self.size)]
+        self.cursor = None     # cubeta (absoluta) desde la que falta revisar
+        self.count = 0
+
+    def add(self, item, deadline):
+        k = int(deadline // self.tick)
+        if self.cursor is None:
+            # Antes del primer due(): desde la primera cubeta agregada (si no, lo
+            # que venció antes de ese due() quedaría una vuelta entera sin revisar)
+            self.cursor = k
+        elif k < self.cursor:
+            k = self.cursor
+        self.buckets[k % self.size].append(item)
+        self.count += 1
+
+    def due(self, now):
+        cur = int(now // self.tick)
+        if self.cursor is None:
+            self.cursor = cur
+        n = min(cur - self.cursor + 1, self.size)
+        out = []
+        for k in range(cur - n + 1, cur + 1):
+            b = self.buckets[k % self.size]
+            if b:
+                out.extend(b)
+                b.clear()
+        self.cursor = cur
+        self.count -= len(out)
+        return out
+
+
+class CrossingCounter:
+    """
+    Lógica de cruce de línea vertical (única vez por persona) sobre todas las
+    cajas del frame a la vez.
+
+    Estado por track en arrays NumPy indexados por "slot" (tid -> slot):
+      epoch, armed (L/R), last_seen, last_gone, counted_epoch, person_id.
+    Una clave (tid, epoch) se cuenta una sola vez: counted_epoch[slot] == epoch.
+
+    Memoria acotada: cada slot en uso tiene exactamente una entrada en una
+    TimingWheel. Al vencer, un track vivo sin verse por más de TTL pasa a
+    "ido"; uno ido por más de TTL ya no puede influir en nada salvo su epoch
+    (si reaparece sería epoch + 1, sin armar ni contar), así que se libera el
+    slot y queda solo ese número en `_retired` (a lo más max_tracks, FIFO).
+    Si aun así se llena max_tracks, se desaloja el track más viejo
+    (forced_evictions): único caso en que la semántica puede diferir.
+
+    Supone ids únicos dentro de un mismo frame (ByteTrack lo garantiza).
+    """
+
+    def __init__(self, line_pos=0.5, arm_px=80, cross_tol_px=18, min_box_h_px=110,
+                 track_ttl_s=25.0, rotate_deg=0, capacity=256, max_tracks=4096, wheel_tick_s=1.0):
+        self.line_pos = float(line_pos)
+        self.arm_px = float(arm_px)
+        self.cross_tol = float(cross_tol_px)
+        self.min_box_h = float(min_box_h_px)
+        self.ttl = float(track_ttl_s)
+        self.rotate_deg = int(rotate_deg)
+        self.max_tracks = max(16, int(max_tracks))
+
+        self.next_person_id = 1
+        self.last_line_x = 0
+        self.frame = TrackFrame(np.zeros((0, 4), np.float32), (np.zeros(0), np.zeros(0)),
+                                np.zeros(0, np.int64), np.zeros(0, np.int32), np.zeros(0, np.int64))
+
+        self._slot_of = {}
+        self._free = []
+        self._retired = OrderedDict()    # tid liberado -> epoch con el que volvería
+        self._wheel = TimingWheel(self.ttl, wheel_tick_s)
+        self._n = 0
+        self._alloc(min(int(capacity), self.max_tracks))
+
+        self.released = 0
+        self.forced_evictions = 0
+
+    # ---------- estado ----------
+
+    def _alloc(self, cap):
+        self.epoch = np.zeros(cap, np.int32)
+        self.armed = np.zeros(cap, np.int8)
+        self.last_seen = np.full(cap, np.nan)        # nan = no está vivo
+        self.last_gone = np.full(cap, np.nan)        # nan = sin marca de salida
+        self.counted_epoch = np.full(cap, -1, np.int32)
+        self.person_id = np.zeros(cap, np.int64)     # persona de (tid, counted_epoch)
+        self.tid = np.zeros(cap, np.int64)
+        self.queued = np.zeros(cap, bool)            # tiene su entrada en la rueda
+
+    def _grow(self):
+        old = (self.epoch, self.armed, self.last_seen, self.last_gone, self.counted_epoch, self.person_id,
+               self.tid, self.queued)
+        cap = min(len(self.epoch) * 2, self.max_tracks)
+        self._alloc(cap)
+        for new, prev in zip((self.epoch, self.armed, self.last_seen, self.last_gone,
+                              self.counted_epoch, self.person_id, self.tid, self.queued), old):
+            new[:len(prev)] = prev
+
+    def _new_slot(self, tid, now):
+        if self._free:
+            s = self._free.pop()
+        else:
+            if self._n == len(self.epoch) and self._n < self.max_tracks:
+                self._grow()
+            if self._n < len(self.epoch):
+                s = self._n
+                self._n += 1
+            else:
+                s = self._evict_oldest()
+
+        self.epoch[s] = self._retired.pop(tid, 0)
+        self.armed[s] = ARM_NONE
+        self.last_seen[s] = now
+        self.last_gone[s] = np.nan
+        self.counted_epoch[s] = -1
+        self.person_id[s] = 0
+        self.tid[s] = tid
+        self._slot_of[tid] = s
+        if not self.queued[s]:
+            self.queued[s] = True
+            self._wheel.add(s, now + self.ttl)
+        return s
+
+    def _retire(self, s):
+        """
+        Saca el tid del slot s; si reaparece lo hará con epoch + 1.
+        """
+        tid = int(self.tid[s])
+        del self._slot_of[tid]
+        self._retired[tid] = int(self.epoch[s]) + 1
+        self._retired.move_to_end(tid)
+        if len(self._retired) > self.max_tracks:
+            self._retired.popitem(last=False)
+
+    def _evict_oldest(self):
+        # Lleno: primero el que lleva más tiempo ido, si no el visto hace más tiempo
+        # (los del frame actual tienen last_seen = now, quedan al final)
+        gone = np.isnan(self.last_seen)
+        if gone.any():
+            s = int(np.flatnonzero(gone)[np.argmin(self.last_gone[gone])])
+        else:
+            s = int(np.argmin(self.last_seen))
+        self._retire(s)
+        self.forced_evictions += 1
+        if self.forced_evictions == 1:
+            print(f"⚠ CrossingCounter: más de {self.max_tracks} tracks en memoria, se desalojan los más viejos")
+        return s     # sigue con su entrada en la rueda (queued)
+
+    def _slots(self, ids, now):
+        slots = np.empty(len(ids), np.int64)
+        slot_of = self._slot_of
+        for i, tid in enumerate(ids.tolist()):
+            s = slot_of.get(tid)
+            if s is None:
+                s = self._new_slot(tid, now)
+            else:
+                self.last_seen[s] = now
+            slots[i] = s
+        return slots
+
+    @property
+    def num_tracks(self):
+        return len(self._slot_of)
+
+    # ---------- frame ----------
+
+    def line_x(self, frame_w_rot):
+        return int(frame_w_rot * self.line_pos)
+
+    def update(self, xyxy, ids, now, frame_w, frame_h):
+        """
+        xyxy: (N, 4) cajas en el frame ORIGINAL (sin rotar), ids: (N,) track ids.
+        frame_w/frame_h: tamaño del frame original.
+        Devuelve la lista de CrossingEvent de este frame (en el orden de las cajas).
+        """
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        ids = np.asarray(ids).astype(np.int64).reshape(-1)
+
+        boxes = transform_bboxes_xyxy(xyxy, frame_w, frame_h, self.rotate_deg)
+        w_rot = frame_h if self.rotate_deg in (90, 270) else frame_w
+        LINE_X = self.line_x(w_rot)
+        self.last_line_x = LINE_X
+
+        keep = (boxes[:, 3] - boxes[:, 1]) >= self.min_box_h
+        boxes = boxes[keep]
+        ids = ids[keep]
+
+        s = self._slots(ids, now)
+
+        # Reaparece después de TTL "ido" => nueva época (nueva persona)
+        gone = self.last_gone[s]
+        reepoch = ~np.isnan(gone) & ((now - gone) > self.ttl)
+        if reepoch.any():
+            r = s[reepoch]
+            self.epoch[r] += 1
+            self.last_gone[r] = np.nan
+            self.armed[r] = ARM_NONE
+
+        hx, hy = head_points(boxes)
+        dx = hx - LINE_X
+        adx = np.abs(dx)
+        side = np.where(dx < 0, ARM_L, ARM_R).astype(np.int8)
+
+        a = self.armed[s]
+        a = np.where((a == ARM_NONE) & (adx > self.cross_tol), side, a)
+        a = np.where(dx <= -self.arm_px, ARM_L, a)
+        a = np.where(dx >= self.arm_px, ARM_R, a)
+
+        on_line = adx <= self.cross_tol
+        crossing = on_line & (a != ARM_NONE)
+
+        epochs = self.epoch[s]
+        new_count = crossing & (self.counted_epoch[s] != epochs)
+
+        events = []
+        idx = np.flatnonzero(new_count)
+        if len(idx):
+            cs = s[idx]
+            pids = np.arange(self.next_person_id, self.next_person_id + len(idx), dtype=np.int64)
+            self.next_person_id += len(idx)
+            self.counted_epoch[cs] = epochs[idx]
+            self.person_id[cs] = pids
+            for j, i in enumerate(idx.tolist()):
+                events.append(CrossingEvent(
+                    track_id=int(ids[i]),
+                    epoch=int(epochs[i]),
+                    person_id=int(pids[j]),
+                    side="L" if a[i] == ARM_L else "R",
+                    bbox=tuple(float(v) for v in boxes[i]),
+                    head=(float(hx[i]), float(hy[i])),
+                ))
+
+        # Al pasar por la línea se desarma (se haya contado o no)
+        self.armed[s] = np.where(crossing, ARM_NONE, a)
+
+        counted_now = self.counted_epoch[s] == epochs
+        self.frame = TrackFrame(
+            boxes=boxes,
+            heads=(hx, hy),
+            track_ids=ids,
+            epochs=epochs,
+            person_ids=np.where(counted_now, self.person_id[s], 0),
+        )
+        return events
+
+    def near_line_count(self):
+        """
+        Cuántas cajas del último frame tienen la cabeza a menos de arm_px de la línea.
+        """
+        hx = self.frame.heads[0]
+        if len(hx) == 0:
+            return 0
+        return int(np.count_nonzero(np.abs(hx - self.last_line_x) <= self.arm_px))
+
+    def expire(self, now):
+        """
+        Tracks sin verse por más de TTL: se desarman y se marca cuándo se fueron.
+        Tracks idos hace más de TTL: se libera el slot. Solo mira lo que vence
+        en la rueda (O(1) amortizado por track), no todos los slots.
+        """
+        due = self._wheel.due(now)
+        if not due:
+            return
+        s = np.fromiter(due, np.int64, len(due))
+        self.queued[s] = False
+
+        seen = self.last_seen[s]
+        alive = ~np.isnan(seen)
+        dead = alive & ((now - seen) > self.ttl)
+        if dead.any():
+            d = s[dead]
+            self.last_seen[d] = np.nan
+            self.armed[d] = ARM_NONE
+            self.last_gone[d] = now
+
+        gone = ~alive
+        release = gone & ((now - self.last_gone[s]) > self.ttl)
+        for slot in s[release].tolist():
+            self._retire(slot)
+            self._free.append(slot)
+        self.released += int(np.count_nonzero(release))
+
+        # El resto vuelve a la rueda con su vencimiento actual
+        keep = s[~release]
+        deadline = np.where(np.isnan(self.last_seen[keep]), self.last_gone[keep], self.last_seen[keep]) + self.ttl
+        self.queued[keep] = True
+        for slot, t in zip(keep.tolist(), deadline.tolist()):
+            self._wheel.add(slot, t)
+
+    def stats(self):
+        return {
+            "tracks": len(self._slot_of),
+            "slots": len(self.epoch),
+            "free": len(self._free),
+            "retired": len(self._retired),
+            "wheel": self._wheel.count,
+            "released": self.released,
+            "forced_evictions": self.forced_evictions,
+        }
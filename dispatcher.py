@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# -------------------- DESPACHO HTTP EN SEGUNDO PLANO --------------------
+
+def make_session(pool_size=4):
+    """
+    Session keep-alive: reutiliza la conexión TCP/TLS entre envíos.
+    """
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+class _Destination:
+    def __init__(self, name, handler, maxsize, on_drop, batch_max, batch_window_s, on_idle):
+        self.name = name
+        self.handler = handler          # handler(session, payload) -> bool  (o lista si batch_max > 1)
+        self.on_drop = on_drop          # on_drop(payload) cuando la cola está llena
+        self.on_idle = on_idle          # on_idle(session, final) tras cada envío / sin trabajo / al cerrar
+        self.batch_max = max(1, int(batch_max))
+        self.batch_window_s = float(batch_window_s)
+        self.q = queue.Queue(maxsize=maxsize)
+        self.session = make_session()
+        self.thread = None
+
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.batches = 0
+        self.last_latency_s = 0.0
+
+
+class EventDispatcher:
+    """
+    Un hilo + una cola acotada + una Session por destino (backend, unus...).
+
+    El loop de frames solo llama a submit(); nunca espera red.
+    Si la cola de un destino está llena, el payload se descarta (o se
+    entrega a on_drop, p.ej. para dejarlo pendiente en disco).
+
+    Con batch_max > 1 el hilo junta hasta batch_max payloads (o lo que llegue
+    en batch_window_s desde el primero) y llama al handler con la lista.
+
+    on_idle(session, final) corre en el mismo hilo del destino después de cada
+    envío y cada ~0.5 s sin trabajo (final=False), y una última vez al cerrar
+    (final=True): sirve para trabajo diferido, p.ej. mandar lo acumulado.
+
+    observer(name, latency_s, ok, n_items), si se define, recibe cada envío
+    (métricas); corre en el hilo del destino.
+    """
+
+    def __init__(self, observer=None):
+        self._dests = {}
+        self._stop = threading.Event()
+        self.observer = observer
+
+    def add_destination(self, name, handler, maxsize=256, on_drop=None, batch_max=1, batch_window_s=0.0,
+                        on_idle=None):
+        d = _Destination(name, handler, maxsize, on_drop, batch_max, batch_window_s, on_idle)
+        d.thread = threading.Thread(target=self._run, args=(d,), name=f"dispatch-{name}", daemon=True)
+        self._dests[name] = d
+        d.thread.start()
+        return self
+
+    def submit(self, name, payload):
+        d = self._dests[name]
+        try:
+            d.q.put_nowait(payload)
+        except queue.Full:
+            d.dropped += 1
+            if d.on_drop is not None:
+                try:
+                    d.on_drop(payload)
+                except Exception as e:
+                    print(f"⚠ dispatcher[{name}]: on_drop falló:", e)
+            return False
+
+        d.enqueued += 1
+        depth = d.q.qsize()
+        if depth > d.max_depth:
+            d.max_depth = depth
+        return True
+
+    def _collect(self, d, first):
+        batch = [first]
+        deadline = time.perf_counter() + d.batch_window_s
+        while len(batch) < d.batch_max:
+            wait = deadline - time.perf_counter()
+            try:
+                batch.append(d.q.get(timeout=wait) if wait > 0 else d.q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _idle(self, d, final=False):
+        if d.on_idle is None:
+            return
+        try:
+            d.on_idle(d.session, final)
+        except Exception as e:
+            print(f"⚠ dispatcher[{d.name}]: on_idle falló:", e)
+
+    def _run(self, d):
+        while True:
+            try:
+                payload = d.q.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    self._idle(d, final=True)
+                    return
+                self._idle(d)
+                continue
+
+            items = self._collect(d, payload) if d.batch_max > 1 else [payload]
+
+            t0 = time.perf_counter()
+            try:
+                ok = bool(d.handler(d.session, items if d.batch_max > 1 else payload))
+            except Exception as e:
+                print(f"⚠ dispatcher[{d.name}]: error enviando:", e)
+                ok = False
+            d.last_latency_s = time.perf_counter() - t0
+            if self.observer is not None:
+                try:
+                    self.observer(d.name, d.last_latency_s, ok, len(items))
+                except Exception as e:
+                    print(f"⚠ dispatcher[{d.name}]: observer falló:", e)
+
+            d.batches += 1
+            if ok:
+                d.sent += len(items)
+            else:
+                d.failed += len(items)
+            for _ in items:
+                d.q.task_done()
+            self._idle(d)
+
+    def stats(self):
+        return {
+            name: {
+                "depth": d.q.qsize(),
+                "max_depth": d.max_depth,
+                "enqueued": d.enqueued,
+                "sent": d.sent,
+                "failed": d.failed,
+                "dropped": d.dropped,
+                "batches": d.batches,
+                "last_latency_ms": round(d.last_latency_s * 1000.0, 1),
+            }
+            for name, d in self._dests.items()
+        }
+
+    def close(self, timeout=5.0):
+        """
+        Intenta vaciar las colas (hasta `timeout` segundos) y detiene los hilos.
+        """
+        deadline = time.time() + timeout
+        for d in self._dests.values():
+            while d.q.unfinished_tasks and time.time() < deadline:
+                time.sleep(0.05)
+        self._stop.set()
+        for d in self._dests.values():
+            d.thread.join(timeout=max(0.0, deadline - time.time()) + 0.5)
+            d.session.close()
@@ -0,0 +1,219 @@
+import argparse
+import re
+import shutil
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from crossing import line_band_rect
+
+
+# -------------------- EXPORTAR EL MODELO PARA CPU (ONNX / OpenVINO / INT8) --------------------
+#
+#   python export_model.py --format onnx                       # yolov8n.onnx (FP32)
+#   python export_model.py --format openvino                   # yolov8n_openvino_model/ (FP32)
+#   python export_model.py --format openvino --int8 --calib-video grabacion.mp4
+#   python export_model.py --format onnx --int8 --calib-video grabacion.mp4   # yolov8n_int8.onnx
+#
+# Dependencias solo para exportar / correr: pip install onnx onnxruntime openvino nncf
+#
+# INT8 necesita calibración: se toman --calib-frames frames repartidos en un
+# video grabado en la misma puerta (ojalá con distintas horas de luz y con
+# gente). Con --config se recorta igual que el counter (roi.line_band), que
+# es lo que el modelo va a ver en producción.
+#
+# Después: model: "<salida>" en config.yaml (o en cameras[i]) y comparar con
+#   python bench_models.py --video grabacion.mp4 --models yolov8n.pt <salida>
+#
+# Sin --dynamic el exportado queda con imgsz y batch fijos: el scheduler
+# sigue ajustando el stride, pero no el imgsz.
+
+
+# ---------- frames de calibración ----------
+
+def calibration_frames(video_path, n=300, cfg=None):
+    """
+    n frames repartidos en todo el video. Con cfg y roi.line_band: solo la franja.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir el video: {video_path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    wanted = set(np.linspace(0, max(0, total - 1), num=min(n, total) if total else n).astype(int).tolist())
+
+    band = None
+    if cfg and bool(cfg.get("roi", {}).get("line_band", False)):
+        line = cfg.get("line", {})
+        half = int(line.get("arm_px", 80)) + int(cfg["roi"].get("margin_px", 120))
+        band = (int(cfg.get("rotate_deg", 0)), float(line.get("pos", 0.5)), half)
+
+    frames = []
+    i = 0
+    while len(frames) < n:
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            break
+        if not total or i in wanted:
+            if band is not None:
+                h, w = frame.shape[:2]
+                x1, y1, x2, y2 = line_band_rect(w, h, *band)
+                frame = np.ascontiguousarray(frame[y1:y2, x1:x2])
+            frames.append(frame)
+        i += 1
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"El video no tiene frames: {video_path}")
+    print(f"🎞 calibración: {len(frames)} frames de {video_path}")
+    return frames
+
+
+def write_calibration_dataset(frames, out_dir):
+    """
+    Dataset mínimo de Ultralytics (solo imágenes, clase 0 = person) para el
+    export OpenVINO INT8 (lo usa NNCF para calibrar). Devuelve la ruta del yaml.
+    """
+    out_dir = Path(out_dir)
+    img_dir = out_dir / "images" / "calib"
+    img_dir.mkdir(parents=True, exist_ok=True)
+    for i, f in enumerate(frames):
+        cv2.imwrite(str(img_dir / f"calib_{i:05d}.jpg"), f)
+    data = out_dir / "calib.yaml"
+    data.write_text(
+        f"path: {out_dir.resolve().as_posix()}\n"
+        "train: images/calib\n"
+        "val: images/calib\n"
+        "names:\n  0: person\n",
+        encoding="utf-8",
+    )
+    return data
+
+
+def letterbox(img, imgsz):
+    """
+    Mismo preprocesado que Ultralytics para un modelo de tamaño fijo:
+    letterbox centrado con gris 114, BGR -> RGB, CHW, float32 0..1, batch 1.
+    """
+    h, w = img.shape[:2]
+    th, tw = (imgsz, imgsz) if isinstance(imgsz, int) else imgsz
+    r = min(th / h, tw / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    out = np.full((th, tw, 3), 114, np.uint8)
+    top, left = (th - nh) // 2, (tw - nw) // 2
+    out[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    x = out[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(x, dtype=np.float32)[None] / 255.0
+
+
+# ---------- ONNX INT8 (onnxruntime.quantization) ----------
+
+def head_nodes_to_exclude(onnx_model):
+    """
+    La cabeza Detect decodifica cajas (en píxeles) y scores (0..1) en el mismo
+    tensor: cuantizar eso junto destruye los scores. Se deja en FP32 todo lo
+    de la última capa que no sea una Conv de la cabeza (DFL, concat, sigmoid...).
+    """
+    layers = [int(m.group(1)) for n in onnx_model.graph.node for m in [re.match(r"/model\.(\d+)/", n.name)] if m]
+    if not layers:
+        return []
+    head = f"/model.{max(layers)}/"
+    return [
+        n.name for n in onnx_model.graph.node
+        if n.name.startswith(head) and (n.op_type != "Conv" or "/dfl/" in n.name)
+    ]
+
+
+def quantize_onnx_int8(fp32_path, out_path, frames, imgsz=None):
+    import onnx
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    sess = onnxruntime.InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"])
+    inp = sess.get_inputs()[0]
+    shape = inp.shape   # [1, 3, H, W] (o simbólico con --dynamic)
+    if isinstance(shape[2], int) and isinstance(shape[3], int):
+        imgsz = (shape[2], shape[3])
+    elif imgsz is None:
+        raise ValueError("modelo dinámico: hay que pasar --imgsz para calibrar")
+    del sess
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = iter(frames)
+
+        def get_next(self):
+            f = next(self._it, None)
+            return None if f is None else {inp.name: letterbox(f, imgsz)}
+
+    fp32 = onnx.load(str(fp32_path))
+    exclude = head_nodes_to_exclude(fp32)
+    print(f"⚙ cuantizando a INT8 ({len(frames)} frames, {len(exclude)} nodos de la cabeza quedan en FP32)")
+    quantize_static(
+        str(fp32_path),
+        str(out_path),
+        _Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        nodes_to_exclude=exclude,
+    )
+
+    # Ultralytics lee imgsz / names / stride de metadata_props: copiarlos
+    q = onnx.load(str(out_path))
+    have = {p.key for p in q.metadata_props}
+    for p in fp32.metadata_props:
+        if p.key not in have:
+            q.metadata_props.add(key=p.key, value=p.value)
+    onnx.save(q, str(out_path))
+    return Path(out_path)
+
+
+# ---------- main ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Exporta el modelo YOLO a ONNX / OpenVINO (FP32 o INT8)")
+    ap.add_argument("--model", default="yolov8n.pt")
+    ap.add_argument("--format", choices=["onnx", "openvino"], required=True)
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--dynamic", action="store_true", help="imgsz/batch libres (un poco más lento en CPU)")
+    ap.add_argument("--int8", action="store_true", help="cuantizar a INT8 (requiere --calib-video)")
+    ap.add_argument("--calib-video", default=None, help="video grabado para calibrar INT8")
+    ap.add_argument("--calib-frames", type=int, default=300)
+    ap.add_argument("--config", default=None, help="config.yaml: recorta la calibración igual que roi.line_band")
+    args = ap.parse_args()
+
+    if args.int8 and not args.calib_video:
+        ap.error("--int8 requiere --calib-video")
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+
+    cfg = None
+    if args.config:
+        from people_counter import load_cfg
+        cfg = load_cfg(args.config)
+    frames = calibration_frames(args.calib_video, args.calib_frames, cfg) if args.int8 else None
+
+    if args.format == "openvino":
+        kwargs = dict(format="openvino", imgsz=args.imgsz, dynamic=args.dynamic)
+        tmp = None
+        if args.int8:
+            tmp = Path(args.model).with_suffix("").name + "_calib"
+            kwargs.update(int8=True, data=str(write_calibration_dataset(frames, tmp)), fraction=1.0)
+        out = model.export(**kwargs)
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    else:
+        out = model.export(format="onnx", imgsz=args.imgsz, dynamic=args.dynamic, simplify=True)
+        if args.int8:
+            fp32 = Path(out)
+            out = quantize_onnx_int8(fp32, fp32.with_name(fp32.stem + "_int8.onnx"), frames,
+                                     imgsz=args.imgsz)
+
+    print("✅ exportado:", out)
+    print(f'   config.yaml -> model: "{Path(out).as_posix()}"')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import ast
+from pathlib import Path
+
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+
+# -------------------- MODELO / TRACKING --------------------
+#
+# model: acepta lo mismo que Ultralytics (el backend sale de la extensión):
+#   yolov8n.pt                      PyTorch
+#   yolov8n.onnx / yolov8n_int8.onnx ONNX Runtime (pip install onnxruntime)
+#   yolov8n_openvino_model/         OpenVINO, FP32 o INT8 (pip install openvino)
+# Ver export_model.py para generarlos y bench_models.py para compararlos.
+
+def model_runtime(model_path) -> str:
+    p = str(model_path).rstrip("/\\")
+    if p.endswith(".onnx"):
+        return "onnx"
+    if p.endswith("_openvino_model") or p.endswith(".xml"):
+        return "openvino"
+    return "torch"
+
+
+def export_metadata(model_path) -> dict:
+    """
+    Metadata que Ultralytics guarda al exportar (imgsz, batch, args.dynamic...).
+    {} para .pt o si no se puede leer.
+    """
+    rt = model_runtime(model_path)
+    try:
+        if rt == "openvino":
+            d = Path(model_path)
+            d = d if d.is_dir() else d.parent
+            return yaml_load(d / "metadata.yaml") or {}
+        if rt == "onnx":
+            import onnxruntime
+
+            sess = onnxruntime.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+            out = {}
+            for k, v in sess.get_modelmeta().custom_metadata_map.items():
+                try:
+                    out[k] = ast.literal_eval(v)
+                except (ValueError, SyntaxError):
+                    out[k] = v
+            return out
+    except Exception as e:
+        print(f"⚠ no se pudo leer la metadata de {model_path}:", e)
+    return {}
+
+
+def load_model(model_path: str) -> YOLO:
+    """
+    Carga .pt / .onnx / *_openvino_model. Un exportado sin --dynamic tiene
+    imgsz y batch fijos: quedan en model.export_imgsz / model.export_batch
+    (None = libre) y resolve_imgsz() / detect_batch() los respetan.
+    """
+    rt = model_runtime(model_path)
+    if rt == "torch":
+        model = YOLO(model_path)
+        model.export_imgsz = model.export_batch = None
+    else:
+        model = YOLO(model_path, task="detect")
+        meta = export_metadata(model_path)
+        dynamic = bool((meta.get("args") or {}).get("dynamic", meta.get("dynamic", False)))
+        imgsz = meta.get("imgsz")
+        if isinstance(imgsz, (list, tuple)):
+            imgsz = tuple(int(v) for v in imgsz)
+        model.export_imgsz = None if dynamic or not imgsz else imgsz
+        model.export_batch = None if dynamic else int(meta.get("batch", 1))
+    model.runtime = rt
+    fixed = f", imgsz fijo {model.export_imgsz}" if model.export_imgsz else ""
+    print(f"🧠 modelo: {model_path} ({rt}{fixed})")
+    return model
+
+
+def resolve_imgsz(model, imgsz=None):
+    """
+    imgsz pedido (config / scheduler), salvo que el modelo exportado tenga uno fijo.
+    """
+    fixed = getattr(model, "export_imgsz", None)
+    return fixed if fixed is not None else imgsz
+
+
+class StreamTracker:
+    """
+    ByteTrack propio de un stream. Permite detectar en lote (varias cámaras
+    en una sola llamada al modelo) sin mezclar los ids de una cámara con otra.
+    """
+
+    def __init__(self, tracker_yaml="bytetrack.yaml", frame_rate=30):
+        args = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_yaml)))
+        self.tracker = BYTETracker(args=args, frame_rate=int(frame_rate))
+
+    def update(self, res, frame):
+        """
+        res: Results de una imagen (solo detección).
+        Devuelve (xyxy, ids) en numpy, o (None, None) si no hay tracks.
+        """
+        # Se llama aunque no haya detecciones: el tracker tiene que ver pasar el frame
+        tracks = self.tracker.update(res.boxes.cpu().numpy(), frame)
+        if tracks is None or len(tracks) == 0:
+            return None, None
+        tracks = np.asarray(tracks)
+        return tracks[:, :4], tracks[:, 4].astype(int)
+
+
+def detect_batch(model, frames, conf=0.4, iou=0.5, imgsz=None):
+    """
+    Una sola llamada al modelo para todos los frames (una imagen por cámara).
+    Con un exportado de batch fijo se parte en llamadas de ese tamaño.
+    """
+    frames = list(frames)
+    kwargs = dict(conf=conf, iou=iou, classes=[0], verbose=False)
+    imgsz = resolve_imgsz(model, imgsz)
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+    batch = getattr(model, "export_batch", None)
+    if not batch or len(frames) <= batch:
+        return model.predict(frames, **kwargs)
+    out = []
+    for i in range(0, len(frames), batch):
+        out.extend(model.predict(frames[i:i + batch], **kwargs))
+    return out
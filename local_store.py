@@ -0,0 +1,213 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+# -------------------- ESTADO LOCAL (SQLite WAL) --------------------
+
+class LocalStore:
+    """
+    Estado local del NUC en un SQLite en modo WAL:
+      - daily_totals: acumulado del día por CASI_COD (incremento O(1), sin reescribir archivos)
+      - pending:      outbox de payloads por enviar (FIFO por id autoincremental)
+                      con intentos / próximo intento / último error
+      - dead_letter:  los que agotaron los reintentos (para revisarlos a mano)
+
+    Cada operación es una transacción: si el proceso muere a mitad de camino,
+    SQLite deja el estado anterior o el nuevo, nunca un archivo truncado.
+    Se puede usar desde varios hilos (una conexión + lock).
+    """
+
+    def __init__(self, path, synchronous="FULL", keep_days=90):
+        self.path = str(path)
+        self.keep_days = int(keep_days)
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            day TEXT NOT NULL,
+            casi_cod TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, casi_cod)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS pending (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            payload_json TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS dead_letter (
+            id INTEGER PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            dead_at TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            payload_json TEXT NOT NULL
+        );
+        """)
+
+        # pending de versiones anteriores (sin estado de reintentos)
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(pending)")}
+        if "attempts" not in cols:
+            self._conn.execute("ALTER TABLE pending ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("ALTER TABLE pending ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("ALTER TABLE pending ADD COLUMN last_error TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_next ON pending (next_attempt_at, id)")
+
+    # ---------- acumulado diario ----------
+
+    def increment_daily_total(self, day: str, casi_cod: str, delta: int = 1) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                """
+                INSERT INTO daily_totals (day, casi_cod, total) VALUES (?, ?, ?)
+                ON CONFLICT(day, casi_cod) DO UPDATE SET total = total + excluded.total
+                RETURNING total
+                """,
+                (day, casi_cod, int(delta)),
+            ).fetchone()
+        return int(row[0])
+
+    def get_daily_total(self, day: str, casi_cod: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total FROM daily_totals WHERE day = ? AND casi_cod = ?",
+                (day, casi_cod),
+            ).fetchone()
+        return int(row[0]) if row else 0
+
+    def prune_days(self, today: str = None) -> int:
+        """
+        Borra acumulados con más de keep_days días (el JSON antiguo crecía para siempre).
+        """
+        if self.keep_days <= 0:
+            return 0
+        today_dt = datetime.strptime(today, "%Y-%m-%d") if today else datetime.now()
+        cutoff = (today_dt - timedelta(days=self.keep_days)).strftime("%Y-%m-%d")
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM daily_totals WHERE day < ?", (cutoff,))
+        return cur.rowcount
+
+    # ---------- cola de pendientes ----------
+
+    def enqueue_pending(self, payload: dict) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO pending (created_at, payload_json) VALUES (?, ?)",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), json.dumps(payload, ensure_ascii=False)),
+            )
+        return cur.lastrowid
+
+    def due_pending(self, now: float, limit: int = 50):
+        """
+        [(id, payload, intentos)] cuyo próximo intento ya venció, en orden FIFO.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload_json, attempts FROM pending WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (float(now), int(limit)),
+            ).fetchall()
+        return [(r[0], json.loads(r[1]), int(r[2])) for r in rows]
+
+    def reschedule_pending(self, pid: int, attempts: int, next_attempt_at: float, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pending SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (int(attempts), float(next_attempt_at), (error or "")[:500], pid),
+            )
+
+    def dead_letter_pending(self, pid: int, attempts: int, error: str = None):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO dead_letter (id, created_at, dead_at, attempts, last_error, payload_json)
+                SELECT id, created_at, ?, ?, ?, payload_json FROM pending WHERE id = ?
+                """,
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), int(attempts), (error or "")[:500], pid),
+            )
+            self._conn.execute("DELETE FROM pending WHERE id = ?", (pid,))
+            self._conn.execute("COMMIT")
+
+    def count_dead(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0])
+
+    def peek_pending(self, limit: int = 50):
+        """
+        Devuelve [(id, payload)] en orden FIFO sin sacarlos de la cola.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload_json FROM pending ORDER BY id LIMIT ?", (int(limit),)
+            ).fetchall()
+        return [(r[0], json.loads(r[1])) for r in rows]
+
+    def delete_pending(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i in ids])
+            self._conn.execute("COMMIT")
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0])
+
+    # ---------- migración desde los JSON antiguos ----------
+
+    def import_legacy_json(self, state_path: Path = None, pending_path: Path = None):
+        """
+        Importa unus_state.json / unus_pending.json (formato antiguo) una sola vez
+        y los renombra a *.migrated. Si un JSON está corrupto NO se toca, para poder
+        recuperarlo a mano.
+        """
+        for path, kind in ((state_path, "state"), (pending_path, "pending")):
+            if path is None or not Path(path).exists():
+                continue
+            path = Path(path)
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except Exception as e:
+                print(f"⚠ No se pudo leer {path} (se deja intacto):", e)
+                continue
+
+            with self._lock:
+                self._conn.execute("BEGIN")
+                if kind == "state" and isinstance(data, dict):
+                    for day, per_cod in data.items():
+                        for casi_cod, total in (per_cod or {}).items():
+                            self._conn.execute(
+                                """
+                                INSERT INTO daily_totals (day, casi_cod, total) VALUES (?, ?, ?)
+                                ON CONFLICT(day, casi_cod) DO UPDATE SET total = MAX(total, excluded.total)
+                                """,
+                                (day, str(casi_cod), int(total)),
+                            )
+                elif kind == "pending" and isinstance(data, list):
+                    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    self._conn.executemany(
+                        "INSERT INTO pending (created_at, payload_json) VALUES (?, ?)",
+                        [(now, json.dumps(p, ensure_ascii=False)) for p in data],
+                    )
+                self._conn.execute("COMMIT")
+
+            path.rename(path.with_name(path.name + ".migrated"))
+            print(f"🟢 Migrado {path} → {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,455 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dispatcher import make_session
+
+
+# -------------------- MÉTRICAS DEL COUNTER (Prometheus / push al backend) --------------------
+#
+# Costo en el loop de frames: un bisect + 3 sumas por etapa y por frame
+# (~1-2 µs por etapa); todo lo que ya tiene contadores propios (captura,
+# colas, UNUS) se lee recién al momento del scrape, con collectors.
+
+BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """
+    Histograma de buckets fijos (segundos).
+      - acumulado desde el arranque: lo que expone /metrics (Prometheus calcula rates)
+      - ventana móvil de window_s en `slices` tramos: p50/p95 y tasa "de ahora"
+        para el push al backend y los prints
+    """
+
+    def __init__(self, buckets=BUCKETS_S, window_s=60.0, slices=6):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+        self._slice_s = float(window_s) / slices
+        self._ring = [[0] * (len(self.buckets) + 1) for _ in range(slices)]
+        self._ring_sum = [0.0] * slices
+        self._ring_id = [0] * slices
+        self._lock = threading.Lock()
+        self.t_start = time.monotonic()
+
+    def observe(self, v):
+        i = bisect_left(self.buckets, v)
+        sid = int(time.monotonic() / self._slice_s)
+        k = sid % len(self._ring)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+            if self._ring_id[k] != sid:
+                self._ring[k] = [0] * len(self.counts)
+                self._ring_sum[k] = 0.0
+                self._ring_id[k] = sid
+            self._ring[k][i] += 1
+            self._ring_sum[k] += v
+
+    def window(self):
+        """
+        (counts, sum) de la ventana móvil.
+        """
+        sid = int(time.monotonic() / self._slice_s)
+        counts = [0] * len(self.counts)
+        total = 0.0
+        with self._lock:
+            for k, rid in enumerate(self._ring_id):
+                if sid - rid < len(self._ring):
+                    counts = [a + b for a, b in zip(counts, self._ring[k])]
+                    total += self._ring_sum[k]
+        return counts, total
+
+    def window_s(self):
+        return min(self._slice_s * len(self._ring), time.monotonic() - self.t_start)
+
+    def summary(self):
+        counts, total = self.window()
+        n = sum(counts)
+        win = self.window_s()
+        return {
+            "n": n,
+            "rate_per_s": round(n / win, 2) if win > 0 else None,
+            "mean_ms": round(total / n * 1000.0, 3) if n else None,
+            "p50_ms": _quantile_ms(self.buckets, counts, 0.50),
+            "p95_ms": _quantile_ms(self.buckets, counts, 0.95),
+        }
+
+
+def _quantile_ms(buckets, counts, q):
+    # Interpolación lineal dentro del bucket (como histogram_quantile de Prometheus)
+    n = sum(counts)
+    if n == 0:
+        return None
+    rank = q * n
+    acc = 0
+    for i, c in enumerate(counts):
+        if c and acc + c >= rank:
+            lo = buckets[i - 1] if i > 0 else 0.0
+            if i == len(buckets):
+                return round(lo * 1000.0, 3)
+            return round((lo + (buckets[i] - lo) * (rank - acc) / c) * 1000.0, 3)
+        acc += c
+    return None
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class Registry:
+    """
+    Métricas del proceso. Cada serie es (nombre, labels):
+      - counter(...) / histogram(...): se actualizan desde el código
+      - gauge(name, help, fn, ...):    fn() se evalúa en cada scrape
+                                       (kind="counter" si fn() solo crece)
+      - add_collector(fn):             fn() -> [(name, type, help, labels, value)],
+                                       para leer stats() ya existentes (captura, colas...)
+    """
+
+    def __init__(self, window_s=60.0, prefix="people_counter"):
+        self.window_s = float(window_s)
+        self.prefix = prefix
+        self._families = {}    # name -> [type, help, {labels_key: (labels, obj)}]
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _series(self, kind, name, help_text, labels, make):
+        name = f"{self.prefix}_{name}"
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            fam = self._families.setdefault(name, [kind, help_text, {}])
+            if key not in fam[2]:
+                fam[2][key] = (labels, make())
+            return fam[2][key][1]
+
+    def counter(self, name, help_text="", **labels) -> Counter:
+        return self._series("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name, help_text="", **labels) -> Histogram:
+        return self._series("histogram", name, help_text, labels, lambda: Histogram(window_s=self.window_s))
+
+    def gauge(self, name, help_text, fn, kind="gauge", **labels):
+        self._series(kind, name, help_text, labels, lambda: fn)
+
+    def add_collector(self, fn):
+        self._collectors.append(fn)
+
+    def _collected(self):
+        out = []
+        for fn in self._collectors:
+            try:
+                out.extend(fn())
+            except Exception as e:
+                print("⚠ metrics: collector falló:", e)
+        return out
+
+    def render(self) -> str:
+        """
+        Formato de texto de Prometheus (text/plain; version=0.0.4).
+        """
+        lines = []
+        with self._lock:
+            families = [(n, f[0], f[1], list(f[2].values())) for n, f in self._families.items()]
+        for name, kind, help_text, series in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, obj in series:
+                if kind == "histogram":
+                    acc = 0
+                    for le, c in zip(obj.buckets + ("+Inf",), obj.counts):
+                        acc += c
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {acc}")
+                    lines.append(f"{name}_sum{_labels(labels)} {obj.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(labels)} {obj.count}")
+                elif callable(obj):
+                    lines.append(f"{name}{_labels(labels)} {_value(obj)}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {obj.value}")
+
+        # Las series de una familia van juntas (varias cámaras / destinos)
+        grouped = {}
+        for name, kind, help_text, labels, value in self._collected():
+            grouped.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+        for name, (kind, help_text, series) in grouped.items():
+            name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                lines.append(f"{name}{_labels(labels)} {float(value or 0):g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """
+        Resumen JSON (ventana móvil) para el push al backend y los prints.
+        """
+        out = {}
+        with self._lock:
+            families = [(n, f[0], list(f[2].values())) for n, f in self._families.items()]
+        for name, kind, series in families:
+            for labels, obj in series:
+                key = name[len(self.prefix) + 1:] + _labels(labels)
+                if kind == "histogram":
+                    out[key] = obj.summary()
+                elif callable(obj):
+                    out[key] = _value(obj)
+                else:
+                    out[key] = obj.value
+        for name, _, _, labels, value in self._collected():
+            out[name + _labels(labels)] = value
+        return out
+
+
+def _value(fn):
+    try:
+        return float(fn() or 0)
+    except Exception:
+        return float("nan")
+
+
+# -------------------- TIMER POR ETAPA (misma interfaz que perf.StageTimer) --------------------
+
+class _Stage:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class MetricsTimer:
+    """
+    Reemplazo de NULL_TIMER en producción: cada frame_done() vuelca el tiempo
+    de cada etapa a people_counter_stage_seconds{camera,stage} y la latencia
+    total a people_counter_frame_seconds{camera}.
+    """
+
+    def __init__(self, registry: Registry, camera_id: str):
+        self.registry = registry
+        self.camera_id = camera_id
+        self._hists = {}
+        self._cur = {}
+        self.frame_hist = registry.histogram("frame_seconds", "Latencia total por frame procesado",
+                                             camera=camera_id)
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, dt):
+        self._cur[name] = self._cur.get(name, 0.0) + dt
+
+    def frame_done(self, total_s=None):
+        cur = self._cur
+        if total_s is None:
+            total_s = sum(cur.values())
+        for name, dt in cur.items():
+            h = self._hists.get(name)
+            if h is None:
+                h = self._hists[name] = self.registry.histogram(
+                    "stage_seconds", "Tiempo por etapa y por frame", camera=self.camera_id, stage=name)
+            h.observe(dt)
+        self.frame_hist.observe(total_s)
+        cur.clear()
+
+    def fps(self):
+        return self.frame_hist.summary()["rate_per_s"] or 0.0
+
+
+# -------------------- COLLECTORS DE LO QUE YA TIENE stats() --------------------
+
+def capture_collector(cap, camera_id):
+    def collect():
+        st = cap.stats()
+        return [
+            (f"capture_{k}_total", "counter", f"Captura: {k}", {"camera": camera_id}, v)
+            for k, v in st.items()
+        ]
+    return collect
+
+
+def dispatcher_collector(dispatcher):
+    def collect():
+        out = []
+        for dest, st in dispatcher.stats().items():
+            lab = {"dest": dest}
+            out.append(("queue_depth", "gauge", "Items en cola por destino", lab, st["depth"]))
+            out.append(("queue_max_depth", "gauge", "Máximo de la cola por destino", lab, st["max_depth"]))
+            out.append(("posts_sent_total", "counter", "Items enviados", lab, st["sent"]))
+            out.append(("posts_failed_total", "counter", "Items con envío fallido", lab, st["failed"]))
+            out.append(("posts_dropped_total", "counter", "Items descartados (cola llena)", lab, st["dropped"]))
+        return out
+    return collect
+
+
+def outbox_collector(outbox, name="unus"):
+    def collect():
+        st = outbox.stats()
+        lab = {"outbox": name}
+        return [
+            ("outbox_pending", "gauge", "Payloads pendientes en el outbox", lab, st["pending"]),
+            ("outbox_dead", "gauge", "Payloads en dead_letter", lab, st["dead"]),
+            ("outbox_sent_total", "counter", "Payloads entregados", lab, st["sent"]),
+            ("outbox_failed_total", "counter", "Intentos fallidos", lab, st["failed"]),
+            ("outbox_breaker_open", "gauge", "1 si el circuit breaker no está cerrado", lab,
+             0 if st["breaker"]["state"] == "closed" else 1),
+        ]
+    return collect
+
+
+def http_observer(registry: Registry):
+    """
+    observer para EventDispatcher: latencia de cada envío por destino.
+    """
+    hists = {}
+
+    def observe(dest, latency_s, ok, n):
+        h = hists.get(dest)
+        if h is None:
+            h = hists[dest] = registry.histogram("http_seconds", "Latencia de cada envío HTTP", dest=dest)
+        h.observe(latency_s)
+    return observe
+
+
+def camera_gauges(registry: Registry, cam, timer: MetricsTimer):
+    lab = {"camera": cam.camera_id}
+    registry.gauge("fps", "Frames procesados por segundo (ventana móvil)", timer.fps, **lab)
+    registry.gauge("active_tracks", "Tracks activos en el último frame inferido",
+                   lambda: cam.active_tracks, **lab)
+    registry.gauge("track_state_ids", "Track ids con estado en memoria (acotado por unique.max_tracks)",
+                   lambda: cam.counter.num_tracks, **lab)
+    registry.gauge("crossings_in_total", "Cruces de entrada desde el arranque", lambda: cam.total_in,
+                   kind="counter", **lab)
+    registry.gauge("crossings_out_total", "Cruces de salida desde el arranque", lambda: cam.total_out,
+                   kind="counter", **lab)
+    if cam.snap_writer is not None:
+        registry.add_collector(lambda: [
+            (f"snapshots_{k}", "gauge", f"Snapshots: {k}", lab, v)
+            for k, v in cam.snap_writer.stats().items() if isinstance(v, (int, float))
+        ])
+
+
+# -------------------- SERVIDOR /metrics Y PUSH AL BACKEND --------------------
+
+def serve(registry: Registry, host="127.0.0.1", port=9108):
+    """
+    GET /metrics (Prometheus) y GET /metrics.json (resumen) en un hilo.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                self._send(registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+            elif path == "/metrics.json":
+                self._send(json.dumps(registry.snapshot()), "application/json")
+            else:
+                self.send_error(404)
+
+        def _send(self, body, ctype):
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 métricas en http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+class MetricsPusher:
+    """
+    Cada every_s manda registry.snapshot() a POST {backend_url}/counter/metrics.
+    Hilo propio: si el backend no responde, el loop de frames ni se entera.
+    """
+
+    def __init__(self, registry: Registry, backend_url: str, source: str, every_s=30.0, timeout=3.0):
+        self.registry = registry
+        self.url = backend_url.rstrip("/") + "/counter/metrics"
+        self.source = source
+        self.every_s = float(every_s)
+        self.timeout = float(timeout)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-push", daemon=True)
+
+        self.pushed = 0
+        self.failed = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        session = make_session(pool_size=1)
+        while not self._stop.wait(self.every_s):
+            try:
+                r = session.post(self.url, timeout=self.timeout,
+                                 json={"source": self.source, "metrics": self.registry.snapshot()})
+                r.raise_for_status()
+                self.pushed += 1
+            except Exception as e:
+                self.failed += 1
+                if self.failed == 1 or self.failed % 20 == 0:
+                    print(f"⚠ metrics: push al backend falló ({self.failed}):", e)
+        session.close()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.timeout + 1.0)
+
+
+def start_metrics(mcfg: dict, backend_url: str, source: str):
+    """
+    metrics: del config.yaml -> (registry, server, pusher). Con enabled: false
+    devuelve (None, None, None) y todo sigue con NULL_TIMER.
+    """
+    mcfg = mcfg or {}
+    if not bool(mcfg.get("enabled", False)):
+        return None, None, None
+    registry = Registry(window_s=float(mcfg.get("window_s", 60)))
+    server = None
+    if int(mcfg.get("port", 9108)) > 0:
+        server = serve(registry, mcfg.get("host", "127.0.0.1"), int(mcfg.get("port", 9108)))
+    pusher = None
+    if float(mcfg.get("push_every_s", 0)) > 0:
+        pusher = MetricsPusher(registry, backend_url, source, every_s=float(mcfg["push_every_s"])).start()
+    return registry, server, pusher
@@ -0,0 +1,211 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from unus_ws import WS_METHOD
+
+
+# -------------------- WS UNUS SIMULADO (recibeMovimientosDeaUno_V6) --------------------
+#
+#   python mock_unus.py --port 8099 --latency-ms 80 --error-rate 0.05
+#
+# y en config.yaml:  unus.base_url: "http://127.0.0.1:8099/WS_RECIBE_MOVIMIENTOS/wsRecibeMovimientos.asmx"
+#
+# Responde con las mismas formas XML que devuelve el .asmx real (las que
+# entiende unus_ws.parse_response). Lo que se inyecta, por request:
+#   - latencia fija + jitter
+#   - HTTP 500 (error_rate)          -> para el cliente es "WS no disponible"
+#   - xsi:nil="true" (nil_rate)      -> rechazo
+#   - texto de error (reject_rate)   -> rechazo
+#   - duplicate key (dup_rate), y además siempre que llegue de nuevo la misma
+#     (BASE_DATOS_CLIENTE, CASI_COD, LECT_COD, FECHA_HORA), como la PK real
+#   - caída total: HTTP 503 durante down_s (al arrancar o con set_down())
+# GET /_mock/stats devuelve los contadores en JSON.
+
+XML_OK = ('<?xml version="1.0" encoding="utf-8"?>\n'
+          '<string xmlns="http://tempuri.org/">OK</string>')
+XML_NIL = ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<string xsi:nil="true" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+           ' xmlns="http://tempuri.org/" />')
+XML_DUP = ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<string xmlns="http://tempuri.org/">Violation of PRIMARY KEY constraint \'PK_MOVIMIENTOS\'.'
+           ' Cannot insert duplicate key in object \'dbo.MOVIMIENTOS\'. The statement has been terminated.</string>')
+XML_REJECT = ('<?xml version="1.0" encoding="utf-8"?>\n'
+              '<string xmlns="http://tempuri.org/">ERROR: CLAVE INVALIDA</string>')
+
+FIELDS = ("BASE_DATOS_CLIENTE", "CASI_COD", "LECT_COD", "FECHA_HORA", "pass")
+
+
+class MockUnus:
+    """
+    Estado y fallas del WS simulado (compartido por todos los hilos del server).
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, nil_rate=0.0, reject_rate=0.0,
+                 dup_rate=0.0, down_s=0.0, seed=None):
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.nil_rate = float(nil_rate)
+        self.reject_rate = float(reject_rate)
+        self.dup_rate = float(dup_rate)
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._down_until = 0.0
+        self.set_down(down_s)
+
+        self.counts = {"requests": 0, "ok": 0, "duplicate": 0, "nil": 0, "reject": 0,
+                       "http_500": 0, "down_503": 0, "bad_request": 0}
+        self.last = {}   # CASI_COD -> (FECHA_HORA, pass) del movimiento más reciente aceptado
+
+    def set_down(self, seconds):
+        """
+        Simula una caída del WS durante `seconds` desde ahora (0 = levantarlo ya).
+        """
+        with self._lock:
+            self._down_until = time.time() + float(seconds) if seconds else 0.0
+
+    @property
+    def down(self) -> bool:
+        return time.time() < self._down_until
+
+    def handle(self, form: dict):
+        """
+        form -> (status_http, cuerpo). Aplica latencia y fallas.
+        """
+        with self._lock:
+            self.counts["requests"] += 1
+            r = self._rnd.random()
+            delay = self.latency_ms + self._rnd.uniform(0.0, self.jitter_ms)
+
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if self.down:
+            return self._count("down_503", 503, "Service Unavailable")
+        if any(k not in form for k in FIELDS):
+            return self._count("bad_request", 500, "Missing parameter")
+
+        # Una sola tirada para repartir entre las fallas
+        for kind, rate, status, body in (
+            ("http_500", self.error_rate, 500, "Internal Server Error"),
+            ("nil", self.nil_rate, 200, XML_NIL),
+            ("reject", self.reject_rate, 200, XML_REJECT),
+            ("duplicate", self.dup_rate, 200, XML_DUP),
+        ):
+            if r < rate:
+                return self._count(kind, status, body)
+            r -= rate
+
+        key = tuple(form[k] for k in FIELDS[:4])
+        with self._lock:
+            if key in self._seen:
+                self.counts["duplicate"] += 1
+                return 200, XML_DUP
+            self._seen.add(key)
+            self.counts["ok"] += 1
+            cur = self.last.get(form["CASI_COD"])
+            if cur is None or form["FECHA_HORA"] >= cur[0]:
+                self.last[form["CASI_COD"]] = (form["FECHA_HORA"], form["pass"])
+        return 200, XML_OK
+
+    def _count(self, kind, status, body):
+        with self._lock:
+            self.counts[kind] += 1
+        return status, body
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "unique": len(self._seen), "down": self.down, "last": dict(self.last)}
+
+
+def _make_handler(mock: MockUnus):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, como IIS
+        disable_nagle_algorithm = True  # headers y cuerpo van en 2 writes: sin esto +40 ms por request
+
+        def do_POST(self):
+            if not urlparse(self.path).path.endswith(WS_METHOD):
+                return self._send(404, "Not Found", "text/plain")
+            n = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(n).decode("utf-8", errors="replace")
+            form = {k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()}
+            status, body = mock.handle(form)
+            self._send(status, body, "text/xml; charset=utf-8" if status == 200 else "text/plain")
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/_mock/stats":
+                return self._send(200, json.dumps(mock.stats()), "application/json")
+            self._send(404, "Not Found", "text/plain")
+
+        def _send(self, status, body, ctype):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_mock(mock=None, host="127.0.0.1", port=0):
+    """
+    Levanta el WS simulado en un hilo. Devuelve (base_url, mock, server);
+    base_url va directo a unus.base_url. server.shutdown() para cerrarlo.
+    """
+    mock = mock or MockUnus()
+    server = ThreadingHTTPServer((host, port), _make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-unus", daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/WS_RECIBE_MOVIMIENTOS/wsRecibeMovimientos.asmx"
+    return base_url, mock, server
+
+
+def add_fault_args(ap):
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fracción de HTTP 500")
+    ap.add_argument("--nil-rate", type=float, default=0.0, help='fracción de xsi:nil="true"')
+    ap.add_argument("--reject-rate", type=float, default=0.0, help="fracción de rechazos con texto")
+    ap.add_argument("--dup-rate", type=float, default=0.0, help="fracción de duplicate key forzados")
+    ap.add_argument("--down-s", type=float, default=0.0, help="segundos caído al arrancar (HTTP 503)")
+    ap.add_argument("--seed", type=int, default=None)
+
+
+def mock_from_args(args) -> MockUnus:
+    return MockUnus(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                    nil_rate=args.nil_rate, reject_rate=args.reject_rate, dup_rate=args.dup_rate,
+                    down_s=args.down_s, seed=args.seed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="WS UNUS simulado (recibeMovimientosDeaUno_V6) con fallas inyectables")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    add_fault_args(ap)
+    args = ap.parse_args()
+
+    base_url, mock, server = start_mock(mock_from_args(args), host=args.host, port=args.port)
+    print("🧪 WS UNUS simulado en", base_url)
+    print("   stats:", f"http://{args.host}:{server.server_address[1]}/_mock/stats")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print("📊", json.dumps(mock.stats()))
+
+
+if __name__ == "__main__":
+    main()
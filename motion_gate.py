@@ -0,0 +1,87 @@
+import cv2
+
+
+# -------------------- COMPUERTA DE MOVIMIENTO --------------------
+
+class MotionGate:
+    """
+    Decide si vale la pena correr el modelo en este frame.
+
+    Diferencia de frames sobre una versión chica en gris de la imagen a inferir
+    (normalmente la franja de la línea). Sin movimiento y sin tracks activos se
+    salta la inferencia; apenas hay movimiento vuelve a tasa completa.
+
+    Siempre se infiere:
+      - si hay movimiento, o hubo hace menos de hold_s
+      - si el último resultado tenía tracks activos (gente quieta en la puerta)
+      - al menos cada min_infer_interval_s (ByteTrack sigue viendo frames)
+    """
+
+    def __init__(self, downscale_w=160, pixel_diff=18, min_changed_frac=0.003,
+                 hold_s=2.0, min_infer_interval_s=1.0):
+        self.downscale_w = int(downscale_w)
+        self.pixel_diff = int(pixel_diff)
+        self.min_changed_frac = float(min_changed_frac)
+        self.hold_s = float(hold_s)
+        self.min_infer_interval_s = float(min_infer_interval_s)
+
+        self._prev = None
+        self._last_motion = float("-inf")
+        self._last_infer = float("-inf")
+
+        self.frames = 0
+        self.skipped = 0          # gate cerrado: no se corrió el modelo
+        self.by_motion = 0        # abierto por movimiento (o hold)
+        self.by_tracks = 0        # abierto porque había tracks activos
+        self.by_min_rate = 0      # abierto por tasa mínima
+        self.last_changed_frac = 0.0
+
+    def _small_gray(self, img):
+        h, w = img.shape[:2]
+        if w > self.downscale_w:
+            nh = max(1, int(h * self.downscale_w / w))
+            img = cv2.resize(img, (self.downscale_w, nh), interpolation=cv2.INTER_AREA)
+        g = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        return cv2.GaussianBlur(g, (5, 5), 0)
+
+    def should_infer(self, img, now, active_tracks=0) -> bool:
+        self.frames += 1
+
+        g = self._small_gray(img)
+        prev = self._prev
+        self._prev = g
+
+        if prev is None or prev.shape != g.shape:
+            changed = 1.0
+        else:
+            diff = cv2.absdiff(g, prev)
+            changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_diff, 255, cv2.THRESH_BINARY)[1]) / diff.size
+        self.last_changed_frac = changed
+
+        if changed >= self.min_changed_frac:
+            self._last_motion = now
+
+        if (now - self._last_motion) <= self.hold_s:
+            self.by_motion += 1
+        elif active_tracks > 0:
+            self.by_tracks += 1
+        elif (now - self._last_infer) >= self.min_infer_interval_s:
+            self.by_min_rate += 1
+        else:
+            self.skipped += 1
+            return False
+
+        self._last_infer = now
+        return True
+
+    def stats(self):
+        ran = self.frames - self.skipped
+        return {
+            "frames": self.frames,
+            "inferred": ran,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+            "by_motion": self.by_motion,
+            "by_tracks": self.by_tracks,
+            "by_min_rate": self.by_min_rate,
+        }
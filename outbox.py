@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+
+
+# -------------------- OUTBOX (reintentos con backoff + circuit breaker) --------------------
+
+class RetryPolicy:
+    """
+    Backoff exponencial con jitter: base_s * factor^(intentos-1), tope max_s,
+    y un sorteo en [50%, 100%] del valor para que los pendientes no se
+    reintenten todos en el mismo segundo. Tras max_attempts -> dead letter.
+    """
+
+    def __init__(self, base_s=5.0, factor=2.0, max_s=900.0, max_attempts=50):
+        self.base_s = float(base_s)
+        self.factor = float(factor)
+        self.max_s = float(max_s)
+        self.max_attempts = int(max_attempts)
+
+    def delay(self, attempts: int) -> float:
+        d = min(self.max_s, self.base_s * (self.factor ** max(0, attempts - 1)))
+        return d * random.uniform(0.5, 1.0)
+
+
+class CircuitBreaker:
+    """
+    closed    -> normal
+    open      -> tras `failure_threshold` fallos de red seguidos no se intenta
+                 nada durante open_s (se duplica en cada reapertura, tope max_open_s)
+    half_open -> pasado open_s se deja pasar UN intento de prueba
+    """
+
+    def __init__(self, failure_threshold=3, open_s=30.0, max_open_s=600.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_open_s = float(open_s)
+        self.max_open_s = float(max_open_s)
+
+        self.state = "closed"
+        self.failures = 0
+        self.open_s = self.base_open_s
+        self.opened_at = 0.0
+        self.opens = 0
+
+    def allow(self, now=None) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.time() if now is None else now
+        if self.state == "open" and now - self.opened_at >= self.open_s:
+            self.state = "half_open"
+            return True
+        # half_open: el intento de prueba ya está en curso
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.open_s = self.base_open_s
+
+    def record_failure(self, now=None):
+        now = time.time() if now is None else now
+        self.failures += 1
+        if self.state == "half_open":
+            self.open_s = min(self.max_open_s, self.open_s * 2)
+        elif self.failures < self.failure_threshold:
+            return
+        if self.state != "open":
+            self.opens += 1
+        self.state = "open"
+        self.opened_at = now
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "open_s": self.open_s, "opens": self.opens}
+
+
+def policy_from_cfg(ocfg) -> RetryPolicy:
+    ocfg = ocfg or {}
+    return RetryPolicy(
+        base_s=ocfg.get("backoff_base_s", 5),
+        factor=ocfg.get("backoff_factor", 2),
+        max_s=ocfg.get("backoff_max_s", 900),
+        max_attempts=ocfg.get("max_attempts", 50),
+    )
+
+
+def breaker_from_cfg(ocfg) -> CircuitBreaker:
+    ocfg = ocfg or {}
+    return CircuitBreaker(
+        failure_threshold=ocfg.get("breaker_failures", 3),
+        open_s=ocfg.get("breaker_open_s", 30),
+        max_open_s=ocfg.get("breaker_max_open_s", 600),
+    )
+
+
+class Outbox:
+    """
+    Cola persistente (tabla pending de LocalStore) con estado por ítem:
+    intentos, próximo intento y último error. Todo se guarda ANTES de enviar,
+    así un corte de luz no pierde nada.
+
+    send(session, payload) -> (ok, resp):
+      - excepción      => WS no disponible: cuenta para el circuit breaker
+      - (False, resp)  => el WS respondió pero rechazó: reintento con backoff,
+                          y tras max_attempts pasa a dead_letter
+    Con el breaker abierto drain() no toca la red (ni la BD): una caída del WS
+    cuesta un INSERT por evento y nada más.
+    """
+
+    def __init__(self, store, send, policy=None, breaker=None, name="outbox"):
+        self.store = store
+        self.send = send
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.name = name
+        self._lock = threading.Lock()
+
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+
+    @classmethod
+    def from_cfg(cls, store, send, ocfg: dict, name="outbox"):
+        return cls(store, send, policy=policy_from_cfg(ocfg), breaker=breaker_from_cfg(ocfg), name=name)
+
+    def enqueue(self, payload: dict) -> int:
+        return self.store.enqueue_pending(payload)
+
+    def submit(self, payload: dict, session=None, max_items=50) -> bool:
+        """
+        Persiste el payload y trata de vaciar lo que toca. True si este payload salió.
+        """
+        pid = self.enqueue(payload)
+        return pid in self.drain(session=session, max_items=max_items)
+
+    def drain(self, session=None, max_items=50, now=None):
+        """
+        Envía (FIFO) los pendientes cuyo próximo intento ya venció. Devuelve los ids enviados.
+        """
+        with self._lock:
+            now = time.time() if now is None else now
+            if not self.breaker.allow(now):
+                return []
+
+            items = self.store.due_pending(now, max_items)
+            sent_ids = []
+            for pid, payload, attempts in items:
+                try:
+                    ok, resp = self.send(session, payload)
+                except Exception as e:
+                    self.breaker.record_failure(now)
+                    self._failed(pid, attempts, f"{type(e).__name__}: {e}", now)
+                    if self.breaker.state == "open":
+                        print(f"⚠ {self.name}: WS no disponible, pausa {self.breaker.open_s:.0f}s"
+                              f" (pendientes: {self.store.count_pending()})")
+                        break
+                    continue
+
+                self.breaker.record_success()
+                if ok:
+                    sent_ids.append(pid)
+                else:
+                    self._failed(pid, attempts, str(resp), now)
+
+            self.store.delete_pending(sent_ids)
+            self.sent += len(sent_ids)
+            if sent_ids and len(items) > 1:
+                print(f"🟢 {self.name}: reenviados pendientes = {len(sent_ids)}, quedan = {self.store.count_pending()}")
+            return sent_ids
+
+    def _failed(self, pid, attempts, error, now):
+        attempts += 1
+        self.failed += 1
+        if attempts >= self.policy.max_attempts:
+            self.store.dead_letter_pending(pid, attempts, error)
+            self.dead += 1
+            print(f"☠ {self.name}: pendiente {pid} a dead_letter tras {attempts} intentos: {error}")
+        else:
+            self.store.reschedule_pending(pid, attempts, now + self.policy.delay(attempts), error)
+
+    def stats(self):
+        return {
+            "pending": self.store.count_pending(),
+            "dead": self.store.count_dead(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "breaker": self.breaker.stats(),
+        }
@@ -1,14 +1,37 @@
+import signal
 import time
 import yaml
 import cv2
+import numpy as np
 import requests
-from ultralytics import YOLO
 import os
+import uuid
 from datetime import datetime
 
-import json
 from pathlib import Path
 
+from capture import LatestFrameCapture
+from dispatcher import EventDispatcher
+from local_store import LocalStore
+from outbox import Outbox
+import unus_ws
+from crossing import CrossingCounter, line_band_rect, shift_boxes
+from inference import load_model, resolve_imgsz
+from perf import NULL_TIMER
+from preview import start_preview
+from metrics import (
+    MetricsTimer,
+    camera_gauges,
+    capture_collector,
+    dispatcher_collector,
+    http_observer,
+    outbox_collector,
+    start_metrics,
+)
+from motion_gate import MotionGate
+from scheduler import AdaptiveScheduler
+from snapshots import SnapshotWriter, crop_person
+
 
 # -------------------- CONFIG --------------------
 
@@ -19,25 +42,62 @@ def load_cfg(path="config.yaml"):
 
 # -------------------- TU BACKEND LOCAL (opcional) --------------------
 
-def post_event(base_url, camera_id, track_id, direction="unknown", count_delta=1, meta=None, timeout=1.5):
+def event_payload(camera_id, track_id, direction="unknown", count_delta=1, meta=None, event_id=None):
     payload = {
         "camera_id": camera_id,
         "direction": direction,
         "count_delta": int(count_delta),
         "meta": {"track_id": int(track_id), **(meta or {})},
     }
+    if event_id:
+        payload["id"] = event_id
+    return payload
+
+
+def post_event(base_url, camera_id, track_id, direction="unknown", count_delta=1, meta=None, timeout=1.5,
+               session=None, event_id=None):
+    payload = event_payload(camera_id, track_id, direction, count_delta, meta, event_id)
+    http = session or requests
     try:
-        r = requests.post(f"{base_url}/events", json=payload, timeout=timeout)
+        r = http.post(f"{base_url}/events", json=payload, timeout=timeout)
         r.raise_for_status()
         return True
     except Exception:
         return False
 
 
+def post_events_batch(base_url, events, timeout=3.0, session=None, retries=2):
+    """
+    Envía una lista de eventos (kwargs de post_event) en un solo POST /events/batch.
+    Cada evento lleva su event_id, así que reintentar no duplica filas.
+    Si el backend es antiguo (sin /events/batch) se cae a POST /events uno por uno.
+    """
+    http = session or requests
+    payload = [event_payload(**kw) for kw in events]
+
+    for attempt in range(retries + 1):
+        try:
+            r = http.post(f"{base_url}/events/batch", json=payload, timeout=timeout)
+            if r.status_code in (404, 405):
+                return all([post_event(base_url, session=session, **kw) for kw in events])
+            r.raise_for_status()
+            return True
+        except Exception as e:
+            if attempt == retries:
+                print(f"⚠ backend: lote de {len(events)} eventos no enviado:", e)
+                return False
+            time.sleep(0.2 * (attempt + 1))
+
+
 # ===================== UNUS (Cliente final) =====================
 
-UNUS_STATE_FILE = Path("unus_state.json")
-UNUS_PENDING_FILE = Path("unus_pending.json")
+UNUS_STATE_FILE = Path("unus_state.json")      # formato antiguo (solo migración)
+UNUS_PENDING_FILE = Path("unus_pending.json")  # formato antiguo (solo migración)
+UNUS_STORE_FILE = Path("unus_state.db")
+
+_unus_store = None
+_unus_outbox = None
+_unus_coalescer = None
 
 def _unus_today_key(dt=None):
     dt = dt or datetime.now()
@@ -47,77 +107,53 @@ def _unus_fmt_ts(dt=None):
     dt = dt or datetime.now()
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
-def _json_load(path: Path):
-    if path.exists():
-        try:
-            return json.loads(path.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
-
-def _json_save(path: Path, obj):
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+def get_unus_store() -> LocalStore:
+    """
+    Abre (una vez) el SQLite local de UNUS y migra los JSON antiguos si existen.
+    """
+    global _unus_store
+    if _unus_store is None:
+        _unus_store = LocalStore(UNUS_STORE_FILE)
+        _unus_store.import_legacy_json(UNUS_STATE_FILE, UNUS_PENDING_FILE)
+        _unus_store.prune_days()
+    return _unus_store
 
 def unus_increment_and_get_total(casi_cod: str) -> int:
     """
     Incrementa el acumulado del día para este NUC (CASI_COD) y devuelve el total.
     """
-    state = _json_load(UNUS_STATE_FILE)
-    day = _unus_today_key()
-
-    state.setdefault(day, {})
-    state[day].setdefault(casi_cod, 0)
-    state[day][casi_cod] += 1
+    return get_unus_store().increment_daily_total(_unus_today_key(), casi_cod)
 
-    _json_save(UNUS_STATE_FILE, state)
-    return int(state[day][casi_cod])
-
-def unus_queue_pending(payload: dict):
+def get_unus_outbox(cfg_unus: dict) -> Outbox:
     """
-    Guarda payload fallido para reintento posterior.
+    Outbox de UNUS sobre el mismo SQLite: todo acumulado se persiste antes de
+    enviarse y se reintenta con backoff; con el WS caído (circuit breaker
+    abierto) no se hace ningún request.
     """
-    pend = _json_load(UNUS_PENDING_FILE)
-    if not isinstance(pend, list):
-        pend = []
-    pend.append(payload)
-    _json_save(UNUS_PENDING_FILE, pend)
+    global _unus_outbox
+    if _unus_outbox is None:
+        _unus_outbox = Outbox.from_cfg(
+            get_unus_store(),
+            lambda session, payload: unus_ws.post_form(cfg_unus, payload, session=session),
+            cfg_unus.get("outbox", {}),
+            name="UNUS",
+        )
+    return _unus_outbox
 
-def unus_flush_pending(cfg_unus: dict, max_send: int = 50):
+def unus_queue_pending(payload: dict):
     """
-    Reintenta enviar pendientes (si hay internet).
+    Guarda payload para envío posterior (lo manda el próximo flush).
     """
-    pend = _json_load(UNUS_PENDING_FILE)
-    if not isinstance(pend, list) or len(pend) == 0:
-        return
-
-    url = cfg_unus["base_url"].rstrip("/") + "/recibeMovimientosDeaUno_V6"
-    timeout = float(cfg_unus.get("timeout", 15))
-
-    sent = 0
-    remaining = []
-    for payload in pend:
-        if sent >= max_send:
-            remaining.append(payload)
-            continue
-        try:
-            r = requests.post(url, data=payload, timeout=timeout)
-            r.raise_for_status()
-            sent += 1
-        except Exception:
-            remaining.append(payload)
+    get_unus_store().enqueue_pending(payload)
 
-    _json_save(UNUS_PENDING_FILE, remaining)
-    if sent > 0:
-        print(f"🟢 UNUS: reenviados pendientes = {sent}, quedan = {len(remaining)}")
-
-def post_unus_acumulado(cfg_unus: dict, total_hoy: int, fecha_hora: str):
+def unus_flush_pending(cfg_unus: dict, max_send: int = 50, session=None):
     """
-    Envía al WS (form-urlencoded). Si falla, lo deja pendiente.
+    Reintenta los pendientes cuyo backoff ya venció (si el breaker lo permite).
     """
-    url = cfg_unus["base_url"].rstrip("/") + "/recibeMovimientosDeaUno_V6"
-    timeout = float(cfg_unus.get("timeout", 15))
+    get_unus_outbox(cfg_unus).drain(session=session, max_items=max_send)
 
-    payload = {
+def unus_acumulado_payload(cfg_unus: dict, total_hoy: int, fecha_hora: str) -> dict:
+    return {
         "BASE_DATOS_CLIENTE": cfg_unus["base_datos_cliente"],
         "CASI_COD": str(cfg_unus["casi_cod"]),    # ID del NUC
         "LECT_COD": str(cfg_unus["lect_cod"]),
@@ -125,44 +161,157 @@ def post_unus_acumulado(cfg_unus: dict, total_hoy: int, fecha_hora: str):
         "pass": str(total_hoy),                   # acumulado del día
     }
 
-    try:
-        r = requests.post(url, data=payload, timeout=timeout)
-        r.raise_for_status()
-        return True
-    except Exception as e:
-        print("⚠ UNUS: fallo envío, lo dejo en cola:", e)
-        unus_queue_pending(payload)
-        return False
+def post_unus_acumulado(cfg_unus: dict, total_hoy: int, fecha_hora: str, session=None):
+    """
+    Encola en el outbox (persistido) y envía lo que toque. Si falla, queda
+    pendiente con backoff.
+    """
+    payload = unus_acumulado_payload(cfg_unus, total_hoy, fecha_hora)
+    return get_unus_outbox(cfg_unus).submit(payload, session=session)
 
+class UnusCoalescer:
+    """
+    unus.mode: coalesce. El WS recibe el acumulado del día, así que en una
+    ráfaga solo importa el último: por CASI_COD se manda como máximo uno cada
+    interval_s (el primero de la ráfaga sale de inmediato, el último queda
+    retenido hasta que vence el intervalo).
+    El retenido sale antes si cambia el día (es el total final de ayer) o al cerrar.
+    """
 
-# -------------------- GEOMETRÍA / UTILIDADES --------------------
+    def __init__(self, interval_s=10.0):
+        self.interval_s = float(interval_s)
+        self._held = {}        # casi_cod -> (cfg_unus, total_hoy, fecha_hora)
+        self._last_sent = {}   # casi_cod -> time.time() del último enviado
+
+        self.offered = 0
+        self.emitted = 0
+
+    def offer(self, cfg_unus, total_hoy, fecha_hora, now=None):
+        """
+        Nuevo acumulado. Devuelve los que hay que mandar ya.
+        """
+        now = time.time() if now is None else now
+        key = str(cfg_unus["casi_cod"])
+        self.offered += 1
+
+        out = []
+        held = self._held.get(key)
+        if held is not None and held[2][:10] != fecha_hora[:10]:
+            out.append(held)
+            self.emitted += 1
+            self._last_sent[key] = now
+        self._held[key] = (cfg_unus, total_hoy, fecha_hora)
+        out.extend(self.due(now))
+        return out
+
+    def due(self, now=None, force=False):
+        """
+        Retenidos cuyo intervalo ya venció (o todos con force=True).
+        """
+        now = time.time() if now is None else now
+        out = []
+        for key, job in list(self._held.items()):
+            if force or now - self._last_sent.get(key, float("-inf")) >= self.interval_s:
+                out.append(job)
+                del self._held[key]
+                self._last_sent[key] = now
+        self.emitted += len(out)
+        return out
+
+    def stats(self):
+        return {
+            "offered": self.offered,
+            "emitted": self.emitted,
+            "held": len(self._held),
+            "ratio": round(self.offered / self.emitted, 1) if self.emitted else None,
+        }
+
+def unus_stats(cfg_unus: dict) -> dict:
+    st = {"outbox": get_unus_outbox(cfg_unus).stats()}
+    if _unus_coalescer is not None:
+        st["coalesce"] = _unus_coalescer.stats()
+    return st
+
+def make_dispatcher(backend_url: str, cfg_unus: dict, unus_enabled: bool, dcfg: dict) -> EventDispatcher:
+    """
+    Destinos de red del counter. El loop de frames solo encola:
+      - "backend": dict con kwargs de post_event (se agrupan en lotes si
+                   dispatch.backend_batch_max > 1)
+      - "unus":    ("acumulado", cfg_unus, total_hoy, fecha_hora) | ("flush",)
+                   con unus.mode: coalesce los acumulados pasan por UnusCoalescer
+    """
+    disp = EventDispatcher()
+
+    batch_max = int(dcfg.get("backend_batch_max", 50))
+    if batch_max > 1:
+        disp.add_destination(
+            "backend",
+            lambda session, events: post_events_batch(backend_url, events, session=session),
+            maxsize=int(dcfg.get("backend_queue", 512)),
+            batch_max=batch_max,
+            batch_window_s=float(dcfg.get("backend_batch_window_s", 0.5)),
+        )
+    else:
+        disp.add_destination(
+            "backend",
+            lambda session, kw: post_event(backend_url, session=session, **kw),
+            maxsize=int(dcfg.get("backend_queue", 512)),
+        )
+
+    if unus_enabled:
+        global _unus_coalescer
+        mode = str(cfg_unus.get("mode", "per_crossing"))
+        if mode not in ("per_crossing", "coalesce"):
+            raise ValueError("unus.mode must be one of: per_crossing, coalesce")
+        coalescer = UnusCoalescer(cfg_unus.get("coalesce_interval_s", 10)) if mode == "coalesce" else None
+        _unus_coalescer = coalescer
+
+        def _unus_job(session, job):
+            if job[0] == "flush":
+                unus_flush_pending(cfg_unus, max_send=50, session=session)
+                return True
+            _, cam_unus, total_hoy, fecha_hora = job
+            if coalescer is None:
+                return post_unus_acumulado(cam_unus, total_hoy, fecha_hora, session=session)
+            ok = True
+            for held in coalescer.offer(cam_unus, total_hoy, fecha_hora):
+                ok = post_unus_acumulado(*held, session=session) and ok
+            return ok
+
+        def _unus_idle(session, final):
+            # Retenidos que ya vencieron; al cerrar, todos
+            for held in coalescer.due(force=final):
+                post_unus_acumulado(*held, session=session)
+
+        def _unus_drop(job):
+            # Cola llena: no se pierde el acumulado, queda pendiente en disco
+            if job[0] == "acumulado":
+                _, cam_unus, total_hoy, fecha_hora = job
+                unus_queue_pending(unus_acumulado_payload(cam_unus, total_hoy, fecha_hora))
+
+        disp.add_destination(
+            "unus",
+            _unus_job,
+            maxsize=int(dcfg.get("unus_queue", 256)),
+            on_drop=_unus_drop,
+            on_idle=_unus_idle if coalescer is not None else None,
+        )
+
+    return disp
 
-def head_point(x1, y1, x2, y2):
-    cx = (x1 + x2) / 2.0
-    hy = y1 + 0.15 * (y2 - y1)
-    return cx, hy
 
-def clamp(v, a, b):
-    return max(a, min(b, v))
+# -------------------- GEOMETRÍA / UTILIDADES --------------------
 
 def save_person_snapshot(frame_bgr, bbox_xyxy, out_dir, prefix="count"):
+    """
+    Versión síncrona (snapshots.async: false). Por defecto se usa SnapshotWriter.
+    """
     try:
         os.makedirs(out_dir, exist_ok=True)
 
-        h, w = frame_bgr.shape[:2]
-        x1, y1, x2, y2 = bbox_xyxy
-
-        bw, bh = (x2 - x1), (y2 - y1)
-        mx, my = int(0.15 * bw), int(0.15 * bh)
-
-        cx1 = clamp(int(x1 - mx), 0, w - 1)
-        cy1 = clamp(int(y1 - my), 0, h - 1)
-        cx2 = clamp(int(x2 + mx), 0, w - 1)
-        cy2 = clamp(int(y2 + my), 0, h - 1)
+        crop = crop_person(frame_bgr, bbox_xyxy)
 
-        crop = frame_bgr[cy1:cy2, cx1:cx2]
-
-        if crop is None or crop.size == 0:
+        if crop is None:
             print("⚠ Crop vacío, no se guarda snapshot")
             return None
 
@@ -188,27 +337,352 @@ def rotate_frame(frame, rot):
         return cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
     raise ValueError("rotate_deg must be one of: 0, 90, 180, 270")
 
-def transform_point(x, y, w, h, rot):
-    if rot == 0:
-        return x, y
-    if rot == 90:
-        return (h - 1 - y), x
-    if rot == 180:
-        return (w - 1 - x), (h - 1 - y)
-    if rot == 270:
-        return y, (w - 1 - x)
-    raise ValueError("rotate_deg must be one of: 0, 90, 180, 270")
 
-def transform_bbox_xyxy(x1, y1, x2, y2, w, h, rot):
-    corners = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
-    tc = [transform_point(x, y, w, h, rot) for x, y in corners]
-    xs = [p[0] for p in tc]
-    ys = [p[1] for p in tc]
-    return min(xs), min(ys), max(xs), max(ys)
+# -------------------- CÁMARA (estado por stream) --------------------
+
+class CameraCounter:
+    """
+    Todo lo que es propio de una cámara: rotación, línea, estado de cruces,
+    snapshots, envío de eventos y ventana. La inferencia se hace afuera
+    (un modelo por cámara en main(), o uno compartido en supervisor.py).
+    """
+
+    def __init__(self, cfg: dict, dispatcher: EventDispatcher, timer=NULL_TIMER):
+        self.dispatcher = dispatcher
+        self.timer = timer
+
+        self.unus_cfg = cfg.get("unus", {})
+        self.unus_enabled = bool(self.unus_cfg.get("enabled", False))
+
+        self.rotate_deg = int(cfg.get("rotate_deg", 0))
+        self.camera_id = cfg.get("backend", {}).get("camera_id", "CAM-PC-01")
+
+        dcfg = cfg.get("display", {})
+        self.show = bool(dcfg.get("show", True))
+        self.show_ids = bool(dcfg.get("show_ids", True))
+        self.draw_head = bool(dcfg.get("draw_head", True))
+        self.draw_line = bool(dcfg.get("draw_line", True))
+
+        snap_cfg = cfg.get("snapshots", {})
+        self.snapshot_dir = snap_cfg.get("dir", "snapshots")
+        self.snapshot_on = bool(snap_cfg.get("enabled", True))
+
+        # JPEG + disco fuera del loop (pool de hilos con retención)
+        self.snap_writer = None
+        if self.snapshot_on and bool(snap_cfg.get("async", True)):
+            self.snap_writer = SnapshotWriter(
+                self.snapshot_dir,
+                workers=int(snap_cfg.get("workers", 2)),
+                queue_size=int(snap_cfg.get("queue_size", 64)),
+                drop_policy=snap_cfg.get("drop_policy", "drop_newest"),
+                jpeg_quality=int(snap_cfg.get("jpeg_quality", 92)),
+                shard_by_date=bool(snap_cfg.get("shard_by_date", True)),
+                retention_days=int(snap_cfg.get("retention_days", 30)),
+                max_total_mb=float(snap_cfg.get("max_total_mb", 2048)),
+                sweep_every_s=float(snap_cfg.get("sweep_every_s", 600)),
+            )
+
+        line = cfg.get("line", {})
+        self.cross_tol = int(line.get("cross_tol_px", 18))
+        self.dir_lr = line.get("dir_lr", "in")
+        self.dir_rl = line.get("dir_rl", "out")
+
+        unique = cfg.get("unique", {})
+
+        # Inferencia solo en la franja de la línea (± arm_px + margin_px)
+        roi = cfg.get("roi", {})
+        self.roi_band = bool(roi.get("line_band", False))
+        self.roi_margin = int(roi.get("margin_px", 120))
+
+        # Saltar el modelo cuando la escena está quieta
+        mg = cfg.get("motion_gate", {})
+        self.gate = None
+        if bool(mg.get("enabled", False)):
+            self.gate = MotionGate(
+                downscale_w=int(mg.get("downscale_w", 160)),
+                pixel_diff=int(mg.get("pixel_diff", 18)),
+                min_changed_frac=float(mg.get("min_changed_frac", 0.003)),
+                hold_s=float(mg.get("hold_s", 2.0)),
+                min_infer_interval_s=float(mg.get("min_infer_interval_s", 1.0)),
+            )
+        self.active_tracks = 0
+
+        # stride / imgsz adaptativos según latencia medida
+        self.imgsz = cfg.get("imgsz")
+        sc = cfg.get("scheduler", {})
+        self.scheduler = None
+        if bool(sc.get("enabled", False)):
+            self.scheduler = AdaptiveScheduler(
+                target_ms=float(sc.get("target_ms", 120)),
+                imgsz_levels=sc.get("imgsz_levels", [320, 416, 512, 640]),
+                max_stride=int(sc.get("max_stride", 4)),
+                cooldown_s=float(sc.get("cooldown_s", 3.0)),
+                log_file=sc.get("log_file"),
+                name=self.camera_id,
+            )
+
+        self.counter = CrossingCounter(
+            line_pos=float(line.get("pos", 0.5)),
+            arm_px=int(line.get("arm_px", 80)),
+            cross_tol_px=self.cross_tol,
+            min_box_h_px=int(line.get("min_box_h_px", 110)),
+            track_ttl_s=float(unique.get("track_ttl_seconds", 25.0)),
+            rotate_deg=self.rotate_deg,
+            max_tracks=int(unique.get("max_tracks", 4096)),
+        )
+
+        self.total_in = 0
+        self.total_out = 0
+        self.last_cleanup = time.time()
+
+        # PreviewChannel (preview.py) si hay servidor MJPEG; lo asigna main()
+        self.preview = None
+
+        self.window_name = dcfg.get("window_name", f"people_counter ({self.camera_id})")
+        if self.show:
+            cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(self.window_name, 1100, 750)
+
+    def band_half_width(self):
+        return int(self.counter.arm_px) + self.roi_margin
+
+    def inference_view(self, frame0):
+        """
+        Imagen sobre la que corre el modelo y su offset (ox, oy) en frame0.
+        Con roi.line_band es solo la franja alrededor de la línea; las cajas
+        se vuelven a frame0 con shift_boxes(xyxy, offset).
+        """
+        if not self.roi_band:
+            return frame0, (0, 0)
+        h0, w0 = frame0.shape[:2]
+        x1, y1, x2, y2 = line_band_rect(w0, h0, self.rotate_deg, self.counter.line_pos, self.band_half_width())
+        return np.ascontiguousarray(frame0[y1:y2, x1:x2]), (x1, y1)
+
+    def should_infer(self, view, now) -> bool:
+        """
+        False si el stride del scheduler o la compuerta de movimiento dicen que
+        este frame no necesita modelo (igual hay que llamar a
+        process(..., inferred=False) para limpieza/pantalla).
+        """
+        if self.scheduler is not None and not self.scheduler.tick():
+            return False
+        if self.gate is None:
+            return True
+        with self.timer.stage("gate"):
+            return self.gate.should_infer(view, now, self.active_tracks)
+
+    def inference_imgsz(self):
+        if self.scheduler is not None:
+            return self.scheduler.imgsz
+        return self.imgsz
+
+    def observe_inference(self, infer_s, now):
+        """
+        Latencia de la inferencia de este frame (llamar después de process()).
+        """
+        if self.scheduler is None:
+            return
+        near = self.counter.near_line_count() if self.active_tracks else 0
+        self.scheduler.observe(infer_s, self.active_tracks, near, now)
+
+    def process(self, frame0, xyxy, ids, now, inferred=True) -> bool:
+        """
+        xyxy/ids: cajas trackeadas sobre frame0 (sin rotar), o None si no hubo.
+        inferred=False: el modelo no corrió en este frame (stride/compuerta).
+        Devuelve False si el usuario pidió salir (ESC).
+        """
+        h0, w0 = frame0.shape[:2]
+        timer = self.timer
+        if inferred:
+            self.active_tracks = 0 if xyxy is None else len(xyxy)
+
+        events = ()
+        tracks = None
+        with timer.stage("crossing"):
+            if xyxy is not None and len(xyxy) > 0:
+                events = self.counter.update(xyxy, ids, now, w0, h0)
+                tracks = self.counter.frame
+
+            if (now - self.last_cleanup) > 1.0:
+                self.counter.expire(now)
+                self.last_cleanup = now
+
+        # El frame rotado solo hace falta para snapshots y para dibujar:
+        # sin ventana, sin cruces y sin nadie mirando el preview no se toca
+        preview = self.preview is not None and self.preview.wants_frame(now)
+        if not (events or self.show or preview):
+            return True
+
+        with timer.stage("rotate"):
+            frame = rotate_frame(frame0, self.rotate_deg)
+
+        for ev in events:
+            self._on_crossing(frame, ev)
+
+        if preview:
+            with timer.stage("preview"):
+                self._publish_preview(frame, tracks, now)
+        if self.show:
+            with timer.stage("draw"):
+                return self._draw(frame, tracks)
+        return True
+
+    def _on_crossing(self, frame, ev):
+        if ev.side == "L":
+            direction = self.dir_lr
+            self.total_in += 1
+        else:
+            direction = self.dir_rl
+            self.total_out += 1
+
+        # ✅ AQUÍ se envía a UNUS (ACUMULADO)
+        if self.unus_enabled:
+            with self.timer.stage("dispatch"):
+                total_hoy = unus_increment_and_get_total(str(self.unus_cfg["casi_cod"]))
+                self.dispatcher.submit("unus", ("acumulado", self.unus_cfg, total_hoy, _unus_fmt_ts()))
+
+        snapshot_filename = None
+        if self.snapshot_on:
+            with self.timer.stage("snapshot"):
+                prefix = f"{self.camera_id}_{direction}"
+                if self.snap_writer is not None:
+                    snapshot_filename = self.snap_writer.submit(frame, ev.bbox, prefix=prefix)
+                else:
+                    snapshot_filename = save_person_snapshot(frame, ev.bbox, self.snapshot_dir, prefix=prefix)
+
+        # (si aún quieres enviar a tu backend local)
+        with self.timer.stage("dispatch"):
+            self.dispatcher.submit("backend", dict(
+                event_id=str(uuid.uuid4()),
+                camera_id=self.camera_id,
+                track_id=ev.track_id,
+                direction=direction,
+                count_delta=1,
+                meta={
+                    "event": "unique_once_per_person",
+                    "person_id": ev.person_id,
+                    "track_epoch": ev.epoch,
+                    "snapshot": snapshot_filename,
+                },
+            ))
+
+    def close(self):
+        if self.snap_writer is not None:
+            self.snap_writer.close()
+
+    def _draw(self, frame, tracks) -> bool:
+        self.annotate(frame, tracks)
+        cv2.imshow(self.window_name, frame)
+        return (cv2.waitKey(1) & 0xFF) != 27
+
+    def _publish_preview(self, frame, tracks, now):
+        # Solo con alguien mirando: reducir (copia nueva, frame queda intacto) y anotar
+        h, w = frame.shape[:2]
+        scale = self.preview.scale_for(w)
+        if scale < 1.0:
+            img = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            img = frame.copy()
+        self.preview.publish(self.annotate(img, tracks, scale), now)
+
+    def annotate(self, img, tracks, scale=1.0):
+        """
+        Dibuja línea, cajas, ids y contadores sobre img (frame rotado, o una
+        versión reducida por `scale`). Modifica img y la devuelve.
+        """
+        hr, wr = img.shape[:2]
+        LINE_X = self.counter.line_x(wr)
+        cross_tol = int(self.cross_tol * scale)
+        fs = max(0.4, scale)
+        th = max(1, int(round(2 * fs)))
+
+        if self.roi_band:
+            half = int(self.band_half_width() * scale)
+            cv2.rectangle(img, (max(0, LINE_X - half), 0), (min(wr - 1, LINE_X + half), hr - 1), (255, 128, 0), 1)
+
+        if tracks is not None:
+            hxs, hys = tracks.heads
+            for i in range(len(tracks.track_ids)):
+                rx1, ry1, rx2, ry2 = (float(v) * scale for v in tracks.boxes[i])
+                tid, epoch, pid = tracks.track_ids[i], tracks.epochs[i], tracks.person_ids[i]
+                cv2.rectangle(img, (int(rx1), int(ry1)), (int(rx2), int(ry2)), (0, 255, 255), th)
+                if self.show_ids:
+                    label = f"id:{tid} e:{epoch}" if pid == 0 else f"id:{tid} e:{epoch} p:{pid}"
+                    cv2.putText(
+                        img,
+                        label,
+                        (int(rx1), max(20, int(ry1) - 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.7 * fs,
+                        (255, 255, 255),
+                        th,
+                    )
+                if self.draw_head:
+                    cv2.circle(img, (int(hxs[i] * scale), int(hys[i] * scale)), max(2, int(4 * fs)), (255, 255, 255), -1)
+
+        if self.draw_line:
+            cv2.line(img, (LINE_X, 0), (LINE_X, hr), (0, 255, 0), th)
+            if tracks is not None:
+                cv2.line(img, (LINE_X - cross_tol, 0), (LINE_X - cross_tol, hr), (0, 255, 0), 1)
+                cv2.line(img, (LINE_X + cross_tol, 0), (LINE_X + cross_tol, hr), (0, 255, 0), 1)
+                cv2.putText(
+                    img,
+                    "COUNT LINE",
+                    (min(LINE_X + 6, wr - int(220 * fs)), int(30 * fs)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.9 * fs,
+                    (0, 255, 0),
+                    th,
+                )
+
+        cv2.putText(
+            img,
+            f"IN: {self.total_in}  OUT: {self.total_out}",
+            (int(20 * fs), int(55 * fs)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1.1 * fs,
+            (255, 255, 255),
+            max(1, int(round(3 * fs))),
+        )
+        return img
+
+
+def open_capture(source, cap_cfg: dict) -> LatestFrameCapture:
+    return LatestFrameCapture(
+        source,
+        drop_policy=cap_cfg.get("drop_policy", "latest"),
+        keep_every_n=int(cap_cfg.get("keep_every_n", 1)),
+        stale_after_s=float(cap_cfg.get("stale_after_s", 1.0)),
+        reconnect_wait_s=float(cap_cfg.get("reconnect_wait_s", 0.5)),
+    ).start()
+
+def tracked_boxes(res):
+    """
+    Results de Ultralytics -> (xyxy, ids) en numpy, o (None, None) si no hay tracks.
+    """
+    boxes = res.boxes
+    if boxes is None or boxes.xyxy is None or boxes.id is None or len(boxes.xyxy) == 0:
+        return None, None
+    return boxes.xyxy.cpu().numpy(), boxes.id.cpu().numpy().astype(int)
 
 
 # -------------------- MAIN --------------------
 
+def stop_on_sigterm():
+    """
+    SIGTERM (servicio / taskkill / systemd) -> KeyboardInterrupt: el loop
+    sale por el mismo finally que con Ctrl+C y se cierra todo en orden.
+    """
+    stopping = []
+
+    def _stop(signum, frame):
+        # Un segundo SIGTERM no interrumpe el cierre ya en curso
+        if not stopping:
+            stopping.append(signum)
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _stop)
+
 def main():
     cfg = load_cfg()
 
@@ -219,253 +693,123 @@ def main():
     model_path = cfg.get("model", "yolov8n.pt")
     conf = float(cfg.get("conf", 0.4))
     iou = float(cfg.get("iou", 0.5))
-    rotate_deg = int(cfg.get("rotate_deg", 0))
-
-    backend_cfg = cfg.get("backend", {})
-    backend_url = backend_cfg.get("url", "http://127.0.0.1:8000")
-    camera_id = backend_cfg.get("camera_id", "CAM-PC-01")
 
-    dcfg = cfg.get("display", {})
-    show = bool(dcfg.get("show", True))
-    show_ids = bool(dcfg.get("show_ids", True))
-    draw_head = bool(dcfg.get("draw_head", True))
-    draw_line = bool(dcfg.get("draw_line", True))
+    backend_url = cfg.get("backend", {}).get("url", "http://127.0.0.1:8000")
 
-    snap_cfg = cfg.get("snapshots", {})
-    snapshot_dir = snap_cfg.get("dir", "snapshots")
-    snapshot_on = bool(snap_cfg.get("enabled", True))
+    cap_cfg = cfg.get("capture", {})
+    disp_cfg = cfg.get("dispatch", {})
 
-    line = cfg.get("line", {})
-    line_pos = float(line.get("pos", 0.5))
-    arm_px = int(line.get("arm_px", 80))
-    cross_tol = int(line.get("cross_tol_px", 18))
-    min_box_h = int(line.get("min_box_h_px", 110))
+    model = load_model(model_path)   # .pt / .onnx / *_openvino_model
 
-    dir_lr = line.get("dir_lr", "in")
-    dir_rl = line.get("dir_rl", "out")
+    cap = open_capture(source, cap_cfg)
+    capture_stats_every = float(cap_cfg.get("stats_every_s", 60))
 
-    unique = cfg.get("unique", {})
-    TRACK_TTL_SECONDS = float(unique.get("track_ttl_seconds", 25.0))
+    if unus_enabled:
+        get_unus_store()   # abre el SQLite local y migra JSON antiguos al partir
 
-    model = YOLO(model_path)
+    dispatcher = make_dispatcher(backend_url, unus_cfg, unus_enabled, disp_cfg)
 
-    cap = cv2.VideoCapture(source)
-    if not cap.isOpened():
-        raise RuntimeError("No se pudo abrir la cámara (SOURCE/RTSP/credenciales/red).")
+    cfg.setdefault("display", {}).setdefault("window_name", "people_counter (unique once)")
+    cam = CameraCounter(cfg, dispatcher)
 
-    window_name = "people_counter (unique once)"
-    if show:
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, 1100, 750)
+    # preview.enabled: MJPEG por HTTP (solo se dibuja con alguien mirando)
+    preview = start_preview(cfg.get("preview", {}))
+    if preview is not None:
+        cam.preview = preview.channel(cam.camera_id)
 
-    total_in = 0
-    total_out = 0
+    # metrics.enabled: /metrics (Prometheus) + push opcional al backend
+    registry, metrics_server, metrics_pusher = start_metrics(cfg.get("metrics", {}), backend_url, cam.camera_id)
+    if registry is not None:
+        cam.timer = MetricsTimer(registry, cam.camera_id)
+        camera_gauges(registry, cam, cam.timer)
+        registry.add_collector(capture_collector(cap, cam.camera_id))
+        registry.add_collector(dispatcher_collector(dispatcher))
+        dispatcher.observer = http_observer(registry)
+        if unus_enabled:
+            registry.add_collector(outbox_collector(get_unus_outbox(unus_cfg)))
 
-    armed = {}
-    last_seen_ts = {}
-
-    tid_epoch = {}
-    tid_last_gone = {}
-    counted = set()
-
-    next_person_id = 1
-    key_to_person = {}
-
-    last_cleanup = time.time()
     last_pending_flush = time.time()
+    unus_flush_every = float(unus_cfg.get("outbox", {}).get("flush_every_s", 10))
+    last_capture_stats = time.time()
 
-    while True:
-        now = time.time()
-
-        # Reintenta pendientes cada 30s (si está habilitado UNUS)
-        if unus_enabled and (now - last_pending_flush) > 30:
-            unus_flush_pending(unus_cfg, max_send=50)
-            last_pending_flush = now
-
-        ret, frame0 = cap.read()
-        if not ret or frame0 is None:
-            print("No se pudo leer frame. Reintentando...")
-            time.sleep(0.5)
-            continue
-
-        h0, w0 = frame0.shape[:2]
-
-        frame = rotate_frame(frame0, rotate_deg)
-        hr, wr = frame.shape[:2]
-        LINE_X = int(wr * line_pos)
-
-        res = model.track(
-            frame0,
-            conf=conf,
-            iou=iou,
-            classes=[0],
-            persist=True,
-            tracker="bytetrack.yaml",
-            verbose=False,
-        )[0]
-
-        boxes = res.boxes
-        if boxes is None or boxes.xyxy is None or boxes.id is None or len(boxes.xyxy) == 0:
-            if (now - last_cleanup) > 1.0:
-                dead = [tid for tid, ts in last_seen_ts.items() if (now - ts) > TRACK_TTL_SECONDS]
-                for tid in dead:
-                    last_seen_ts.pop(tid, None)
-                    armed.pop(tid, None)
-                    tid_last_gone[tid] = now
-                last_cleanup = now
-
-            if show:
-                if draw_line:
-                    cv2.line(frame, (LINE_X, 0), (LINE_X, hr), (0, 255, 0), 2)
-                cv2.putText(frame, f"IN: {total_in}  OUT: {total_out}",
-                            (20, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (255, 255, 255), 3)
-                cv2.imshow(window_name, frame)
-                if cv2.waitKey(1) & 0xFF == 27:
-                    break
-            continue
-
-        xyxy = boxes.xyxy.cpu().numpy()
-        ids = boxes.id.cpu().numpy().astype(int)
-
-        for (x1, y1, x2, y2), tid in zip(xyxy, ids):
-            if rotate_deg != 0:
-                rx1, ry1, rx2, ry2 = transform_bbox_xyxy(x1, y1, x2, y2, w0, h0, rotate_deg)
-            else:
-                rx1, ry1, rx2, ry2 = x1, y1, x2, y2
-
-            box_h = (ry2 - ry1)
-            if box_h < min_box_h:
+    stop_on_sigterm()
+    try:
+        while True:
+            now = time.time()
+
+            # Reintenta pendientes vencidos (si está habilitado UNUS); barato si no hay nada
+            if unus_enabled and (now - last_pending_flush) > unus_flush_every:
+                dispatcher.submit("unus", ("flush",))
+                last_pending_flush = now
+
+            if capture_stats_every > 0 and (now - last_capture_stats) > capture_stats_every:
+                print("📷 captura:", cap.stats())
+                print("📤 envíos:", dispatcher.stats())
+                if unus_enabled:
+                    print("📮 UNUS:", unus_stats(unus_cfg))
+                if cam.gate is not None:
+                    print("🚦 compuerta:", cam.gate.stats())
+                if cam.scheduler is not None:
+                    print("⚙ scheduler:", cam.scheduler.stats())
+                if cam.snap_writer is not None:
+                    print("🖼 snapshots:", cam.snap_writer.stats())
+                if registry is not None:
+                    print(f"📈 fps: {cam.timer.fps():.1f} | frame:", cam.timer.frame_hist.summary())
+                if preview is not None:
+                    print("🖥 preview:", preview.stats())
+                last_capture_stats = now
+
+            # No bloquea: si no hay frame nuevo, espera un poco y sigue
+            t_frame = time.perf_counter()
+            frame0, _ = cap.read()
+            if frame0 is None:
+                time.sleep(0.005)
                 continue
-
-            last_seen_ts[tid] = now
-
-            if tid not in tid_epoch:
-                tid_epoch[tid] = 0
-            if tid in tid_last_gone and (now - tid_last_gone[tid]) > TRACK_TTL_SECONDS:
-                tid_epoch[tid] += 1
-                tid_last_gone.pop(tid, None)
-                armed.pop(tid, None)
-
-            epoch = tid_epoch[tid]
-            key = (tid, epoch)
-
-            hx, hy = head_point(rx1, ry1, rx2, ry2)
-            dx = hx - LINE_X
-
-            if tid not in armed and abs(dx) > cross_tol:
-                armed[tid] = "L" if dx < 0 else "R"
-
-            if dx <= -arm_px:
-                armed[tid] = "L"
-            elif dx >= arm_px:
-                armed[tid] = "R"
-
-            if abs(dx) <= cross_tol:
-                a = armed.get(tid)
-                if a is not None:
-                    if key not in counted:
-                        counted.add(key)
-
-                        if key not in key_to_person:
-                            key_to_person[key] = next_person_id
-                            next_person_id += 1
-                        person_id = key_to_person[key]
-
-                        if a == "L":
-                            direction = dir_lr
-                            total_in += 1
-                        else:
-                            direction = dir_rl
-                            total_out += 1
-
-                        # ✅ AQUÍ se envía a UNUS (ACUMULADO)
-                        if unus_enabled:
-                            total_hoy = unus_increment_and_get_total(str(unus_cfg["casi_cod"]))
-                            post_unus_acumulado(unus_cfg, total_hoy, fecha_hora=_unus_fmt_ts())
-
-                        snapshot_filename = None
-                        if snapshot_on:
-                            snapshot_filename = save_person_snapshot(
-                                frame,
-                                (rx1, ry1, rx2, ry2),
-                                snapshot_dir,
-                                prefix=f"{camera_id}_{direction}",
-                            )
-
-                        # (si aún quieres enviar a tu backend local)
-                        post_event(
-                            backend_url,
-                            camera_id,
-                            tid,
-                            direction=direction,
-                            count_delta=1,
-                            meta={
-                                "event": "unique_once_per_person",
-                                "person_id": person_id,
-                                "track_epoch": epoch,
-                                "snapshot": snapshot_filename,
-                            },
-                        )
-
-                    armed.pop(tid, None)
-
-            if show:
-                cv2.rectangle(frame, (int(rx1), int(ry1)), (int(rx2), int(ry2)), (0, 255, 255), 2)
-                if show_ids:
-                    pid = key_to_person.get(key)
-                    label = f"id:{tid} e:{epoch}" if pid is None else f"id:{tid} e:{epoch} p:{pid}"
-                    cv2.putText(
-                        frame,
-                        label,
-                        (int(rx1), max(20, int(ry1) - 10)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.7,
-                        (255, 255, 255),
-                        2,
-                    )
-                if draw_head:
-                    cv2.circle(frame, (int(hx), int(hy)), 4, (255, 255, 255), -1)
-
-        if show:
-            if draw_line:
-                cv2.line(frame, (LINE_X, 0), (LINE_X, hr), (0, 255, 0), 2)
-                cv2.line(frame, (LINE_X - cross_tol, 0), (LINE_X - cross_tol, hr), (0, 255, 0), 1)
-                cv2.line(frame, (LINE_X + cross_tol, 0), (LINE_X + cross_tol, hr), (0, 255, 0), 1)
-                cv2.putText(
-                    frame,
-                    "COUNT LINE",
-                    (min(LINE_X + 6, wr - 220), 30),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.9,
-                    (0, 255, 0),
-                    2,
-                )
-
-            cv2.putText(
-                frame,
-                f"IN: {total_in}  OUT: {total_out}",
-                (20, 55),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1.1,
-                (255, 255, 255),
-                3,
-            )
-
-            cv2.imshow(window_name, frame)
-            if cv2.waitKey(1) & 0xFF == 27:
+            cam.timer.add("capture", time.perf_counter() - t_frame)
+
+            view, offset = cam.inference_view(frame0)
+
+            xyxy, ids = None, None
+            inferred = cam.should_infer(view, now)
+            if inferred:
+                imgsz = resolve_imgsz(model, cam.inference_imgsz())
+                t_inf = time.perf_counter()
+                res = model.track(
+                    view,
+                    conf=conf,
+                    iou=iou,
+                    classes=[0],
+                    persist=True,
+                    tracker="bytetrack.yaml",
+                    verbose=False,
+                    **({"imgsz": imgsz} if imgsz else {}),
+                )[0]
+                infer_s = time.perf_counter() - t_inf
+                cam.timer.add("inference", infer_s)
+
+                xyxy, ids = tracked_boxes(res)
+                xyxy = shift_boxes(xyxy, offset)
+
+            if not cam.process(frame0, xyxy, ids, now, inferred=inferred):
                 break
-
-        if (now - last_cleanup) > 1.0:
-            dead = [tid for tid, ts in last_seen_ts.items() if (now - ts) > TRACK_TTL_SECONDS]
-            for tid in dead:
-                last_seen_ts.pop(tid, None)
-                armed.pop(tid, None)
-                tid_last_gone[tid] = now
-            last_cleanup = now
-
-    cap.release()
-    cv2.destroyAllWindows()
+            if inferred:
+                cam.observe_inference(infer_s, now)
+            cam.timer.frame_done(time.perf_counter() - t_frame)
+    except KeyboardInterrupt:
+        print("🛑 detenido (Ctrl+C / SIGTERM), cerrando...")
+    finally:
+        # Siempre: dispatcher.close() vacía las colas y suelta lo retenido por el coalescer
+        cap.release()
+        cam.close()
+        dispatcher.close()
+        if metrics_pusher is not None:
+            metrics_pusher.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if preview is not None:
+            preview.close()
+        cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,110 @@
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+# -------------------- TIEMPOS POR ETAPA --------------------
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullTimer:
+    """
+    Timer que no mide nada (por defecto en producción: costo ~0).
+    """
+    _stage = _NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def add(self, name, dt):
+        pass
+
+    def frame_done(self, total_s=None):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class StageTimer:
+    """
+    Acumula el tiempo de cada etapa dentro de un frame (una etapa puede
+    ocurrir varias veces, p.ej. un snapshot por persona) y al cerrar el
+    frame guarda una muestra por etapa + la latencia total del frame.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.frame_latency = []
+        self._cur = defaultdict(float)
+        self._t_first = None
+        self._t_last = None
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, dt):
+        self._cur[name] += dt
+
+    def frame_done(self, total_s=None):
+        now = time.perf_counter()
+        if self._t_first is None:
+            self._t_first = now
+        self._t_last = now
+
+        if total_s is None:
+            total_s = sum(self._cur.values())
+        for k, v in self._cur.items():
+            self.samples[k].append(v)
+        self.frame_latency.append(total_s)
+        self._cur.clear()
+
+    @staticmethod
+    def _dist_ms(values):
+        a = np.asarray(values, dtype=np.float64) * 1000.0
+        if len(a) == 0:
+            return {"n": 0}
+        return {
+            "n": int(len(a)),
+            "mean_ms": round(float(a.mean()), 3),
+            "p50_ms": round(float(np.percentile(a, 50)), 3),
+            "p95_ms": round(float(np.percentile(a, 95)), 3),
+            "p99_ms": round(float(np.percentile(a, 99)), 3),
+            "max_ms": round(float(a.max()), 3),
+            "total_ms": round(float(a.sum()), 3),
+        }
+
+    def summary(self):
+        n = len(self.frame_latency)
+        wall = (self._t_last - self._t_first) if n > 1 else 0.0
+        total = float(np.sum(self.frame_latency)) if n else 0.0
+        return {
+            "frames": n,
+            "fps_wall": round((n - 1) / wall, 2) if wall > 0 else None,
+            "fps_busy": round(n / total, 2) if total > 0 else None,
+            "latency": self._dist_ms(self.frame_latency),
+            "stages": {k: self._dist_ms(v) for k, v in self.samples.items()},
+        }
@@ -0,0 +1,222 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import cv2
+
+
+# -------------------- PREVIEW MJPEG BAJO DEMANDA --------------------
+#
+# Reemplaza a cv2.imshow en el NUC sin escritorio: http://<nuc>:8090/
+# Mientras nadie mira, wants_frame() es False y el loop no dibuja ni
+# codifica nada. Con clientes conectados se anota como máximo max_fps
+# frames por segundo, ya reducidos a max_width, y el JPEG se hace en un
+# hilo aparte (un encoder por cámara, siempre con el frame más nuevo).
+
+class PreviewChannel:
+    """
+    Una cámara. El loop de frames llama wants_frame(now) y, solo si es True,
+    publish(img) con la imagen ya anotada (no se copia: no tocarla después).
+    """
+
+    def __init__(self, name, max_fps=5.0, max_width=960, jpeg_quality=70):
+        self.name = name
+        self.min_interval_s = 1.0 / max(0.1, float(max_fps))
+        self.max_width = int(max_width)
+        self.jpeg_quality = int(jpeg_quality)
+
+        self.clients = 0
+        self._last_publish = 0.0
+        self._pending = None
+        self._jpeg = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._encode_loop, name=f"preview-{name}", daemon=True)
+        self._thread.start()
+
+        self.published = 0
+        self.encoded = 0
+
+    def wants_frame(self, now) -> bool:
+        return self.clients > 0 and (now - self._last_publish) >= self.min_interval_s
+
+    def scale_for(self, width) -> float:
+        return min(1.0, self.max_width / float(width)) if self.max_width > 0 else 1.0
+
+    def publish(self, img, now=None):
+        self._last_publish = time.time() if now is None else now
+        with self._cond:
+            self._pending = img
+            self._cond.notify_all()
+        self.published += 1
+
+    def _encode_loop(self):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                img, self._pending = self._pending, None
+            ok, buf = cv2.imencode(".jpg", img, params)
+            if not ok:
+                continue
+            with self._cond:
+                self._jpeg = buf.tobytes()
+                self._seq += 1
+                self.encoded += 1
+                self._cond.notify_all()
+
+    def next_jpeg(self, after_seq, timeout=5.0):
+        """
+        Espera un JPEG más nuevo que after_seq. Devuelve (seq, bytes) o (after_seq, None).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or self._stop, timeout=timeout)
+            if self._seq > after_seq and self._jpeg is not None:
+                return self._seq, self._jpeg
+        return after_seq, None
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+
+    def stats(self):
+        return {"clients": self.clients, "published": self.published, "encoded": self.encoded}
+
+
+_INDEX = """<!doctype html><html><head><meta charset="utf-8"><title>people_counter</title>
+<style>body{{background:#111;color:#ddd;font-family:sans-serif}}img{{max-width:100%;display:block;margin-bottom:12px}}</style>
+</head><body>{body}</body></html>"""
+
+
+class PreviewServer:
+    """
+    GET /                  página con todas las cámaras
+    GET /stream/<camera>   multipart/x-mixed-replace (MJPEG)
+    GET /snapshot/<camera> un JPEG suelto
+    """
+
+    def __init__(self, host="127.0.0.1", port=8090, max_fps=5.0, max_width=960, jpeg_quality=70, max_clients=4):
+        self.max_fps = float(max_fps)
+        self.max_width = int(max_width)
+        self.jpeg_quality = int(jpeg_quality)
+        self.max_clients = int(max_clients)
+        self.channels = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, int(port)), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}/"
+
+    def channel(self, name) -> PreviewChannel:
+        ch = self.channels.get(name)
+        if ch is None:
+            ch = self.channels[name] = PreviewChannel(name, self.max_fps, self.max_width, self.jpeg_quality)
+        return ch
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="preview-http", daemon=True).start()
+        print("🖥 preview MJPEG en", self.url)
+        return self
+
+    def _attach(self, ch) -> bool:
+        with self._lock:
+            if sum(c.clients for c in self.channels.values()) >= self.max_clients:
+                return False
+            ch.clients += 1
+            return True
+
+    def _detach(self, ch):
+        with self._lock:
+            ch.clients -= 1
+
+    def _handler(self):
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = unquote(self.path.split("?", 1)[0]).rstrip("/")
+                if path == "":
+                    body = "".join(f'<h3>{n}</h3><img src="/stream/{n}">' for n in srv.channels) or "sin cámaras"
+                    return self._send(200, _INDEX.format(body=body).encode("utf-8"), "text/html; charset=utf-8")
+
+                kind, _, name = path.lstrip("/").partition("/")
+                ch = srv.channels.get(name)
+                if ch is None or kind not in ("stream", "snapshot"):
+                    return self._send(404, b"not found", "text/plain")
+                if not srv._attach(ch):
+                    return self._send(503, b"too many preview clients", "text/plain")
+                try:
+                    if kind == "snapshot":
+                        _, jpeg = ch.next_jpeg(0 if ch._jpeg is None else ch._seq)
+                        if jpeg is None:
+                            return self._send(504, b"no frame", "text/plain")
+                        return self._send(200, jpeg, "image/jpeg")
+                    self._stream(ch)
+                finally:
+                    srv._detach(ch)
+
+            def _stream(self, ch):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                seq = 0
+                try:
+                    while True:
+                        seq, jpeg = ch.next_jpeg(seq)
+                        if jpeg is None:
+                            if ch._stop:
+                                return
+                            continue
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                                         + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send(self, status, data, ctype):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def stats(self):
+        return {name: ch.stats() for name, ch in self.channels.items()}
+
+    def close(self):
+        for ch in self.channels.values():
+            ch.close()
+        self._server.shutdown()
+
+
+def start_preview(pcfg: dict):
+    """
+    preview: del config.yaml -> PreviewServer ya escuchando, o None.
+    """
+    pcfg = pcfg or {}
+    if not bool(pcfg.get("enabled", False)):
+        return None
+    return PreviewServer(
+        host=pcfg.get("host", "127.0.0.1"),
+        port=int(pcfg.get("port", 8090)),
+        max_fps=float(pcfg.get("max_fps", 5)),
+        max_width=int(pcfg.get("max_width", 960)),
+        jpeg_quality=int(pcfg.get("jpeg_quality", 70)),
+        max_clients=int(pcfg.get("max_clients", 4)),
+    ).start()
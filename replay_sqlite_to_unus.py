@@ -1,14 +1,14 @@
+import argparse
 import sqlite3
+import time
 import yaml
-import requests
-import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-DUP_TOKENS = [
-    "PRIMARY KEY constraint",
-    "duplicate key",
-    "Cannot insert duplicate key",
-]
+from dispatcher import make_session
+from outbox import breaker_from_cfg, policy_from_cfg
+import unus_ws
 
 
 def load_cfg(path="config.yaml"):
@@ -56,8 +56,9 @@ def normalize_ts(ts: str) -> str:
 def ensure_sent_columns(conn: sqlite3.Connection):
     """
     Asegura que existan columnas de control de envío en events.
-    - sent_ok: 0 no enviado, 1 enviado
+    - sent_ok: 0 no enviado, 1 enviado, -1 dead letter (el WS lo rechazó max_attempts veces)
     - sent_at: timestamp de cuando se marcó como enviado (opcional)
+    - unus_attempts / unus_error: rechazos del WS para esa fila
     """
     cur = conn.cursor()
 
@@ -69,19 +70,31 @@ def ensure_sent_columns(conn: sqlite3.Connection):
     if "sent_at" not in cols:
         cur.execute("ALTER TABLE events ADD COLUMN sent_at TEXT")
 
+    if "unus_attempts" not in cols:
+        cur.execute("ALTER TABLE events ADD COLUMN unus_attempts INTEGER NOT NULL DEFAULT 0")
+
+    if "unus_error" not in cols:
+        cur.execute("ALTER TABLE events ADD COLUMN unus_error TEXT")
+
     conn.commit()
 
 
-def post_unus_v6(cfg_unus, fecha_hora: str):
+def has_ts_ms(conn) -> bool:
+    """
+    ts_ms (epoch ms, indexado con sent_ok) lo crea y rellena el backend al
+    partir; con una BD anterior se filtra por el texto ts como antes.
+    """
+    return "ts_ms" in {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+
+
+def post_unus_v6(cfg_unus, fecha_hora: str, session=None, verbose=True):
     """
     HTTP POST simple a /recibeMovimientosDeaUno_V6
     - OK => éxito
     - duplicate key / PRIMARY KEY => lo tratamos como éxito (ya estaba)
     - xsi:nil=true => fallo
+    session: requests.Session keep-alive (la reutiliza el replay)
     """
-    base = cfg_unus["base_url"].rstrip("/")
-    url = base + "/recibeMovimientosDeaUno_V6"
-
     payload = {
         "BASE_DATOS_CLIENTE": cfg_unus["base_datos_cliente"],
         "CASI_COD": str(cfg_unus["casi_cod"]),
@@ -90,48 +103,203 @@ def post_unus_v6(cfg_unus, fecha_hora: str):
         "pass": str(cfg_unus["pass"]),  # password (NO conteo)
     }
 
-    masked = payload.copy()
-    masked["pass"] = "***"
-    print("POST URL:", url)
-    print("DEBUG payload:", masked)
+    if verbose:
+        masked = payload.copy()
+        masked["pass"] = "***"
+        print("POST URL:", unus_ws.ws_url(cfg_unus))
+        print("DEBUG payload:", masked)
 
-    r = requests.post(url, data=payload, timeout=float(cfg_unus.get("timeout", 15)))
-    print("Status:", r.status_code)
-    r.raise_for_status()
+    ok, resp = unus_ws.post_form(cfg_unus, payload, session=session)
+    if verbose:
+        print("Respuesta:", resp)
+    return ok, resp
 
-    xml_text = (r.text or "").strip()
 
-    # 1) NULL explícito
-    if 'xsi:nil="true"' in xml_text.lower():
-        return False, "NULL"
+def _mark_sent(conn, ids):
+    if not ids:
+        return
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany("UPDATE events SET sent_ok = 1, sent_at = ? WHERE id = ?", [(now, i) for i in ids])
+    conn.commit()
 
-    # 2) Duplicado => lo consideramos OK
-    low = xml_text.lower()
-    if any(tok.lower() in low for tok in DUP_TOKENS):
-        return True, "DUPLICATE_OK"
 
-    # 3) Parse <string>OK</string>
-    resp = ""
-    try:
-        root = ET.fromstring(xml_text)
-        resp = (root.text or "").strip()
-    except Exception:
-        resp = xml_text.strip()
+def _record_rejection(conn, row, resp, policy):
+    """
+    El WS rechazó la fila: suma un intento; tras max_attempts pasa a dead letter (sent_ok = -1).
+    """
+    attempts = int(row["unus_attempts"]) + 1
+    dead = attempts >= policy.max_attempts
+    conn.execute(
+        "UPDATE events SET unus_attempts = ?, unus_error = ?, sent_ok = ? WHERE id = ?",
+        (attempts, str(resp)[:500], -1 if dead else 0, row["id"]),
+    )
+    conn.commit()
+    return dead
 
-    if resp.upper() == "OK":
-        return True, "OK"
 
-    return False, resp
+def replay_pending(conn, cfg_unus, start_ms, inflight=4, commit_every=100, progress_every_s=5.0,
+                   session=None, verbose=False, policy=None, breaker=None):
+    """
+    Reenvía a UNUS los eventos pendientes (sent_ok = 0) desde start_ms.
+
+    - una sola Session keep-alive para todo el replay
+    - hasta `inflight` requests en vuelo, pero los resultados se consumen EN
+      ORDEN: sent_ok se marca solo sobre el prefijo continuo de éxitos
+    - UPDATE sent_ok en lotes de `commit_every` (executemany + un commit)
+    - error de red: se reintenta ese mismo evento con backoff (outbox.RetryPolicy)
+      hasta que abre el circuit breaker; ahí se detiene
+    - rechazo del WS: se detiene como siempre, pero la fila suma un intento y
+      tras policy.max_attempts queda en dead letter (sent_ok = -1) para no
+      bloquear la cola para siempre
+    Lo enviado después de un fallo no se marca; al reintentar el WS responde
+    duplicado => OK.
+    """
+    policy = policy or policy_from_cfg(cfg_unus.get("outbox"))
+    breaker = breaker or breaker_from_cfg(cfg_unus.get("outbox"))
+
+    if has_ts_ms(conn):
+        rows = conn.execute(
+            """
+            SELECT id, ts, count_delta, unus_attempts
+            FROM events
+            WHERE sent_ok = 0
+              AND ts_ms >= ?
+            ORDER BY ts_ms ASC
+            """,
+            (start_ms,),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            """
+            SELECT id, ts, count_delta, unus_attempts
+            FROM events
+            WHERE sent_ok = 0
+              AND ts >= ?
+            ORDER BY ts ASC
+            """,
+            (datetime.fromtimestamp(start_ms / 1000).strftime("%Y-%m-%d %H:%M:%S"),),
+        ).fetchall()
+
+    # Mantener tu lógica: solo enviamos si delta > 0
+    todo = [r for r in rows if int(r["count_delta"]) > 0]
+    stats = {"pending": len(todo), "sent": 0, "failed": 0, "dead": 0, "retries": 0,
+             "last_resp": None, "elapsed_s": 0.0}
+    if not todo:
+        return stats
+
+    inflight = max(1, int(inflight))
+    own_session = session is None
+    session = session or make_session(pool_size=inflight)
+
+    t0 = time.perf_counter()
+    last_progress = t0
+    done_ids = []
+    window = deque()
+    it = iter(todo)
+    stop = False
+
+    pool = ThreadPoolExecutor(max_workers=inflight, thread_name_prefix="unus-replay")
+    try:
+        while True:
+            while not stop and len(window) < inflight:
+                row = next(it, None)
+                if row is None:
+                    break
+                window.append((row, pool.submit(post_unus_v6, cfg_unus, normalize_ts(row["ts"]), session, verbose)))
+            if not window:
+                break
+
+            row, fut = window.popleft()
+            net_error = False
+            try:
+                ok, resp = fut.result()
+            except Exception as e:
+                ok, resp, net_error = False, f"{type(e).__name__}: {e}", True
+
+            # Error de red: mismo evento otra vez, con backoff, mientras el breaker lo permita
+            while net_error:
+                breaker.record_failure()
+                if breaker.state == "open":
+                    break
+                wait = policy.delay(breaker.failures)
+                print(f"⚠ replay: error de red ({resp}), reintento en {wait:.1f}s")
+                time.sleep(wait)
+                stats["retries"] += 1
+                try:
+                    ok, resp = post_unus_v6(cfg_unus, normalize_ts(row["ts"]), session, verbose)
+                    net_error = False
+                except Exception as e:
+                    resp = f"{type(e).__name__}: {e}"
+            if not net_error:
+                breaker.record_success()
+            stats["last_resp"] = resp
+
+            if not ok and not net_error and _record_rejection(conn, row, resp, policy):
+                stats["dead"] += 1
+                print(f"☠ replay: evento {row['id']} a dead letter (sent_ok = -1) tras"
+                      f" {policy.max_attempts} rechazos: {resp}")
+                continue
+
+            if ok:
+                stats["sent"] += 1
+                done_ids.append(row["id"])
+                if len(done_ids) >= commit_every:
+                    _mark_sent(conn, done_ids)
+                    done_ids = []
+            elif not stop:
+                stats["failed"] += 1
+                stop = True
+                if net_error:
+                    print("❌ WS no disponible (circuit breaker abierto). Se detiene para no perder orden.")
+                else:
+                    print("❌ Fallo enviando. Se detiene para no perder orden.")
+                print("Última respuesta:", resp)
+                # lo que queda en la ventana ya no se marca (orden)
+                for _, f in window:
+                    f.cancel()
+                for _, f in window:
+                    if not f.cancelled():
+                        try:
+                            f.result()
+                        except Exception:
+                            pass
+                window.clear()
+                break
+
+            now = time.perf_counter()
+            if progress_every_s and now - last_progress >= progress_every_s:
+                last_progress = now
+                rate = stats["sent"] / (now - t0)
+                left = stats["pending"] - stats["sent"]
+                eta = left / rate if rate > 0 else float("inf")
+                print(f"⏩ replay: {stats['sent']}/{stats['pending']} | {rate:.1f} ev/s | ETA {eta:.0f}s")
+    finally:
+        _mark_sent(conn, done_ids)
+        pool.shutdown(wait=True, cancel_futures=True)
+        if own_session:
+            session.close()
+
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    stats["rate_per_s"] = round(stats["sent"] / stats["elapsed_s"], 1) if stats["elapsed_s"] > 0 else None
+    return stats
 
 
 def main():
-    cfg = load_cfg()
+    ap = argparse.ArgumentParser(description="Reenvía a UNUS los eventos pendientes de la BD del backend")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--inflight", type=int, default=None, help="requests en vuelo (unus.replay_inflight)")
+    ap.add_argument("--commit-every", type=int, default=None, help="filas por commit (unus.replay_commit_every)")
+    ap.add_argument("--verbose", action="store_true", help="imprime cada POST (como antes)")
+    args = ap.parse_args()
+
+    cfg = load_cfg(args.config)
     unus = cfg["unus"]
+    inflight = args.inflight or int(unus.get("replay_inflight", 4))
+    commit_every = args.commit_every or int(unus.get("replay_commit_every", 100))
 
     db_path = cfg.get("sqlite_path", "people_counter.db")
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
 
     # Asegurar columnas de envío en BD
     ensure_sent_columns(conn)
@@ -141,58 +309,23 @@ def main():
         hour=0, minute=0, second=0, microsecond=0
     )
     start_ts = start_dt.strftime("%Y-%m-%d %H:%M:%S")
+    start_ms = int(start_dt.timestamp() * 1000)
     print("Enviando desde:", start_ts)
 
-    # Traemos SOLO pendientes (sent_ok = 0) desde ayer
-    rows = cur.execute(
-        """
-        SELECT id, ts, count_delta
-        FROM events
-        WHERE ts >= ?
-          AND COALESCE(sent_ok, 0) = 0
-        ORDER BY ts ASC
-        """,
-        (start_ts,),
-    ).fetchall()
-
-    if not rows:
-        print("No hay eventos pendientes desde ayer.")
-        conn.close()
-        return
+    # Mismos parámetros de backoff / breaker que el outbox del counter (unus.outbox)
+    ocfg = dict(unus.get("outbox") or {})
+    ocfg["max_attempts"] = int(unus.get("replay_max_attempts", 5))
+    stats = replay_pending(conn, unus, start_ms, inflight=inflight, commit_every=commit_every,
+                           verbose=args.verbose, policy=policy_from_cfg(ocfg), breaker=breaker_from_cfg(ocfg))
 
-    enviados = 0
-    fallos = 0
-
-    for row in rows:
-        # Mantener tu lógica: solo enviamos si delta > 0
-        if int(row["count_delta"]) <= 0:
-            # Opcional: si quieres marcar estos como "no enviables" para que no queden pendientes eternos
-            # cur.execute("UPDATE events SET sent_ok = 1, sent_at = ? WHERE id = ?", (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), row["id"]))
-            # conn.commit()
-            continue
-
-        ts = normalize_ts(row["ts"])
-
-        ok, resp = post_unus_v6(unus, ts)
-        print("Respuesta WS:", resp)
-
-        if ok:
-            enviados += 1
-            # ✅ Marcamos en BD como enviado
-            cur.execute(
-                "UPDATE events SET sent_ok = 1, sent_at = ? WHERE id = ?",
-                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), row["id"]),
-            )
-            conn.commit()
-        else:
-            fallos += 1
-            print("❌ Fallo enviando. Se detiene para no perder orden.")
-            print("Última respuesta:", resp)
-            break
-
-    print(f"Eventos marcados como enviados (BD): {enviados} | fallos: {fallos}")
+    if stats["pending"] == 0:
+        print("No hay eventos pendientes desde ayer.")
+    else:
+        print(f"Eventos marcados como enviados (BD): {stats['sent']} | fallos: {stats['failed']}"
+              f" | dead letter: {stats['dead']}"
+              f" | {stats['elapsed_s']}s ({stats['rate_per_s']} ev/s, {inflight} en vuelo)")
     conn.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,146 @@
+import json
+from datetime import datetime
+
+
+# -------------------- PLANIFICADOR ADAPTATIVO (stride / imgsz) --------------------
+
+class AdaptiveScheduler:
+    """
+    Ajusta cada cuántos frames se corre el modelo (stride) y con qué imgsz,
+    para mantener la latencia de inferencia cerca de target_ms.
+
+    Prioridades:
+      - gente cerca de la línea: stride 1 siempre (no perder el cruce) y el
+        mayor imgsz que quepa en el presupuesto
+      - hay tracks pero lejos de la línea: stride 1, imgsz según latencia
+      - escena vacía: se baja calidad (imgsz mínimo, stride máximo)
+
+    Cada cambio queda registrado (print + JSONL opcional) para auditar.
+    """
+
+    def __init__(self, target_ms=120.0, imgsz_levels=(320, 416, 512, 640), max_stride=4,
+                 ewma_alpha=0.3, cooldown_s=3.0, log_file=None, name=""):
+        levels = sorted({max(32, int(round(v / 32.0)) * 32) for v in imgsz_levels})
+        if not levels:
+            raise ValueError("scheduler.imgsz_levels no puede estar vacío")
+
+        self.target_ms = float(target_ms)
+        self.levels = levels
+        self.max_stride = max(1, int(max_stride))
+        self.alpha = float(ewma_alpha)
+        self.cooldown_s = float(cooldown_s)
+        self.log_file = log_file
+        self.name = name
+
+        self.level = len(levels) - 1          # parte con la mejor calidad
+        self.stride = 1
+        self.ewma_ms = None
+        self.tracks = 0
+        self.near_line = 0
+
+        self._frame = 0
+        self._last_change = float("-inf")
+        self.decisions = 0
+
+    @property
+    def imgsz(self):
+        return self.levels[self.level]
+
+    def tick(self) -> bool:
+        """
+        Un frame nuevo. True si toca inferir según el stride actual.
+        """
+        self._frame += 1
+        if self.near_line > 0:
+            return True
+        return (self._frame % self.stride) == 0
+
+    def observe(self, infer_s, tracks, near_line, now):
+        """
+        Resultado de una inferencia: latencia (s), tracks activos y cuántos
+        están cerca de la línea.
+        """
+        ms = infer_s * 1000.0
+        self.ewma_ms = ms if self.ewma_ms is None else (self.alpha * ms + (1 - self.alpha) * self.ewma_ms)
+        self.tracks = int(tracks)
+        self.near_line = int(near_line)
+        self._decide(now)
+
+    def _decide(self, now):
+        level, stride = self.level, self.stride
+        reason = None
+        over = self.ewma_ms > self.target_ms * 1.1
+        under = self.ewma_ms < self.target_ms * 0.7
+
+        if self.near_line > 0:
+            # Cruce inminente: temporal primero, después resolución
+            if stride != 1:
+                stride, reason = 1, "near_line"
+            elif over and level > 0:
+                level, reason = level - 1, "near_line_over_budget"
+            elif under and level < len(self.levels) - 1:
+                level, reason = level + 1, "near_line_under_budget"
+        elif self.tracks == 0:
+            # Escena vacía: lo más barato posible
+            if level > 0:
+                level, reason = 0, "quiet"
+            elif stride < self.max_stride:
+                stride, reason = self.max_stride, "quiet"
+        else:
+            if stride != 1 and not over:
+                stride, reason = 1, "tracks"
+            elif over:
+                if level > 0:
+                    level, reason = level - 1, "over_budget"
+                elif stride < self.max_stride:
+                    stride, reason = stride + 1, "over_budget"
+            elif under and level < len(self.levels) - 1:
+                level, reason = level + 1, "under_budget"
+
+        if reason is None or (level, stride) == (self.level, self.stride):
+            return
+
+        # Histéresis: salvo urgencias (gente en la línea), no cambiar tan seguido
+        urgent = reason == "near_line" or (reason == "tracks" and self.stride > 1)
+        if not urgent and (now - self._last_change) < self.cooldown_s:
+            return
+
+        self._log(now, reason, level, stride)
+        if level != self.level:
+            # la latencia medida ya no corresponde al nuevo tamaño
+            self.ewma_ms = None
+        self.level, self.stride = level, stride
+        self._last_change = now
+        self.decisions += 1
+
+    def _log(self, now, reason, level, stride):
+        rec = {
+            "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "t": round(float(now), 3),
+            "camera": self.name,
+            "reason": reason,
+            "from": {"imgsz": self.levels[self.level], "stride": self.stride},
+            "to": {"imgsz": self.levels[level], "stride": stride},
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "target_ms": self.target_ms,
+            "tracks": self.tracks,
+            "near_line": self.near_line,
+        }
+        print(f"⚙ scheduler[{self.name}]: {reason} imgsz {rec['from']['imgsz']}→{rec['to']['imgsz']}"
+              f" stride {rec['from']['stride']}→{rec['to']['stride']} (ewma {rec['ewma_ms']} ms)")
+        if self.log_file:
+            try:
+                with open(self.log_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            except Exception as e:
+                print("⚠ scheduler: no se pudo escribir log:", e)
+
+    def stats(self):
+        return {
+            "imgsz": self.imgsz,
+            "stride": self.stride,
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "tracks": self.tracks,
+            "near_line": self.near_line,
+            "decisions": self.decisions,
+        }
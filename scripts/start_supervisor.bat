@@ -0,0 +1,29 @@
+@echo off
+setlocal EnableExtensions
+
+REM === Un proceso para todas las cámaras de config.yaml (cameras:) ===
+
+set "ROOT=%~dp0.."
+for %%I in ("%ROOT%") do set "ROOT=%%~fI"
+
+if not exist "%ROOT%\logs" mkdir "%ROOT%\logs"
+for /f "tokens=1-3 delims=/: " %%a in ("%date%") do set "D=%%c%%a%%b"
+for /f "tokens=1-3 delims=:. " %%a in ("%time%") do set "T=%%a%%b%%c"
+set "LOG=%ROOT%\logs\supervisor_%D%_%T%.log"
+
+echo [supervisor] ROOT=%ROOT%
+echo [supervisor] LOG=%LOG%
+echo [supervisor] Starting...
+
+if not exist "%ROOT%\venv\Scripts\python.exe" (
+  echo [supervisor] ERROR: No existe venv en %ROOT%\venv
+  pause
+  exit /b 1
+)
+
+REM Importante: arrancar desde ROOT para que encuentre config.yaml y snapshots/
+pushd "%ROOT%"
+
+"%ROOT%\venv\Scripts\python.exe" "%ROOT%\supervisor.py" >> "%LOG%" 2>&1
+
+popd
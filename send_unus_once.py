@@ -0,0 +1,36 @@
+import os
+import sys
+from datetime import datetime
+from replay_sqlite_to_unus import post_unus_v6
+
+# -------------------- ENVÍO MANUAL DE UN MOVIMIENTO A UNUS --------------------
+#
+#   python mock_unus.py --port 8099
+#   python send_unus_once.py                     # contra el WS simulado
+#   UNUS_BASE_URL=https://unus.cl/... python send_unus_once.py   # WS real: manda un movimiento de verdad
+#
+# usa la misma función que el replay: post_unus_v6(cfg_unus, fecha_hora)
+
+MOCK_BASE_URL = "http://127.0.0.1:8099/WS_RECIBE_MOVIMIENTOS/wsRecibeMovimientos.asmx"
+
+cfg_unus = {
+  "base_url": os.getenv("UNUS_BASE_URL", MOCK_BASE_URL),
+  "base_datos_cliente": "CASI_COEXPAN",   # EXACTO como INI
+  "casi_cod": "001",                      # con ceros
+  "lect_cod": "A",
+  "pass": "M1",
+  "timeout": 15
+}
+
+
+def main():
+    if not cfg_unus["base_url"]:
+        sys.exit("❌ UNUS_BASE_URL vacío")
+    print(f"📤 UNUS -> {cfg_unus['base_url']}")
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ok, resp = post_unus_v6(cfg_unus, ts)
+    print(ok, resp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+import cv2
+
+
+# -------------------- SNAPSHOTS EN SEGUNDO PLANO --------------------
+
+def clamp(v, a, b):
+    return max(a, min(b, v))
+
+def crop_person(frame_bgr, bbox_xyxy, margin=0.15):
+    """
+    Recorte de la persona con margen. Devuelve una COPIA (el frame se sigue
+    usando/dibujando en el loop) o None si queda vacío.
+    """
+    h, w = frame_bgr.shape[:2]
+    x1, y1, x2, y2 = bbox_xyxy
+
+    bw, bh = (x2 - x1), (y2 - y1)
+    mx, my = int(margin * bw), int(margin * bh)
+
+    cx1 = clamp(int(x1 - mx), 0, w - 1)
+    cy1 = clamp(int(y1 - my), 0, h - 1)
+    cx2 = clamp(int(x2 + mx), 0, w - 1)
+    cy2 = clamp(int(y2 + my), 0, h - 1)
+
+    crop = frame_bgr[cy1:cy2, cx1:cx2]
+    if crop is None or crop.size == 0:
+        return None
+    return crop.copy()
+
+
+class SnapshotWriter:
+    """
+    El loop solo copia el recorte y lo encola; N hilos hacen el JPEG y lo
+    escriben en <dir>/<YYYY-MM-DD>/<prefix>_<ts>.jpg (escritura atómica con
+    os.replace, así el backend nunca sirve un archivo a medias).
+
+    submit() devuelve de inmediato el nombre relativo a `dir` (el que va en
+    meta.snapshot y que resuelve /snapshots/<nombre> en el backend).
+
+    drop_policy con la cola llena:
+      - "drop_newest": se descarta el nuevo (submit devuelve None)
+      - "drop_oldest": se descarta el más antiguo en cola (su nombre ya fue
+        entregado, ese archivo no va a existir)
+
+    Retención: un hilo barre cada sweep_every_s y borra días con más de
+    retention_days y luego lo más antiguo hasta quedar bajo max_total_mb.
+    """
+
+    def __init__(self, out_dir, workers=2, queue_size=64, drop_policy="drop_newest",
+                 jpeg_quality=92, shard_by_date=True, retention_days=30, max_total_mb=2048,
+                 sweep_every_s=600):
+        if drop_policy not in ("drop_newest", "drop_oldest"):
+            raise ValueError("snapshots.drop_policy must be one of: drop_newest, drop_oldest")
+
+        self.out_dir = str(out_dir)
+        self.drop_policy = drop_policy
+        self.jpeg_quality = int(jpeg_quality)
+        self.shard_by_date = bool(shard_by_date)
+        self.retention_days = int(retention_days)
+        self.max_total_bytes = int(float(max_total_mb) * 1024 * 1024)
+        self.sweep_every_s = float(sweep_every_s)
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._made_dirs = set()
+        self._q = queue.Queue(maxsize=int(queue_size))
+        self._stop = threading.Event()
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.swept_files = 0
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"snapshot-{i}", daemon=True)
+            for i in range(max(1, int(workers)))
+        ]
+        self._threads.append(threading.Thread(target=self._sweeper, name="snapshot-sweep", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    # ---------- productor (loop de frames) ----------
+
+    def submit(self, frame_bgr, bbox_xyxy, prefix="count"):
+        crop = crop_person(frame_bgr, bbox_xyxy)
+        if crop is None:
+            print("⚠ Crop vacío, no se guarda snapshot")
+            return None
+
+        now = datetime.utcnow()
+        filename = f"{prefix}_{now.strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+        if self.shard_by_date:
+            filename = f"{now.strftime('%Y-%m-%d')}/{filename}"
+
+        item = (crop, filename)
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            if self.drop_policy == "drop_newest":
+                return None
+            try:
+                self._q.get_nowait()
+                self._q.task_done()
+            except queue.Empty:
+                pass
+            try:
+                self._q.put_nowait(item)
+            except queue.Full:
+                return None
+
+        self.submitted += 1
+        return filename
+
+    # ---------- consumidores ----------
+
+    def _work(self):
+        while True:
+            try:
+                crop, filename = self._q.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            try:
+                self._write(crop, filename)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print("💥 Error guardando snapshot:", e)
+            finally:
+                self._q.task_done()
+
+    def _write(self, crop, filename):
+        path = os.path.join(self.out_dir, *filename.split("/"))
+        d = os.path.dirname(path)
+        if d not in self._made_dirs:
+            os.makedirs(d, exist_ok=True)
+            self._made_dirs.add(d)
+
+        ok, buf = cv2.imencode(".jpg", crop, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ok:
+            raise RuntimeError("cv2.imencode falló")
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(buf.tobytes())
+        os.replace(tmp, path)
+
+    # ---------- retención ----------
+
+    def _sweeper(self):
+        while not self._stop.wait(self.sweep_every_s):
+            try:
+                self.sweep()
+            except Exception as e:
+                print("⚠ snapshots: error en retención:", e)
+
+    def sweep(self):
+        """
+        Aplica la retención por antigüedad y por tamaño total. Devuelve archivos borrados.
+        """
+        removed = 0
+
+        if self.retention_days > 0:
+            cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+            for entry in os.scandir(self.out_dir):
+                if entry.is_dir() and len(entry.name) == 10 and entry.name < cutoff:
+                    removed += sum(len(fs) for _, _, fs in os.walk(entry.path))
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    self._made_dirs.discard(entry.path)
+
+            # snapshots antiguos sin carpeta por día
+            cutoff_ts = time.time() - self.retention_days * 86400
+            for entry in os.scandir(self.out_dir):
+                if entry.is_file() and entry.name.endswith(".jpg") and entry.stat().st_mtime < cutoff_ts:
+                    os.remove(entry.path)
+                    removed += 1
+
+        if self.max_total_bytes > 0:
+            files = []
+            total = 0
+            for root, _, names in os.walk(self.out_dir):
+                for n in names:
+                    if not n.endswith(".jpg"):
+                        continue
+                    p = os.path.join(root, n)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, p))
+                    total += st.st_size
+
+            if total > self.max_total_bytes:
+                files.sort()
+                for _, size, p in files:
+                    if total <= self.max_total_bytes:
+                        break
+                    try:
+                        os.remove(p)
+                        total -= size
+                        removed += 1
+                    except OSError:
+                        pass
+
+        self.swept_files += removed
+        return removed
+
+    def stats(self):
+        return {
+            "queued": self._q.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "swept_files": self.swept_files,
+        }
+
+    def close(self, timeout=5.0):
+        deadline = time.time() + timeout
+        while self._q.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.time()) + 0.5)
@@ -0,0 +1,268 @@
+import argparse
+import json
+import resource
+import time
+
+import numpy as np
+
+from crossing import CrossingCounter
+
+
+# -------------------- SOAK DEL ESTADO DE TRACKS --------------------
+#
+#   python soak_tracks.py --ids 2000000
+#   python soak_tracks.py --ids 200000 --check-ids 200000 --flicker 0.05
+#   python soak_tracks.py --ids 300000 --restart-every 3000 --check-ids 300000   # ids reutilizados (epochs)
+#   python soak_tracks.py --ids 2000 --check-ids 2000 --gap 26 --min-dur-s 20 --max-dur-s 60 \
+#       --flicker 0.1 --arrival-per-s 10 --seed 19                                 # stream pegado > TTL
+#
+# Simula semanas de puerta en minutos: gente que cruza (o no) la línea con
+# ids de ByteTrack siempre nuevos, y alimenta CrossingCounter como lo hace
+# CameraCounter (update por frame, expire cada > 1 s). Reporta si el estado
+# en memoria se queda acotado (tracks / slots / RSS) y, con --check-ids,
+# compara evento por evento contra la lógica original con dicts sin límite.
+
+W, H = 960, 540
+
+
+class ReferenceCounter:
+    """
+    La lógica por caja con dicts (tid_epoch, tid_last_gone, counted,
+    key_to_person...) que crecen sin límite: solo para comparar.
+    """
+
+    def __init__(self, line_pos, arm_px, cross_tol_px, min_box_h_px, ttl):
+        self.line_pos, self.arm, self.tol, self.min_h, self.ttl = line_pos, arm_px, cross_tol_px, min_box_h_px, ttl
+        self.armed, self.last_seen_ts, self.tid_epoch, self.tid_last_gone = {}, {}, {}, {}
+        self.counted, self.key_to_person = set(), {}
+        self.next_person_id = 1
+
+    def expire(self, now):
+        dead = [tid for tid, ts in self.last_seen_ts.items() if (now - ts) > self.ttl]
+        for tid in dead:
+            self.last_seen_ts.pop(tid, None)
+            self.armed.pop(tid, None)
+            self.tid_last_gone[tid] = now
+
+    def update(self, xyxy, ids, now):
+        LINE_X = int(W * self.line_pos)
+        events = []
+        for (x1, y1, x2, y2), tid in zip(xyxy.tolist(), ids.tolist()):
+            if (y2 - y1) < self.min_h:
+                continue
+            self.last_seen_ts[tid] = now
+            if tid not in self.tid_epoch:
+                self.tid_epoch[tid] = 0
+            if tid in self.tid_last_gone and (now - self.tid_last_gone[tid]) > self.ttl:
+                self.tid_epoch[tid] += 1
+                self.tid_last_gone.pop(tid, None)
+                self.armed.pop(tid, None)
+            epoch = self.tid_epoch[tid]
+
+            dx = (x1 + x2) / 2.0 - LINE_X
+            if tid not in self.armed and abs(dx) > self.tol:
+                self.armed[tid] = "L" if dx < 0 else "R"
+            if dx <= -self.arm:
+                self.armed[tid] = "L"
+            elif dx >= self.arm:
+                self.armed[tid] = "R"
+
+            if abs(dx) <= self.tol:
+                a = self.armed.get(tid)
+                if a is not None:
+                    key = (tid, epoch)
+                    if key not in self.counted:
+                        self.counted.add(key)
+                        if key not in self.key_to_person:
+                            self.key_to_person[key] = self.next_person_id
+                            self.next_person_id += 1
+                        events.append((tid, epoch, self.key_to_person[key], a))
+                    self.armed.pop(tid, None)
+        return events
+
+    def size(self):
+        return (len(self.armed) + len(self.last_seen_ts) + len(self.tid_epoch) + len(self.tid_last_gone)
+                + len(self.counted) + len(self.key_to_person))
+
+
+class DoorSim:
+    """
+    Llegadas Poisson; cada persona camina en línea recta durante dur segundos.
+    Las que cruzan van de un lado al otro pasando la línea; las demás se
+    quedan de su lado (nunca entran a la tolerancia).
+    """
+
+    def __init__(self, rng, arrival_per_s, cross_frac, dur_s, restart_every):
+        self.rng = rng
+        self.rate = float(arrival_per_s)
+        self.cross_frac = float(cross_frac)
+        self.dur_s = dur_s
+        self.restart_every = int(restart_every)
+        self.serial = 0
+        self.tid = np.zeros(0, np.int64)
+        self.t0 = np.zeros(0)
+        self.dur = np.zeros(0)
+        self.xa = np.zeros(0)
+        self.xb = np.zeros(0)
+        self.crossers = {"lr": 0, "rl": 0}
+
+    def spawn(self, now, dt, limit):
+        n = min(int(self.rng.poisson(self.rate * dt)), limit)
+        if n == 0:
+            return 0
+        serial = np.arange(self.serial, self.serial + n)
+        self.serial += n
+        tid = serial % self.restart_every + 1 if self.restart_every > 0 else serial + 1
+
+        cross = self.rng.random(n) < self.cross_frac
+        lr = self.rng.random(n) < 0.5
+        far_l = self.rng.uniform(40, 300, n)
+        far_r = self.rng.uniform(660, 920, n)
+        near = self.rng.uniform(0, 90, n)
+        # cruzan: lado a lado; no cruzan: se acercan hasta ~LINE_X ± 100 y nada más
+        xa = np.where(lr, far_l, far_r)
+        xb = np.where(cross, np.where(lr, far_r, far_l), np.where(lr, 380 - near, 580 + near))
+        self.crossers["lr"] += int(np.count_nonzero(cross & lr))
+        self.crossers["rl"] += int(np.count_nonzero(cross & ~lr))
+
+        self.tid = np.concatenate([self.tid, tid])
+        self.t0 = np.concatenate([self.t0, np.full(n, now)])
+        self.dur = np.concatenate([self.dur, self.rng.uniform(*self.dur_s, n)])
+        self.xa = np.concatenate([self.xa, xa])
+        self.xb = np.concatenate([self.xb, xb])
+        return n
+
+    def frame(self, now, flicker):
+        live = now <= self.t0 + self.dur
+        if not live.all():
+            self.tid, self.t0, self.dur, self.xa, self.xb = (
+                a[live] for a in (self.tid, self.t0, self.dur, self.xa, self.xb))
+        x = self.xa + (self.xb - self.xa) * (now - self.t0) / self.dur
+        show = self.rng.random(len(x)) >= flicker if flicker > 0 else np.ones(len(x), bool)
+        x = x[show]
+        xyxy = np.stack([x - 40, np.full(len(x), 150.0), x + 40, np.full(len(x), 350.0)], axis=1)
+        return xyxy.astype(np.float32), self.tid[show]
+
+
+def rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Soak de memoria / semántica del estado de tracks del contador")
+    ap.add_argument("--ids", type=int, default=1_000_000, help="track ids a simular")
+    ap.add_argument("--fps", type=float, default=5.0)
+    ap.add_argument("--arrival-per-s", type=float, default=40.0, help="personas nuevas por segundo")
+    ap.add_argument("--cross-frac", type=float, default=0.7)
+    ap.add_argument("--min-dur-s", type=float, default=6.0)
+    ap.add_argument("--max-dur-s", type=float, default=12.0)
+    ap.add_argument("--flicker", type=float, default=0.0, help="prob. de que una caja falte en un frame")
+    ap.add_argument("--restart-every", type=int, default=0, help="reiniciar ids cada N (como un tracker nuevo)")
+    ap.add_argument("--gap", type=float, default=0.0, help="segundos sin frames (stream pegado), una vez")
+    ap.add_argument("--gap-at", type=float, default=0.6, help="segundo simulado en que empieza el --gap")
+    ap.add_argument("--ttl", type=float, default=25.0)
+    ap.add_argument("--max-tracks", type=int, default=4096)
+    ap.add_argument("--check-ids", type=int, default=0, help="comparar contra la lógica con dicts los primeros N ids")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--report-every-s", type=float, default=10.0, help="segundos reales entre líneas de progreso")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    geo = dict(line_pos=0.5, arm_px=80, cross_tol_px=18, min_box_h_px=110)
+    counter = CrossingCounter(track_ttl_s=args.ttl, max_tracks=args.max_tracks, **geo)
+    ref = ReferenceCounter(ttl=args.ttl, **geo) if args.check_ids > 0 else None
+    sim = DoorSim(np.random.default_rng(args.seed), args.arrival_per_s, args.cross_frac,
+                  (args.min_dur_s, args.max_dur_s), args.restart_every)
+
+    dt = 1.0 / args.fps
+    now = 0.0
+    last_cleanup = 0.0
+    frames = 0
+    counts = {"L": 0, "R": 0}
+    peak = {"tracks": 0, "slots": 0, "retired": 0, "wheel": 0}
+    check = {"frames": 0, "events": 0, "mismatches": 0, "first_mismatch": None, "ref_dict_entries": 0}
+    t_update = 0.0
+    t0 = last_report = time.perf_counter()
+    rss_start = rss_mb()
+
+    # Después del último id se sigue 2×TTL + lo que dura un paso, para ver el vaciado
+    end_of_sim = None
+    while end_of_sim is None or now < end_of_sim:
+        if sim.serial < args.ids:
+            sim.spawn(now, dt, args.ids - sim.serial)
+        elif end_of_sim is None:
+            end_of_sim = now + args.max_dur_s + 2 * args.ttl + 2.0
+
+        xyxy, ids = sim.frame(now, args.flicker)
+        t = time.perf_counter()
+        events = counter.update(xyxy, ids, now, W, H) if len(ids) else []
+        if (now - last_cleanup) > 1.0:
+            counter.expire(now)
+        t_update += time.perf_counter() - t
+        for ev in events:
+            counts[ev.side] += 1
+
+        if ref is not None:
+            if sim.serial <= args.check_ids:
+                got = [(e.track_id, e.epoch, e.person_id, e.side) for e in events]
+                want = ref.update(xyxy, ids, now) if len(ids) else []
+                if (now - last_cleanup) > 1.0:
+                    ref.expire(now)
+                check["frames"] += 1
+                check["events"] += len(want)
+                if got != want:
+                    check["mismatches"] += 1
+                    if check["first_mismatch"] is None:
+                        check["first_mismatch"] = {"t": round(now, 3), "got": got, "want": want}
+            else:
+                check["ref_dict_entries"] = ref.size()
+                ref = None
+
+        if (now - last_cleanup) > 1.0:
+            last_cleanup = now
+            st = counter.stats()
+            for k in peak:
+                peak[k] = max(peak[k], st[k])
+
+        frames += 1
+        now += dt
+        if args.gap > 0 and now >= args.gap_at:
+            # Sin frames ni llamadas durante el gap; la gente sigue caminando
+            now += args.gap
+            args.gap = 0.0
+        if time.perf_counter() - last_report >= args.report_every_s:
+            last_report = time.perf_counter()
+            print(f"⏱ ids {sim.serial:,} | sim {now / 3600:.1f} h | estado {counter.stats()} | RSS máx {rss_mb()} MB")
+
+    if ref is not None:
+        check["ref_dict_entries"] = ref.size()
+    wall = time.perf_counter() - t0
+
+    st = counter.stats()
+    expected = None
+    if args.flicker == 0 and args.restart_every == 0:
+        expected = {"L": sim.crossers["lr"], "R": sim.crossers["rl"]}
+    report = {
+        "ids": sim.serial,
+        "frames": frames,
+        "sim_hours": round(now / 3600, 2),
+        "wall_s": round(wall, 1),
+        "counter_us_per_frame": round(t_update / frames * 1e6, 1) if frames else None,
+        "counts": counts,
+        "expected_counts": expected,
+        "counts_ok": None if expected is None else counts == expected,
+        "peak": peak,
+        "final": st,
+        "bounded": peak["slots"] <= args.max_tracks and st["forced_evictions"] == 0,
+        "rss_mb": {"start": rss_start, "max": rss_mb()},
+        "check": check if args.check_ids > 0 else None,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
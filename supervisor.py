@@ -0,0 +1,271 @@
+import copy
+import time
+
+import cv2
+
+from people_counter import (
+    CameraCounter,
+    unus_stats,
+    get_unus_outbox,
+    get_unus_store,
+    load_cfg,
+    make_dispatcher,
+    open_capture,
+    stop_on_sigterm,
+)
+from inference import StreamTracker, detect_batch, load_model, resolve_imgsz
+from crossing import shift_boxes
+from preview import start_preview
+from metrics import (
+    Counter,
+    MetricsTimer,
+    camera_gauges,
+    capture_collector,
+    dispatcher_collector,
+    http_observer,
+    outbox_collector,
+    start_metrics,
+)
+
+
+# -------------------- SUPERVISOR MULTI-CÁMARA --------------------
+#
+# Un solo proceso para varias puertas: un modelo en memoria, una llamada de
+# inferencia por vuelta con el último frame de cada cámara, y tracker/estado
+# de cruces separados por cámara.
+#
+# Cada cámara puede usar otro `model:` (p.ej. un OpenVINO INT8 en la puerta
+# con más CPU justa): cada archivo se carga una sola vez y las cámaras que
+# comparten modelo se siguen infiriendo en lote.
+#
+# config.yaml:
+#   cameras:
+#     - camera_id: "CAM-PC-01"
+#       source: "rtsp://..."
+#       rotate_deg: 0
+#       line: { pos: 0.5 }
+#     - camera_id: "CAM-PC-02"
+#       source: "rtsp://..."
+#
+# Lo que no se define en la cámara se toma del nivel superior del config.
+# UNUS: cada cámara puede activarlo (unus.enabled) y tener su casi_cod /
+# lect_cod / base_datos_cliente / pass, pero hay un solo envío y un solo
+# outbox por proceso: base_url, timeout, mode, coalesce_interval_s y outbox
+# tienen que ser iguales en todas las cámaras con UNUS.
+
+UNUS_SHARED_KEYS = ("base_url", "timeout", "mode", "coalesce_interval_s", "outbox")
+
+def _merge(base: dict, over: dict) -> dict:
+    out = copy.deepcopy(base)
+    for k, v in (over or {}).items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = _merge(out[k], v)
+        else:
+            out[k] = copy.deepcopy(v)
+    return out
+
+def camera_configs(cfg: dict):
+    """
+    Config efectivo por cámara (defaults globales + overrides de cameras[i]).
+    Sin `cameras:` se comporta como una sola cámara (people_counter.py).
+    """
+    cams = cfg.get("cameras") or [{}]
+    base = {k: v for k, v in cfg.items() if k != "cameras"}
+
+    out = []
+    for i, cam in enumerate(cams):
+        c = _merge(base, cam)
+        camera_id = cam.get("camera_id") or cam.get("backend", {}).get("camera_id")
+        if not camera_id:
+            # con una sola cámara vale el camera_id global; con varias no se puede repetir
+            camera_id = c.get("backend", {}).get("camera_id") if len(cams) == 1 else f"CAM-{i + 1:02d}"
+        c.setdefault("backend", {})["camera_id"] = camera_id
+        out.append(c)
+    return out
+
+
+def unus_process_cfg(cam_cfgs):
+    """
+    unus del proceso (envío / outbox compartidos) o None si ninguna cámara lo activa.
+    ValueError si las cámaras con UNUS no coinciden en UNUS_SHARED_KEYS.
+    """
+    on = [(c["backend"]["camera_id"], c.get("unus") or {}) for c in cam_cfgs
+          if bool((c.get("unus") or {}).get("enabled", False))]
+    if not on:
+        return None
+    ref_id, ref = on[0]
+    for camera_id, u in on[1:]:
+        for k in UNUS_SHARED_KEYS:
+            if u.get(k) != ref.get(k):
+                raise ValueError(f"unus.{k} de {camera_id} no coincide con el de {ref_id}: "
+                                 "el envío a UNUS es uno solo por proceso")
+    return ref
+
+
+class _Stream:
+    def __init__(self, cam_cfg, dispatcher):
+        self.cfg = cam_cfg
+        self.camera_id = cam_cfg["backend"]["camera_id"]
+        self.model_path = str(cam_cfg.get("model", "yolov8n.pt"))
+        self.cap = open_capture(cam_cfg.get("source", 0), cam_cfg.get("capture", {}))
+        self.tracker = StreamTracker(
+            cam_cfg.get("tracker", "bytetrack.yaml"),
+            frame_rate=int(cam_cfg.get("tracker_fps", 30)),
+        )
+        self.counter = CameraCounter(cam_cfg, dispatcher)
+
+
+def main():
+    cfg = load_cfg()
+
+    cam_cfgs = camera_configs(cfg)
+    # Basta con que una cámara active UNUS para crear el destino "unus"
+    unus_cfg = unus_process_cfg(cam_cfgs)
+    unus_enabled = unus_cfg is not None
+    if not unus_enabled:
+        unus_cfg = cfg.get("unus", {})
+    backend_url = cfg.get("backend", {}).get("url", "http://127.0.0.1:8000")
+
+    conf = float(cfg.get("conf", 0.4))
+    iou = float(cfg.get("iou", 0.5))
+
+    sup_cfg = cfg.get("supervisor", {})
+    max_batch = int(sup_cfg.get("max_batch", 8))
+    stats_every = float(sup_cfg.get("stats_every_s", 60))
+
+    if unus_enabled:
+        get_unus_store()
+
+    dispatcher = make_dispatcher(backend_url, unus_cfg, unus_enabled, cfg.get("dispatch", {}))
+
+    streams = [_Stream(c, dispatcher) for c in cam_cfgs]
+    print(f"🎥 supervisor: {len(streams)} cámaras → " + ", ".join(s.camera_id for s in streams))
+
+    # Un modelo por archivo distinto (normalmente uno solo para todas)
+    models = {}
+    for st in streams:
+        if st.model_path not in models:
+            models[st.model_path] = load_model(st.model_path)
+
+    preview = start_preview(cfg.get("preview", {}))
+    if preview is not None:
+        for st in streams:
+            st.counter.preview = preview.channel(st.camera_id)
+
+    registry, metrics_server, metrics_pusher = start_metrics(cfg.get("metrics", {}), backend_url, "supervisor")
+    m_batches, m_frames = Counter(), Counter()
+    if registry is not None:
+        for st in streams:
+            st.counter.timer = MetricsTimer(registry, st.camera_id)
+            camera_gauges(registry, st.counter, st.counter.timer)
+            registry.add_collector(capture_collector(st.cap, st.camera_id))
+        registry.add_collector(dispatcher_collector(dispatcher))
+        dispatcher.observer = http_observer(registry)
+        if unus_enabled:
+            registry.add_collector(outbox_collector(get_unus_outbox(unus_cfg)))
+        m_batches = registry.counter("inference_batches_total", "Llamadas de inferencia en lote")
+        m_frames = registry.counter("inference_frames_total", "Frames inferidos (frames / lotes = tamaño medio)")
+
+    last_pending_flush = time.time()
+    unus_flush_every = float(unus_cfg.get("outbox", {}).get("flush_every_s", 10))
+    last_stats = time.time()
+    running = True
+
+    stop_on_sigterm()
+    try:
+        while running:
+            now = time.time()
+
+            if unus_enabled and (now - last_pending_flush) > unus_flush_every:
+                dispatcher.submit("unus", ("flush",))
+                last_pending_flush = now
+
+            if stats_every > 0 and (now - last_stats) > stats_every:
+                batches, frames_in = m_batches.value, m_frames.value
+                avg = frames_in / batches if batches else 0.0
+                print(f"🎥 lotes: {batches}, frames: {frames_in}, frames/lote: {avg:.2f}")
+                for st in streams:
+                    print(f"📷 {st.camera_id}:", st.cap.stats())
+                    if registry is not None:
+                        print(f"📈 {st.camera_id}: fps {st.counter.timer.fps():.1f} | frame:",
+                              st.counter.timer.frame_hist.summary())
+                    if st.counter.gate is not None:
+                        print(f"🚦 {st.camera_id}:", st.counter.gate.stats())
+                    if st.counter.scheduler is not None:
+                        print(f"⚙ {st.camera_id}:", st.counter.scheduler.stats())
+                    if st.counter.snap_writer is not None:
+                        print(f"🖼 {st.camera_id}:", st.counter.snap_writer.stats())
+                print("📤 envíos:", dispatcher.stats())
+                if unus_enabled:
+                    print("📮 UNUS:", unus_stats(unus_cfg))
+                if preview is not None:
+                    print("🖥 preview:", preview.stats())
+                last_stats = now
+
+            # Último frame de cada cámara que tenga algo nuevo, agrupado por tamaño
+            # de la imagen a inferir (con tamaños mezclados Ultralytics rellena todo
+            # a imgsz x imgsz y se pierde lo ganado con roi.line_band)
+            groups = {}
+            for st in streams:
+                t_frame = time.perf_counter()
+                frame0, _ = st.cap.read()
+                if frame0 is None:
+                    continue
+                st.counter.timer.add("capture", time.perf_counter() - t_frame)
+                view, offset = st.counter.inference_view(frame0)
+                if st.counter.should_infer(view, now):
+                    imgsz = resolve_imgsz(models[st.model_path], st.counter.inference_imgsz())
+                    key = (st.model_path, view.shape, imgsz)
+                    groups.setdefault(key, []).append((st, frame0, view, offset, t_frame))
+                    continue
+                if not st.counter.process(frame0, None, None, now, inferred=False):
+                    running = False
+                st.counter.timer.frame_done(time.perf_counter() - t_frame)
+
+            if not running:
+                break
+
+            if not groups:
+                time.sleep(0.005)
+                continue
+
+            for (model_path, _, imgsz), ready in groups.items():
+                model = models[model_path]
+                for i in range(0, len(ready), max_batch):
+                    chunk = ready[i:i + max_batch]
+                    t_inf = time.perf_counter()
+                    results = detect_batch(model, [v for _, _, v, _, _ in chunk], conf=conf, iou=iou, imgsz=imgsz)
+                    infer_s = time.perf_counter() - t_inf
+                    m_batches.inc()
+                    m_frames.inc(len(chunk))
+
+                    for (st, frame0, view, offset, t_frame), res in zip(chunk, results):
+                        timer = st.counter.timer
+                        timer.add("inference", infer_s)
+                        with timer.stage("tracking"):
+                            xyxy, ids = st.tracker.update(res, view)
+                            xyxy = shift_boxes(xyxy, offset)
+                        if not st.counter.process(frame0, xyxy, ids, now):
+                            running = False
+                        # el frame esperó todo el lote
+                        st.counter.observe_inference(infer_s, now)
+                        timer.frame_done(time.perf_counter() - t_frame)
+    except KeyboardInterrupt:
+        print("🛑 detenido (Ctrl+C / SIGTERM), cerrando...")
+    finally:
+        # Siempre: dispatcher.close() vacía las colas y suelta lo retenido por el coalescer
+        for st in streams:
+            st.cap.release()
+            st.counter.close()
+        dispatcher.close()
+        if metrics_pusher is not None:
+            metrics_pusher.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if preview is not None:
+            preview.close()
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
 import configparser
-import requests
 from datetime import datetime
 from pathlib import Path
-import json
 import logging
 
-STATE_PATH = Path("counter_state.json")
+from local_store import LocalStore
+from outbox import Outbox
+import unus_ws
+
+STATE_PATH = Path("counter_state.json")   # formato antiguo (solo migración)
+STORE_PATH = Path("counter_state.db")
+
+_store = None
+_outbox = None
 
 logging.basicConfig(
     filename="sync_unus.log",
@@ -26,30 +32,35 @@ def fmt_ts(dt=None):
     dt = dt or datetime.now()
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
-def load_state():
-    if STATE_PATH.exists():
-        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
-    return {}
+def get_store():
+    global _store
+    if _store is None:
+        _store = LocalStore(STORE_PATH)
+        _store.import_legacy_json(state_path=STATE_PATH)
+        _store.prune_days()
+    return _store
 
-def save_state(state):
-    STATE_PATH.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+def get_outbox(cfg):
+    # Mismo outbox que people_counter (backoff + circuit breaker + dead letter);
+    # los parámetros opcionales se leen de la sección [unus] del .ini
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox.from_cfg(
+            get_store(),
+            lambda session, payload: unus_ws.post_form(cfg, payload, session=session),
+            cfg,
+            name="sync_unus",
+        )
+    return _outbox
 
 def increment_daily_total(casi_cod: str) -> int:
-    state = load_state()
-    day = today_key()
-    state.setdefault(day, {})
-    state[day].setdefault(casi_cod, 0)
-    state[day][casi_cod] += 1
-    save_state(state)
-    return state[day][casi_cod]
+    return get_store().increment_daily_total(today_key(), casi_cod)
 
 def enviar_acumulado_por_cruce(ini_path="cliente.ini"):
     cfg = load_cfg(ini_path)
 
     total_hoy = increment_daily_total(cfg["casi_cod"])
 
-    url = cfg["base_url"].rstrip("/") + "/recibeMovimientosDeaUno_V6"
-
     payload = {
         "BASE_DATOS_CLIENTE": cfg["base_datos_cliente"],
         "CASI_COD": cfg["casi_cod"],
@@ -58,11 +69,11 @@ def enviar_acumulado_por_cruce(ini_path="cliente.ini"):
         "pass": str(total_hoy),
     }
 
-    try:
-        r = requests.post(url, data=payload, timeout=15)
-        r.raise_for_status()
+    # Se persiste en el outbox antes de enviar; si falla queda con backoff
+    outbox = get_outbox(cfg)
+    if outbox.submit(payload):
         logging.info(f"Enviado OK → total hoy: {total_hoy}")
         return True
-    except Exception as e:
-        logging.error(f"Error enviando evento: {e}")
-        return False
\ No newline at end of file
+
+    logging.error(f"Evento pendiente en outbox → total hoy: {total_hoy} | {outbox.stats()}")
+    return False
\ No newline at end of file
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="pc_test_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "events.db")
+os.environ["SNAPSHOT_DIR"] = os.path.join(_tmp, "snapshots")
+os.environ.pop("API_KEY", None)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend.app import app, hub  # noqa: E402
+
+
+def _drain(loop, sub):
+    # publish() agenda con call_soon_threadsafe: correr el loop para entregarlos
+    loop.run_until_complete(asyncio.sleep(0))
+    msgs = []
+    while not sub.q.empty():
+        msgs.append(sub.q.get_nowait())
+    return msgs
+
+
+def _events(msgs):
+    out = []
+    for m in msgs:
+        kind, data = m.split("\n", 1)
+        if kind == "event: event":
+            out.append(json.loads(data[len("data: "):]))
+    return out
+
+
+def test_batch_counts_and_live_skip_duplicates():
+    loop = asyncio.new_event_loop()
+    with TestClient(app) as client:
+        total0 = client.get("/metrics").json()["total"]
+        sub = hub.subscribe(loop)
+        try:
+            ev = lambda i: {"id": i, "camera_id": "CAM-T", "direction": "in", "count_delta": 1}
+
+            r = client.post("/events/batch", json=[ev("a1"), ev("a2")])
+            assert r.status_code == 200
+            body = r.json()
+            assert (body["received"], body["inserted"], body["duplicates"]) == (2, 2, 0)
+            assert sorted(e["id"] for e in _events(_drain(loop, sub))) == ["a1", "a2"]
+
+            # a1 ya existe; b1 viene dos veces en el mismo lote -> una sola fila nueva
+            r = client.post("/events/batch", json=[ev("a1"), ev("b1"), ev("b1")])
+            body = r.json()
+            assert (body["received"], body["inserted"], body["duplicates"]) == (3, 1, 2)
+            assert [e["id"] for e in _events(_drain(loop, sub))] == ["b1"]
+
+            # solo duplicados: nada que publicar
+            r = client.post("/events/batch", json=[ev("a2"), ev("b1")])
+            body = r.json()
+            assert (body["inserted"], body["duplicates"]) == (0, 2)
+            assert _drain(loop, sub) == []
+
+            assert client.get("/metrics").json()["total"] == total0 + 3
+        finally:
+            hub.unsubscribe(sub)
+            loop.close()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="pc_test_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "events.db")
+os.environ["SNAPSHOT_DIR"] = os.path.join(_tmp, "snapshots")
+os.environ.pop("API_KEY", None)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend.app import app  # noqa: E402
+from backend.models import split_meta  # noqa: E402
+
+BAD_META = {"track_id": 1e30, "person_id": 2 ** 63, "track_epoch": 2.7}
+
+
+def test_split_meta_only_promotes_int64_integers():
+    typed, extra = split_meta({**BAD_META, "event": "cross", "snapshot": 5})
+    assert typed == {"event": "cross"}
+    assert extra == {**BAD_META, "snapshot": 5}
+
+    typed, extra = split_meta({"track_id": 7, "person_id": 12.0, "track_epoch": -(2 ** 63)})
+    assert typed == {"track_id": 7, "person_id": 12, "track_epoch": -(2 ** 63)}
+    assert extra == {}
+    assert isinstance(typed["person_id"], int)
+
+    typed, extra = split_meta({"track_id": True, "person_id": "3", "track_epoch": 2 ** 63 - 1})
+    assert typed == {"track_epoch": 2 ** 63 - 1}
+    assert extra == {"track_id": True, "person_id": "3"}
+
+
+def _stored(client, camera_id):
+    r = client.get("/events", params={"camera_id": camera_id, "order": "asc"})
+    assert r.status_code == 200
+    return {e["id"]: e for e in r.json()}
+
+
+def test_out_of_range_and_fractional_meta_stay_in_meta_json():
+    ev = lambda i, meta: {"id": i, "camera_id": "CAM-META", "direction": "in", "count_delta": 1, "meta": meta}
+    with TestClient(app) as client:
+        r = client.post("/events", json=ev("m1", BAD_META))
+        assert r.status_code == 200
+        assert (r.json()["track_id"], r.json()["person_id"], r.json()["track_epoch"]) == (None, None, None)
+
+        # un evento malo no tumba el lote entero
+        r = client.post("/events/batch", json=[ev("m2", {"track_id": 2 ** 64}),
+                                               ev("m3", {"track_id": 2.5, "person_id": 4}),
+                                               ev("m4", {"track_id": 9.0})])
+        assert r.status_code == 200
+        assert (r.json()["inserted"], r.json()["duplicates"]) == (3, 0)
+
+        rows = _stored(client, "CAM-META")
+        assert sorted(rows) == ["m1", "m2", "m3", "m4"]
+        assert rows["m1"]["track_id"] is None and rows["m1"]["meta"] == BAD_META
+        assert rows["m2"]["track_id"] is None and rows["m2"]["meta"] == {"track_id": 2 ** 64}
+        assert (rows["m3"]["track_id"], rows["m3"]["person_id"]) == (None, 4)
+        assert rows["m3"]["meta"] == {"track_id": 2.5, "person_id": 4}
+        assert rows["m4"]["track_id"] == 9
+
+        r = client.get("/events", params={"camera_id": "CAM-META", "person_id": 4})
+        assert [e["id"] for e in r.json()] == ["m3"]
@@ -0,0 +1,176 @@
+import numpy as np
+
+from crossing import CrossingCounter, TimingWheel
+from soak_tracks import DoorSim, ReferenceCounter
+
+W, H = 960, 540          # LINE_X = 480 con line_pos 0.5
+GEO = dict(line_pos=0.5, arm_px=80, cross_tol_px=18, min_box_h_px=110)
+
+
+def box(cx, h=200):
+    return [cx - 40, 150, cx + 40, 150 + h]
+
+
+def walk(counter, tid, xs, t0, dt=0.2, h=200):
+    """Un track caminando por los centros xs; devuelve (eventos, t siguiente)."""
+    events, t = [], t0
+    for cx in xs:
+        events += counter.update([box(cx, h)], [tid], t, W, H)
+        t += dt
+    return events, t
+
+
+LR = range(200, 761, 40)          # pasa por 480 exacto
+RL = range(760, 199, -40)
+
+
+def test_arm_then_cross_each_direction():
+    c = CrossingCounter(**GEO)
+    ev, t = walk(c, 1, LR, 0.0)
+    assert [(e.track_id, e.epoch, e.person_id, e.side) for e in ev] == [(1, 0, 1, "L")]
+    assert ev[0].head[0] == 480.0
+
+    ev, _ = walk(c, 2, RL, t)
+    assert [(e.track_id, e.person_id, e.side) for e in ev] == [(2, 2, "R")]
+
+
+def test_no_count_without_arming():
+    c = CrossingCounter(**GEO)
+    # aparece ya sobre la línea: no sabe de qué lado viene
+    ev, t = walk(c, 1, [480, 480, 470], 0.0)
+    assert ev == []
+    # se arma al alejarse (> arm_px) y recién entonces cuenta al volver
+    ev, _ = walk(c, 1, [380, 440, 480], t)
+    assert [e.side for e in ev] == ["L"]
+
+
+def test_once_per_person_within_ttl_and_new_epoch_after():
+    c = CrossingCounter(track_ttl_s=5.0, **GEO)
+    ev, t = walk(c, 7, LR, 0.0)                     # t: 0 .. 2.8
+    assert len(ev) == 1
+    ev, t = walk(c, 7, RL, t)                       # vuelve dentro del TTL: misma persona
+    assert ev == []
+
+    c.expire(t + 6.0)                               # > TTL sin verse: ido
+    ev, t2 = walk(c, 7, LR, t + 8.0)                # reaparece < TTL después de irse
+    assert ev == []
+    assert c.frame.person_ids.tolist() == [1]       # sigue siendo la persona ya contada
+
+    c.expire(t2 + 6.0)
+    ev, _ = walk(c, 7, RL, t2 + 13.0)               # ido > TTL: nueva época, nueva persona
+    assert [(e.epoch, e.person_id, e.side) for e in ev] == [(1, 2, "R")]
+
+
+def test_new_epoch_after_slot_is_released():
+    c = CrossingCounter(track_ttl_s=5.0, **GEO)
+    ev, t = walk(c, 3, LR, 0.0)
+    assert len(ev) == 1
+    for k in range(1, 20):                          # expire periódico: ido y después liberado
+        c.expire(t + k)
+    assert c.num_tracks == 0 and c.stats()["retired"] == 1
+    ev, _ = walk(c, 3, LR, t + 20.0)
+    assert [(e.track_id, e.epoch, e.person_id) for e in ev] == [(3, 1, 2)]
+
+
+def test_min_box_height_filter():
+    c = CrossingCounter(**GEO)
+    ev, _ = walk(c, 1, LR, 0.0, h=100)
+    assert ev == []
+    assert c.num_tracks == 0 and len(c.frame.track_ids) == 0
+    ev, _ = walk(c, 1, LR, 10.0, h=110)
+    assert len(ev) == 1
+
+
+def test_rotated_line_geometry():
+    # rotate_deg 90: x_rot = H - 1 - y, ancho rotado = H => LINE_X = 270.
+    # Quien baja por la imagen original no cruza; quien sube de y=509 a y=29 va de izquierda a derecha.
+    c = CrossingCounter(rotate_deg=90, **GEO)
+    t = 0.0
+    for cx in LR:                                    # horizontal en el original: paralelo a la línea
+        assert c.update([[cx - 100, 250, cx + 100, 290]], [1], t, W, H) == []
+        t += 0.2
+    events = []
+    for yc in range(509, 28, -40):
+        events += c.update([[300, yc - 20, 500, yc + 20]], [2], t, W, H)
+        t += 0.2
+    assert c.last_line_x == 270
+    assert [(e.track_id, e.side) for e in events] == [(2, "L")]
+    x1, y1, x2, y2 = events[0].bbox
+    assert (x1 + x2) / 2 == 270 and (y1, y2) == (300, 500)
+
+    # 270: x_rot = y; bajar en el original es ir de izquierda a derecha
+    c = CrossingCounter(rotate_deg=270, **GEO)
+    events = []
+    for k, yc in enumerate(range(30, 511, 40)):
+        events += c.update([[300, yc - 20, 500, yc + 20]], [5], k * 0.2, W, H)
+    assert [e.side for e in events] == ["L"]
+
+
+def test_timing_wheel_due_and_reschedule():
+    wh = TimingWheel(span_s=5, tick_s=1.0)
+    wh.add("a", 3.2)
+    wh.add("b", 4.9)
+    wh.add("c", 40.0)                                # más de una vuelta: sale antes, quien llama reagenda
+    assert wh.count == 3
+    assert wh.due(2.9) == []
+    assert wh.due(3.0) == ["a"]
+    assert sorted(wh.due(4.0) + wh.due(4.5)) == ["b"]
+    wh.add("a", 1.0)                                 # ya vencido: va a la cubeta actual
+    assert wh.due(4.6) == ["a"]
+    late = []
+    for t in range(5, 60):
+        for item in wh.due(t):
+            if t < 40:
+                wh.add(item, 40.0)
+            else:
+                late.append((t, item))
+    assert late == [(40, "c")] and wh.count == 0
+
+
+def test_timing_wheel_first_due_after_a_full_turn():
+    # Lo agregado antes del primer due() se revisa aunque ese due() llegue más de una vuelta después
+    wh = TimingWheel(span_s=5, tick_s=1.0)
+    for i in range(10):
+        wh.add(i, 1.0 + i * 0.5)
+    assert sorted(wh.due(100.0)) == list(range(10))
+
+
+def run_vs_reference(seed, ids, ttl, flicker=0.0, restart_every=0, gap=0.0, dur=(6.0, 12.0),
+                     arrival_per_s=40.0, max_tracks=4096):
+    """Mismo loop que soak_tracks --check-ids: compara evento por evento con la lógica original."""
+    counter = CrossingCounter(track_ttl_s=ttl, max_tracks=max_tracks, **GEO)
+    ref = ReferenceCounter(ttl=ttl, **GEO)
+    sim = DoorSim(np.random.default_rng(seed), arrival_per_s, 0.7, dur, restart_every)
+    dt, now, last_cleanup, n_events = 0.2, 0.0, 0.0, 0
+    end = None
+    while end is None or now < end:
+        if sim.serial < ids:
+            sim.spawn(now, dt, ids - sim.serial)
+        elif end is None:
+            end = now + dur[1] + 2 * ttl + 2.0
+        xyxy, tids = sim.frame(now, flicker)
+        got = counter.update(xyxy, tids, now, W, H) if len(tids) else []
+        want = ref.update(xyxy, tids, now) if len(tids) else []
+        if (now - last_cleanup) > 1.0:
+            counter.expire(now)
+            ref.expire(now)
+            last_cleanup = now
+        assert [(e.track_id, e.epoch, e.person_id, e.side) for e in got] == want, f"t={now:.1f}"
+        n_events += len(want)
+        now += dt
+        if gap and now >= 0.6:
+            now += gap
+            gap = 0.0
+    return counter, n_events
+
+
+def test_expiry_matches_reference_semantics():
+    counter, n = run_vs_reference(seed=1, ids=3000, ttl=25.0, flicker=0.05)
+    assert n > 1000 and counter.num_tracks == 0
+
+    # ids reutilizados: épocas nuevas por TTL, con slots liberados y retirados de por medio
+    counter, n = run_vs_reference(seed=2, ids=3000, ttl=5.0, flicker=0.1, restart_every=600)
+    assert n > 1000 and counter.stats()["released"] > 0
+
+    # stream pegado más de un TTL con gente a mitad de camino
+    run_vs_reference(seed=19, ids=2000, ttl=25.0, flicker=0.1, gap=26.0, dur=(20.0, 60.0), arrival_per_s=10.0)
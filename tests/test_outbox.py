@@ -0,0 +1,125 @@
+import os
+import tempfile
+
+from local_store import LocalStore
+from outbox import CircuitBreaker, Outbox, RetryPolicy
+
+
+class FixedPolicy(RetryPolicy):
+    """Backoff sin jitter: base_s * factor^(intentos-1)."""
+
+    def delay(self, attempts):
+        return min(self.max_s, self.base_s * (self.factor ** max(0, attempts - 1)))
+
+
+class FakeWS:
+    """send(session, payload): 'down' => excepción de red, 'reject' => (False, ...)."""
+
+    def __init__(self):
+        self.mode = "ok"
+        self.reject = set()
+        self.calls = []
+
+    def __call__(self, session, payload):
+        self.calls.append(payload["n"])
+        if self.mode == "down":
+            raise ConnectionError("WS caído")
+        if payload["n"] in self.reject:
+            return False, "ERROR: CLAVE INVALIDA"
+        return True, "OK"
+
+
+def make_outbox(max_attempts=50, failures=2, open_s=30.0):
+    store = LocalStore(os.path.join(tempfile.mkdtemp(prefix="pc_test_"), "unus_state.db"))
+    ws = FakeWS()
+    ob = Outbox(store, ws, policy=FixedPolicy(base_s=5, factor=2, max_s=900, max_attempts=max_attempts),
+                breaker=CircuitBreaker(failure_threshold=failures, open_s=open_s, max_open_s=600), name="test")
+    return ob, store, ws
+
+
+def pending(store):
+    return [p["n"] for _, p in store.peek_pending(100)]
+
+
+def test_breaker_half_open_probe_failure_doubles_open_s_then_success_drains():
+    ob, store, ws = make_outbox(failures=2, open_s=30.0)
+    for n in range(5):
+        ob.enqueue({"n": n})
+
+    ws.mode = "down"
+    assert ob.drain(now=1000.0) == []
+    assert ws.calls == [0, 1]                        # 2 fallos seguidos -> abre, no sigue con el resto
+    assert ob.breaker.state == "open" and ob.breaker.opened_at == 1000.0 and ob.breaker.open_s == 30.0
+
+    ws.calls.clear()
+    assert ob.drain(now=1029.0) == [] and ws.calls == []          # abierto: ni red ni BD
+
+    # half-open: un solo intento de prueba; falla -> reabre con open_s doble
+    assert ob.drain(now=1030.0) == []
+    assert ws.calls == [0]                           # el más antiguo ya vencido (su backoff de 5 s pasó)
+    assert ob.breaker.state == "open" and ob.breaker.open_s == 60.0 and ob.breaker.opened_at == 1030.0
+    assert ob.breaker.opens == 2
+
+    ws.calls.clear()
+    assert ob.drain(now=1089.0) == [] and ws.calls == []
+
+    # la prueba sale bien -> cerrado, open_s vuelve al base y se vacía lo que ya venció
+    ws.mode = "ok"
+    sent = ob.drain(now=1090.0)
+    assert ob.breaker.state == "closed" and ob.breaker.open_s == 30.0 and ob.breaker.failures == 0
+    assert ws.calls == [0, 1, 2, 3, 4]
+    assert len(sent) == 5 and pending(store) == []
+    assert ob.stats()["sent"] == 5
+
+
+def test_rejected_items_back_off_then_dead_letter():
+    ob, store, ws = make_outbox(max_attempts=3)
+    ws.reject = {1}
+    for n in range(3):
+        ob.enqueue({"n": n})
+
+    now = 0.0
+    assert len(ob.drain(now=now)) == 2               # 0 y 2 salen; 1 se reagenda (el WS responde: breaker cerrado)
+    assert pending(store) == [1] and ob.breaker.state == "closed"
+
+    # backoff 5 s tras el 1er rechazo, 10 s tras el 2do
+    ws.calls.clear()
+    assert ob.drain(now=4.9) == [] and ws.calls == []
+    assert ob.drain(now=5.0) == [] and ws.calls == [1]
+    assert ob.drain(now=14.9) == [] and ws.calls == [1]
+    assert ob.drain(now=15.0) == [] and ws.calls == [1, 1]
+
+    assert pending(store) == [] and store.count_dead() == 1
+    assert ob.stats()["dead"] == 1 and ob.dead == 1 and ob.failed == 3
+
+
+def test_due_items_keep_fifo_order_when_backoff_differs():
+    ob, store, ws = make_outbox(failures=99)
+    for n in range(4):
+        ob.enqueue({"n": n})
+
+    ws.reject = {0, 1, 2, 3}
+    ob.drain(now=0.0)                                # todos: 1 intento, próximo a t=5
+    ws.reject = {0, 2}
+    ob.drain(now=5.0)                                # 0 y 2: 2 intentos, próximo a t=15; 1 y 3 salen
+    assert pending(store) == [0, 2]
+
+    for n in range(4, 7):
+        ob.enqueue({"n": n})                         # nuevos, sin backoff
+    ws.reject = set()
+    ws.calls.clear()
+    ob.drain(now=6.0)
+    assert ws.calls == [4, 5, 6]                     # los que están en backoff no bloquean
+
+    ob.enqueue({"n": 7})
+    ws.calls.clear()
+    assert len(ob.drain(now=15.0)) == 3
+    assert ws.calls == [0, 2, 7]                     # vencidos juntos: por orden de llegada, no de vencimiento
+    assert pending(store) == []
+
+    # max_items respeta el mismo orden
+    for n in range(10, 16):
+        ob.enqueue({"n": n})
+    ws.calls.clear()
+    ob.drain(now=20.0, max_items=4)
+    assert ws.calls == [10, 11, 12, 13] and pending(store) == [14, 15]
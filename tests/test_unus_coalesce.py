@@ -0,0 +1,50 @@
+import people_counter
+from people_counter import UnusCoalescer, make_dispatcher
+
+CAM = {"casi_cod": "001", "lect_cod": "A", "base_datos_cliente": "CASI_TEST", "base_url": "http://127.0.0.1:9"}
+
+
+def test_day_rollover_flushes_yesterday_first():
+    co = UnusCoalescer(interval_s=10.0)
+    t = 1000.0
+    assert [j[1:] for j in co.offer(CAM, 1, "2026-10-17 23:59:50", now=t)] == [(1, "2026-10-17 23:59:50")]
+    assert co.offer(CAM, 2, "2026-10-17 23:59:55", now=t + 3) == []          # retenido (intervalo)
+    assert co.offer(CAM, 3, "2026-10-17 23:59:58", now=t + 6) == []          # reemplaza al 2
+
+    # primer cruce del día nuevo: sale el total final de ayer, el de hoy queda retenido
+    out = co.offer(CAM, 1, "2026-10-18 00:00:02", now=t + 8)
+    assert [j[1:] for j in out] == [(3, "2026-10-17 23:59:58")]
+    assert co.due(now=t + 17.9) == []
+    assert [j[1:] for j in co.due(now=t + 18)] == [(1, "2026-10-18 00:00:02")]
+
+    # sin nada retenido el cambio de día no adelanta nada: el primero sale si venció el intervalo
+    assert [j[1:] for j in co.offer(CAM, 2, "2026-10-19 00:00:01", now=t + 30)] == [(2, "2026-10-19 00:00:01")]
+    assert co.stats()["held"] == 0 and (co.offered, co.emitted) == (5, 4)
+
+
+def test_rollover_is_per_casi_cod():
+    co = UnusCoalescer(interval_s=10.0)
+    other = dict(CAM, casi_cod="002")
+    co.offer(CAM, 1, "2026-10-17 23:59:50", now=0.0)
+    co.offer(other, 1, "2026-10-17 23:59:51", now=0.0)
+    co.offer(CAM, 2, "2026-10-17 23:59:52", now=1.0)
+    co.offer(other, 2, "2026-10-17 23:59:53", now=1.0)
+    out = co.offer(CAM, 1, "2026-10-18 00:00:01", now=2.0)
+    assert [(j[0]["casi_cod"], j[1]) for j in out] == [("001", 2)]
+    assert sorted((j[0]["casi_cod"], j[1]) for j in co.due(now=2.0, force=True)) == [("001", 1), ("002", 2)]
+
+
+def test_dispatcher_close_flushes_held_totals(monkeypatch, tmp_path):
+    # nada debe caer al store, pero si cae que sea uno temporal
+    monkeypatch.setattr(people_counter, "UNUS_STORE_FILE", tmp_path / "unus_state.db")
+    sent = []
+    monkeypatch.setattr(people_counter, "post_unus_acumulado",
+                        lambda cfg, total, fecha_hora, session=None: sent.append((total, fecha_hora)) or True)
+    cfg_unus = dict(CAM, mode="coalesce", coalesce_interval_s=3600)
+    disp = make_dispatcher("http://127.0.0.1:9", cfg_unus, True, {})
+    for total in range(1, 6):
+        assert disp.submit("unus", ("acumulado", cfg_unus, total, f"2026-10-18 10:00:0{total}"))
+    disp.close(timeout=5.0)
+    # el primero salió de inmediato; el último retenido sale al cerrar
+    assert sent == [(1, "2026-10-18 10:00:01"), (5, "2026-10-18 10:00:05")]
+    assert people_counter._unus_coalescer.stats()["held"] == 0
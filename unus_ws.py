@@ -0,0 +1,59 @@
+import xml.etree.ElementTree as ET
+
+import requests
+
+
+# -------------------- CLIENTE WS UNUS (recibeMovimientosDeaUno_V6) --------------------
+
+WS_METHOD = "/recibeMovimientosDeaUno_V6"
+
+DUP_TOKENS = [
+    "PRIMARY KEY constraint",
+    "duplicate key",
+    "Cannot insert duplicate key",
+]
+
+
+def ws_url(cfg_unus) -> str:
+    return cfg_unus["base_url"].rstrip("/") + WS_METHOD
+
+
+def parse_response(xml_text: str):
+    """
+    Respuesta del WS -> (ok, resp)
+    - OK => éxito
+    - duplicate key / PRIMARY KEY => lo tratamos como éxito (ya estaba)
+    - xsi:nil=true => fallo
+    """
+    xml_text = (xml_text or "").strip()
+    low = xml_text.lower()
+
+    # 1) NULL explícito
+    if 'xsi:nil="true"' in low:
+        return False, "NULL"
+
+    # 2) Duplicado => lo consideramos OK
+    if any(tok.lower() in low for tok in DUP_TOKENS):
+        return True, "DUPLICATE_OK"
+
+    # 3) Parse <string>OK</string>
+    try:
+        root = ET.fromstring(xml_text)
+        resp = (root.text or "").strip()
+    except Exception:
+        resp = xml_text
+
+    if resp.upper() == "OK":
+        return True, "OK"
+    return False, resp
+
+
+def post_form(cfg_unus, payload: dict, session=None):
+    """
+    POST form-urlencoded al WS. Devuelve (ok, resp) si el WS respondió;
+    errores de red / HTTP se propagan como excepción (el WS no está disponible).
+    """
+    http = session or requests
+    r = http.post(ws_url(cfg_unus), data=payload, timeout=float(cfg_unus.get("timeout", 15)))
+    r.raise_for_status()
+    return parse_response(r.text)